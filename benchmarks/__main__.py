@@ -0,0 +1,99 @@
+"""
+python -m benchmarks run [--sizes 10 100 1000] [--only fetch_course submit] [--rounds 3]
+python -m benchmarks compare [base] [head] [--threshold 0.1]
+"""
+
+import argparse
+import json
+import os
+import sys
+
+from benchmarks.history import (
+	DEFAULT_THRESHOLD,
+	HISTORY_FILE,
+	append_run,
+	compare_runs,
+	find_run,
+	format_comparison,
+	load_history,
+	new_run,
+)
+from benchmarks.suite import BENCHMARKS, SIZES, TOKEN_ENV_VAR, BenchmarkResult, run_case, run_rounds
+from myrpl_cli.api import BASE_URL_ENV_VAR
+
+
+def format_result(result: BenchmarkResult) -> str:
+	peak_rss = f"{result.peak_rss / 1024**2:.1f} MiB" if result.peak_rss is not None else "-"
+	return (
+		f"{result.name + f'[{result.size}]':<20} {result.wall_time:8.3f}s (min {result.wall_time_min:.3f}s)"
+		f" {result.requests:8.0f} requests {result.bytes_sent / 1024:10.1f} KiB"
+		f" {peak_rss:>10} peak RSS {result.files_written:6d} files"
+	)
+
+
+def run_command(args):
+	results = []
+	for name in args.only or list(BENCHMARKS):
+		for size in args.sizes:
+			result = run_case(name, size, args.rounds)
+			print(format_result(result), flush=True)
+			results.append(result)
+
+	run = new_run(results)
+	if not args.no_save:
+		append_run(run, args.history)
+		print(f"Saved to {args.history}")
+
+
+def compare_command(args):
+	history = load_history(args.history)
+	try:
+		base, head = find_run(history, args.base), find_run(history, args.head)
+	except ValueError as e:
+		sys.exit(f"Can't compare: {e}")
+
+	regressions = compare_runs(base, head, args.threshold)
+	print(format_comparison(base, head, regressions))
+	if regressions:
+		sys.exit(1)
+
+
+def case_command(args):
+	"""Child side of run_case: prints the measurements as a JSON line"""
+
+	measured = run_rounds(args.name, args.size, args.rounds, os.environ[BASE_URL_ENV_VAR], os.environ[TOKEN_ENV_VAR])
+	print(json.dumps(measured))
+
+
+def main():
+	parser = argparse.ArgumentParser(description="myrpl-cli benchmarks")
+	parser.add_argument("--history", default=HISTORY_FILE, help="History file (default: %(default)s)")
+	subparsers = parser.add_subparsers(dest="command", required=True)
+
+	run_parser = subparsers.add_parser("run", help="Run the benchmarks and append the results to the history")
+	run_parser.add_argument("--sizes", type=int, nargs="+", default=SIZES, help="Activities per synthetic course")
+	run_parser.add_argument("--only", nargs="+", choices=list(BENCHMARKS), help="Benchmarks to run (default: all)")
+	run_parser.add_argument("--rounds", type=int, default=3, help="Rounds per case (default: %(default)s)")
+	run_parser.add_argument("--no-save", action="store_true", help="Don't append the results to the history")
+
+	compare_parser = subparsers.add_parser("compare", help="Compare two runs, failing on regressions")
+	compare_parser.add_argument("base", nargs="?", default="-2", help="Run index or commit (default: previous run)")
+	compare_parser.add_argument("head", nargs="?", default="-1", help="Run index or commit (default: last run)")
+	compare_parser.add_argument(
+		"--threshold",
+		type=float,
+		default=DEFAULT_THRESHOLD,
+		help="Allowed growth of every metric before it's flagged (default: %(default)s)",
+	)
+
+	case_parser = subparsers.add_parser("case", help=argparse.SUPPRESS)
+	case_parser.add_argument("name", choices=list(BENCHMARKS))
+	case_parser.add_argument("size", type=int)
+	case_parser.add_argument("--rounds", type=int, default=3)
+
+	args = parser.parse_args()
+	{"run": run_command, "compare": compare_command, "case": case_command}[args.command](args)
+
+
+if __name__ == "__main__":
+	main()
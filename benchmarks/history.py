@@ -0,0 +1,132 @@
+"""
+Benchmark history: every run is appended as a JSON line, so runs from
+different commits can be compared later on
+"""
+
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+from typing import List, Optional
+
+from pydantic import BaseModel
+
+from benchmarks.suite import ROOT, BenchmarkResult
+
+HISTORY_FILE = os.path.join(ROOT, ".benchmarks", "history.jsonl")
+
+# Metrics where more is worse, compared by compare_runs (the fastest round is the least noisy time)
+METRICS = ["wall_time_min", "requests", "bytes_sent", "peak_rss", "files_written"]
+DEFAULT_THRESHOLD = 0.1
+
+
+class BenchmarkRun(BaseModel):
+	"""A full run of the suite"""
+
+	timestamp: str
+	commit: Optional[str] = None
+	python: str
+	machine: str
+	results: List[BenchmarkResult]
+
+
+class Regression(BaseModel):
+	"""A metric that got worse by more than the threshold"""
+
+	name: str
+	size: int
+	metric: str
+	base: float
+	head: float
+
+	@property
+	def change(self) -> float:
+		return (self.head - self.base) / self.base if self.base else float("inf")
+
+
+def current_commit() -> Optional[str]:
+	try:
+		completed = subprocess.run(
+			["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+		)
+	except (OSError, subprocess.CalledProcessError):
+		return None
+	return completed.stdout.strip() or None
+
+
+def new_run(results: List[BenchmarkResult]) -> BenchmarkRun:
+	return BenchmarkRun(
+		timestamp=datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+		commit=current_commit(),
+		python=sys.version.split()[0],
+		machine=f"{platform.system()} {platform.machine()}",
+		results=results,
+	)
+
+
+def append_run(run: BenchmarkRun, history_file: str = HISTORY_FILE):
+	os.makedirs(os.path.dirname(history_file), exist_ok=True)
+	with open(history_file, "a", encoding="utf8") as file:
+		file.write(run.model_dump_json() + "\n")
+
+
+def load_history(history_file: str = HISTORY_FILE) -> List[BenchmarkRun]:
+	if not os.path.exists(history_file):
+		return []
+
+	with open(history_file, encoding="utf8") as file:
+		return [BenchmarkRun(**json.loads(line)) for line in file if line.strip()]
+
+
+def find_run(history: List[BenchmarkRun], ref: str) -> BenchmarkRun:
+	"""
+	Finds a run by its index in the history (negative ones count from the end)
+	or by (a prefix of) the commit it ran on, latest first
+	"""
+
+	try:
+		return history[int(ref)]
+	except ValueError:
+		pass
+	except IndexError as e:
+		raise ValueError(f"no run #{ref} in a history of {len(history)} runs") from e
+
+	for run in reversed(history):
+		if run.commit and run.commit.startswith(ref):
+			return run
+	raise ValueError(f"no run for commit {ref}")
+
+
+def compare_runs(base: BenchmarkRun, head: BenchmarkRun, threshold: float = DEFAULT_THRESHOLD) -> List[Regression]:
+	"""Every metric of a case present in both runs that grew by more than threshold"""
+
+	base_results = {(result.name, result.size): result for result in base.results}
+	regressions = []
+	for result in head.results:
+		base_result = base_results.get((result.name, result.size))
+		if base_result is None:
+			continue
+
+		for metric in METRICS:
+			base_value, head_value = getattr(base_result, metric), getattr(result, metric)
+			if base_value is None or head_value is None:
+				continue
+			if head_value > base_value * (1 + threshold):
+				regressions.append(
+					Regression(name=result.name, size=result.size, metric=metric, base=base_value, head=head_value)
+				)
+
+	return regressions
+
+
+def format_comparison(base: BenchmarkRun, head: BenchmarkRun, regressions: List[Regression]) -> str:
+	lines = [f"{base.commit or base.timestamp} -> {head.commit or head.timestamp}"]
+	for regression in regressions:
+		lines.append(
+			f"✘ {regression.name}[{regression.size}] {regression.metric}: "
+			f"{regression.base:g} -> {regression.head:g} ({regression.change:+.0%})"
+		)
+	lines.append(f"{len(regressions)} regressions" if regressions else "No regressions")
+	return "\n".join(lines)
@@ -0,0 +1,187 @@
+"""
+Benchmarks for the fetch, list, submit and parse paths, run against the
+fake myrpl.ar server (tests/fake_server.py) with synthetic courses.
+
+Every (benchmark, size) case runs in its own process so its peak RSS isn't
+skewed by the cases before it. The server lives in the parent process and
+counts the requests and bytes the case cost
+"""
+
+import contextlib
+import io
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional
+from unittest.mock import Mock
+
+from pydantic import BaseModel
+
+from myrpl_cli.api import API, BASE_URL_ENV_VAR
+from myrpl_cli.cache import CACHE_DIR_ENV_VAR
+from myrpl_cli.credential_manager import CredentialManager
+from myrpl_cli.models import Activity, Course
+from myrpl_cli.myrpl import MyRPL
+from tests.fake_server import FakeMyRPLServer, FakeServerConfig, make_course
+
+try:
+	import resource
+except ImportError:  # Windows
+	resource = None
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+COURSE_ID = 1
+SIZES = [10, 100, 1000]
+TOKEN_ENV_VAR = "MYRPL_BENCH_TOKEN"
+SOLUTION = "def resolver():\n\treturn 0\n"
+
+
+class BenchmarkResult(BaseModel):
+	"""Measurements of a single (benchmark, size) case, per round"""
+
+	name: str
+	size: int
+	rounds: int
+	wall_time: float
+	wall_time_min: float
+	requests: float
+	bytes_sent: float
+	peak_rss: Optional[int]
+	files_written: int
+
+
+def count_files(path: str) -> int:
+	return sum(len(filenames) for _, _, filenames in os.walk(path))
+
+
+def peak_rss() -> Optional[int]:
+	"""Peak resident set size of the current process, in bytes"""
+
+	if resource is None:
+		return None
+
+	max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	# Linux reports KiB, macOS bytes
+	return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+def local_activities(size: int) -> List[Activity]:
+	"""The course's activities as the API would parse them, built without requests"""
+
+	fake_course = make_course(COURSE_ID, activities=size)
+	course = Course(**fake_course.course)
+	return [Activity(course=course, **activity) for activity in fake_course.activities]
+
+
+def bench_parse(api: API, size: int, workdir: str) -> int:
+	"""Model parsing alone: a course's activities and their details"""
+
+	fake_course = make_course(COURSE_ID, activities=size)
+	course = Course(**fake_course.course)
+	for activity in fake_course.activities:
+		Activity(course=course, **fake_course.details[activity["id"]])
+	return 0
+
+
+def bench_list(api: API, size: int, workdir: str) -> int:
+	myrpl = MyRPL(api, api.credential_manager)
+	with contextlib.redirect_stdout(io.StringIO()):
+		myrpl.list(all_courses=True)
+	return 0
+
+
+def bench_fetch_course(api: API, size: int, workdir: str) -> int:
+	myrpl = MyRPL(api, api.credential_manager)
+	cwd = os.getcwd()
+	os.chdir(workdir)
+	try:
+		myrpl.fetch_course(COURSE_ID, force=True)
+	finally:
+		os.chdir(cwd)
+	return count_files(workdir)
+
+
+def bench_submit(api: API, size: int, workdir: str) -> int:
+	"""A submission to every activity of the course"""
+
+	solution = os.path.join(workdir, "alumno.py")
+	with open(solution, "w", encoding="utf8") as file:
+		file.write(SOLUTION)
+
+	for activity in local_activities(size):
+		api.submit(activity, solution)
+	return 0
+
+
+# Benchmark name -> function(api, size, workdir) returning the number of files it wrote
+BENCHMARKS: Dict[str, Callable[[API, int, str], int]] = {
+	"parse": bench_parse,
+	"list": bench_list,
+	"fetch_course": bench_fetch_course,
+	"submit": bench_submit,
+}
+
+
+def run_rounds(name: str, size: int, rounds: int, base_url: str, token: str) -> dict:
+	"""
+	Runs a case in the current process (the child side of run_case). Every
+	round starts cold, with an empty cache dir, so the persisted responses and
+	blobs of earlier rounds (or runs) don't answer its requests
+	"""
+
+	credential_manager = Mock(spec=CredentialManager)
+	benchmark = BENCHMARKS[name]
+
+	times, files_written = [], 0
+	for _ in range(rounds):
+		with (
+			tempfile.TemporaryDirectory(prefix="myrpl-bench-") as workdir,
+			tempfile.TemporaryDirectory(prefix="myrpl-bench-cache-") as cache_dir,
+		):
+			os.environ[CACHE_DIR_ENV_VAR] = cache_dir
+			api = API(credential_manager, bearer_token=token, base_url=base_url)
+			start = time.perf_counter()
+			files_written = benchmark(api, size, workdir)
+			times.append(time.perf_counter() - start)
+
+	return {"times": times, "files_written": files_written, "peak_rss": peak_rss()}
+
+
+def run_case(name: str, size: int, rounds: int = 3) -> BenchmarkResult:
+	"""Runs a (benchmark, size) case in a fresh process against a fresh server"""
+
+	with (
+		FakeMyRPLServer(FakeServerConfig(), [make_course(COURSE_ID, activities=size)]) as server,
+		tempfile.TemporaryDirectory(prefix="myrpl-bench-cache-") as cache_dir,
+	):
+		token = server.issue_token()
+		# Never the user's cache: the child's rounds each get their own inside it
+		completed = subprocess.run(
+			[sys.executable, "-m", "benchmarks", "case", name, str(size), "--rounds", str(rounds)],
+			cwd=ROOT,
+			env={**os.environ, BASE_URL_ENV_VAR: server.url, TOKEN_ENV_VAR: token, CACHE_DIR_ENV_VAR: cache_dir},
+			capture_output=True,
+			text=True,
+			check=False,
+		)
+		if completed.returncode != 0:
+			raise RuntimeError(f"benchmark {name}[{size}] failed:\n{completed.stderr}")
+
+		measured = json.loads(completed.stdout.splitlines()[-1])
+		requests, bytes_sent = sum(server.requests.values()), server.bytes_sent
+
+	return BenchmarkResult(
+		name=name,
+		size=size,
+		rounds=rounds,
+		wall_time=statistics.median(measured["times"]),
+		wall_time_min=min(measured["times"]),
+		requests=requests / rounds,
+		bytes_sent=bytes_sent / rounds,
+		peak_rss=measured["peak_rss"],
+		files_written=measured["files_written"],
+	)
@@ -1,25 +1,71 @@
-from typing import List
+from collections import defaultdict
+from typing import Dict, List
+import importlib.util
 import mimetypes
 import json
+import logging
+import os
+import threading
 
 import requests
+from requests.adapters import HTTPAdapter
 from requests_toolbelt.multipart.encoder import MultipartEncoder
 
-from myrpl_cli.errors import MissingCredentialsError
+from myrpl_cli.blobs import BlobStore
+from myrpl_cli.errors import MissingCredentialsError, OfflineError
 from myrpl_cli.models import Course, Activity, Submission, SubmissionResult
 from myrpl_cli.credential_manager import CredentialManager
+from myrpl_cli.offline import ResponseStore
+from myrpl_cli.tracing import route_template, span
 
 BASE_URL = "https://myrpl.ar"
+BASE_URL_ENV_VAR = "MYRPL_BASE_URL"
+
+# Seconds. A short connect timeout so an unreachable server falls back to offline quickly
+CONNECT_TIMEOUT = 3.05
+READ_TIMEOUT = 10
+
+logger = logging.getLogger(__name__)
+
+
+def accepted_encodings() -> str:
+	"""
+	Content encodings urllib3 can decode here: gzip and deflate always,
+	br and zstd only when their optional packages are installed
+	"""
+
+	encodings = ["gzip", "deflate"]
+	if importlib.util.find_spec("brotli") or importlib.util.find_spec("brotlicffi"):
+		encodings.insert(0, "br")
+	if importlib.util.find_spec("zstandard"):
+		encodings.insert(0, "zstd")
+	return ", ".join(encodings)
+
+
+ACCEPT_ENCODING = accepted_encodings()
 
 
 class API:
 	"""API client for myrpl.ar"""
 
-	def __init__(self, credential_manager: CredentialManager, bearer_token=None):
+	def __init__(self, credential_manager: CredentialManager, bearer_token=None, base_url=None, offline=False):
+		self.base_url = (base_url or os.environ.get(BASE_URL_ENV_VAR) or BASE_URL).rstrip("/")
+		# Offline, calls are answered from the persisted responses only (no keyring, no network)
+		self.offline = offline
+		self.responses = ResponseStore(self.base_url)
+		self.blobs = BlobStore(self.base_url)
 		self.headers = {
 			"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:127.0) Gecko/20100101 Firefox/127.0",
 			"Content-Type": "application/json",
+			"Accept-Encoding": ACCEPT_ENCODING,
 		}
+		# Reuses connections (and TLS sessions) across requests
+		self.session = requests.Session()
+		# Concurrent calls (eg. fetch's workers) read the keyring and renew the token once
+		self.token_lock = threading.Lock()
+		# Route -> [decoded, transferred] response bytes, traced or not
+		self.transferred: Dict[str, List[int]] = defaultdict(lambda: [0, 0])
+		self.transferred_lock = threading.Lock()
 		if bearer_token:
 			self.headers["Authorization"] = f"Bearer {bearer_token}"
 		self.credential_manager = credential_manager
@@ -27,10 +73,18 @@ class API:
 	def login(self, username_or_email, password):
 		"""Obtains a bearer token given email & password"""
 
-		login_url = f"{BASE_URL}/api/auth/login"
+		if self.offline:
+			raise OfflineError("can't log in while offline")
+
+		login_url = f"{self.base_url}/api/auth/login"
 		payload = {"username_or_email": username_or_email, "password": password}
-		response = requests.post(login_url, headers=self.headers, data=json.dumps(payload), timeout=10)
-		response.raise_for_status()
+		route = route_template(login_url)
+		with span("login", "auth"), span("request", "http", method="POST", route=route) as args:
+			response = self.session.post(
+				login_url, headers=self.headers, data=json.dumps(payload), timeout=(CONNECT_TIMEOUT, READ_TIMEOUT)
+			)
+			self.record_response(args, route, response)
+			response.raise_for_status()
 
 		login_data = response.json()
 
@@ -40,15 +94,17 @@ class API:
 	def fetch_courses(self) -> List[Course]:
 		"""Fetches all courses"""
 
-		courses_response = self.auth_api_call("get", f"{BASE_URL}/api/courses")
-		courses = [Course(**course) for course in courses_response]
+		courses_response = self.auth_api_call("get", f"{self.base_url}/api/courses")
+		with span("validate", "model", model="Course", count=len(courses_response)):
+			courses = [Course(**course) for course in courses_response]
 		return courses
 
 	def fetch_activities(self, course: Course) -> List[Activity]:
 		"""Fetches all activities in a course"""
 
-		activities_response = self.auth_api_call("get", f"{BASE_URL}/api/courses/{course.id}/activities")
-		activities = [Activity(course=course, **activity) for activity in activities_response]
+		activities_response = self.auth_api_call("get", f"{self.base_url}/api/courses/{course.id}/activities")
+		with span("validate", "model", model="Activity", count=len(activities_response)):
+			activities = [Activity(course=course, **activity) for activity in activities_response]
 		return activities
 
 	def fetch_activity_info(self, activity: Activity) -> Activity:
@@ -56,26 +112,46 @@ class API:
 
 		activity_info_response = self.auth_api_call(
 			"get",
-			f"{BASE_URL}/api/courses/{activity.course.id}/activities/{activity.id}",
+			f"{self.base_url}/api/courses/{activity.course.id}/activities/{activity.id}",
 		)
 
-		merged_activity_attrs = {**activity.model_dump(), **activity_info_response}
+		with span("validate", "model", model="Activity", count=1):
+			merged_activity_attrs = {**activity.model_dump(), **activity_info_response}
+			return Activity(**merged_activity_attrs)
 
-		return Activity(**merged_activity_attrs)
+	def fetch_activity(self, course: Course, activity_id: int) -> Activity:
+		"""Fetches all info on an activity by ID (without listing the course's activities)"""
 
-	def fetch_files(self, file_id: int) -> dict[str, str]:
-		"""Fetches the initial code snippet for a given activity"""
+		activity_response = self.auth_api_call(
+			"get", f"{self.base_url}/api/courses/{course.id}/activities/{activity_id}"
+		)
+		with span("validate", "model", model="Activity", count=1):
+			return Activity(course=course, **activity_response)
 
-		return self.auth_api_call("get", f"{BASE_URL}/api/getFileForStudent/{file_id}")
+	def fetch_files(self, file_id: int, store: bool = True, force: bool = False) -> dict[str, str]:
+		"""
+		Fetches the initial code snippet for a given activity (file_ids are only ever
+		downloaded once, unless forced). Without store, they're not kept in the blob
+		store (eg. old submissions, which the snapshot store keeps as deltas)
+		"""
+
+		# Forced, a stale (or wrong) mapping in the blob store gets replaced
+		files = None if force else self.blobs.get_files(file_id)
+		if files is None:
+			files = self.auth_api_call("get", f"{self.base_url}/api/getFileForStudent/{file_id}")
+			if store:
+				self.blobs.put_files(file_id, files)
+		return files
 
 	def fetch_submissions(self, activity: Activity):
 		"""Fetches all submissions for a given activity"""
 
 		submissions_response = self.auth_api_call(
 			"get",
-			f"{BASE_URL}/api/courses/{activity.course.id}/activities/{activity.id}/submissions",
+			f"{self.base_url}/api/courses/{activity.course.id}/activities/{activity.id}/submissions",
 		)
-		submissions = [Submission(activity=activity, **submission) for submission in submissions_response]
+		with span("validate", "model", model="Submission", count=len(submissions_response)):
+			submissions = [Submission(activity=activity, **submission) for submission in submissions_response]
 		return submissions
 
 	def fetch_final_submission(self, activity: Activity):
@@ -83,14 +159,16 @@ class API:
 
 		final_submission_response = self.auth_api_call(
 			"get",
-			f"{BASE_URL}/api/courses/{activity.course.id}/activities/{activity.id}/finalSubmission",
+			f"{self.base_url}/api/courses/{activity.course.id}/activities/{activity.id}/finalSubmission",
 		)
 		return Submission(activity=activity, **final_submission_response, is_final_solution=True)
 
 	def fetch_submission_result(self, submission: Submission) -> SubmissionResult:
 		"""Fetches the result of a given submission"""
 
-		submission_result_response = self.auth_api_call("get", f"{BASE_URL}/api/submissions/{submission.id}/result")
+		submission_result_response = self.auth_api_call(
+			"get", f"{self.base_url}/api/submissions/{submission.id}/result"
+		)
 		return SubmissionResult(
 			submission=submission,
 			activity=submission.activity,
@@ -104,22 +182,23 @@ class API:
 		if mime_type is None:
 			mime_type = "application/octet-stream"
 
+		# Read upfront: the encoder is consumed after the file would've been closed
 		with open(submission_file, "rb") as f:
-			form = MultipartEncoder(
-				fields={
-					"file": (submission_file, f, mime_type),
-					"description": description,
-				}
-			)
+			content = f.read()
 
-		headers = self.headers.copy()
-		headers["Content-Type"] = form.content_type
+		form = MultipartEncoder(
+			fields={
+				"file": (os.path.basename(submission_file), content, mime_type),
+				"description": description,
+			}
+		)
 
 		return self.auth_api_call(
 			"post",
-			f"{BASE_URL}/api/courses/{activity.course.id}/activities/{activity.id}/submissions",
-			data=form,
-			headers=headers,
+			f"{self.base_url}/api/courses/{activity.course.id}/activities/{activity.id}/submissions",
+			# As bytes, so a retry after a token renewal can resend it
+			data=form.to_string(),
+			headers={"Content-Type": form.content_type},
 		)
 
 	def set_final_submission(self, submission: Submission) -> Submission:
@@ -129,9 +208,8 @@ class API:
 
 		final_submission_response = self.auth_api_call(
 			"put",
-			f"{BASE_URL}/api/courses/{submission.activity.course.id}\
-                /activities/{submission.activity.id}\
-                    /submissions/{submission.id}/final",
+			f"{self.base_url}/api/courses/{submission.activity.course.id}"
+			f"/activities/{submission.activity.id}/submissions/{submission.id}/final",
 		)
 
 		merged_submission_attrs = {
@@ -142,38 +220,102 @@ class API:
 		return Submission(**merged_submission_attrs)
 
 	def auth_api_call(self, method: str, url: str, **kwargs) -> dict:
-		"""Makes a generic authed API call"""
+		"""
+		Makes a generic authed API call. Once myrpl.ar can't be reached, this
+		and every later call are answered from the persisted responses
+		"""
+
+		if self.offline:
+			return self.offline_response(method, url)
 
 		if self.headers.get("Authorization", None) is None:
-			self.headers["Authorization"] = f"Bearer {self.credential_manager.get_stored_token()}"
+			with self.token_lock:
+				if self.headers.get("Authorization", None) is None:
+					self.headers["Authorization"] = f"Bearer {self.credential_manager.get_stored_token()}"
 
-		headers = {**self.headers, **(kwargs.get("headers", {}))}
+		extra_headers = kwargs.pop("headers", {})
+		authorization = self.headers["Authorization"]
 
 		try:
-			response = self.make_request(method, url, **kwargs, headers=headers)
-		except requests.HTTPError as e:
-			if e.response.status_code == 401:
-				self.renew_token()
-				response = self.make_request(method, url, **kwargs, headers=headers)
-			else:
-				raise e
-
-		return response.json()
-
-	def make_request(self, method: str, url: str, **kwargs) -> requests.Response:
+			try:
+				response = self.make_request(method, url, **kwargs, headers={**self.headers, **extra_headers})
+			except requests.HTTPError as e:
+				if e.response.status_code == 401:
+					self.renew_token(authorization)
+					# Rebuilt so the retry carries the renewed token
+					response = self.make_request(
+						method, url, **kwargs, headers={**self.headers, **extra_headers}, retry=1
+					)
+				else:
+					raise e
+		except requests.ConnectionError as e:
+			logger.warning("Can't reach %s (%s), going offline", self.base_url, type(e).__name__)
+			self.offline = True
+			return self.offline_response(method, url)
+
+		data = response.json()
+		if method.lower() == "get":
+			self.responses.put(url, data)
+		return data
+
+	def offline_response(self, method: str, url: str):
+		"""The persisted response for a call, raising OfflineError if there's none"""
+
+		data = self.responses.get(url) if method.lower() == "get" else None
+		if data is None:
+			raise OfflineError(f"{method.upper()} {route_template(url)} isn't available offline")
+		return data
+
+	def make_request(self, method: str, url: str, retry: int = 0, **kwargs) -> requests.Response:
 		"""Makes a generic API call"""
 
-		response = requests.request(method, url, **kwargs, timeout=10)
-		response.raise_for_status()
+		route = route_template(url)
+		with span("request", "http", method=method.upper(), route=route, retry=retry) as args:
+			# urllib3 decompresses the body chunk by chunk as it's read
+			response = self.session.request(method, url, **kwargs, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
+			self.record_response(args, route, response)
+			response.raise_for_status()
 		return response
 
-	def renew_token(self):
-		"""Renews the API token using the stored credentials"""
+	def record_response(self, span_args: dict, route: str, response: requests.Response):
+		"""Counts a response's sizes (decoded and as transferred), adding them and its status to its request span"""
+
+		size = len(response.content)
+		# Bytes urllib3 pulled off the wire, ie. before decompressing
+		wire_bytes = getattr(response.raw, "tell", None)
+		wire_size = wire_bytes() if callable(wire_bytes) else size
+		span_args.update(status=response.status_code, bytes=size, wire_bytes=wire_size)
+		with self.transferred_lock:
+			self.transferred[route][0] += size
+			self.transferred[route][1] += wire_size
+
+	def bytes_saved(self) -> int:
+		"""Response bytes compression spared so far"""
+
+		with self.transferred_lock:
+			return sum(size - wire_size for size, wire_size in self.transferred.values())
+
+	def set_pool_size(self, size: int):
+		"""Keeps up to size connections open, one per concurrent call"""
+
+		adapter = HTTPAdapter(pool_maxsize=size)
+		self.session.mount("https://", adapter)
+		self.session.mount("http://", adapter)
+
+	def renew_token(self, rejected_authorization=None):
+		"""
+		Renews the API token using the stored credentials. Given the rejected
+		Authorization header, it's skipped if another call already renewed it
+		"""
+
+		with self.token_lock, span("renew_token", "auth"):
+			if rejected_authorization is not None and self.headers.get("Authorization") != rejected_authorization:
+				return
 
-		username, password = self.credential_manager.get_stored_credentials()
-		if not username or not password:
-			raise MissingCredentialsError("Stored credentials not found for token renewal")
+			username, password = self.credential_manager.get_stored_credentials()
+			if not username or not password:
+				raise MissingCredentialsError("Stored credentials not found for token renewal")
 
-		login_result = self.login(username, password)
-		self.credential_manager.store_token(login_result["access_token"])
-		self.headers["Authorization"] = f"Bearer {login_result['access_token']}"
+			login_result = self.login(username, password)
+			self.credential_manager.store_token(login_result["access_token"])
+			self.headers["Authorization"] = f"Bearer {login_result['access_token']}"
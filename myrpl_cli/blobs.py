@@ -0,0 +1,153 @@
+"""
+Content-addressed store of fetched files, shared by every course mirror.
+
+Blobs are kept once under the cache dir, keyed by their sha256, and every
+file_id maps to the blobs of its files, so a file_id is downloaded only once.
+Read-only files (unit tests, IO tests) are hardlinked into activities rather
+than copied
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import stat
+import threading
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+from myrpl_cli.cache import get_cache_dir
+from myrpl_cli.tracing import span
+
+
+def temporary_path(path: str) -> str:
+	"""A sibling of path to write to before moving it in place (unique per thread)"""
+
+	return f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+
+class BlobStore:
+	"""Blobs by sha256, plus which blob every file of a file_id is (per server)"""
+
+	def __init__(self, base_url: str, cache_dir: Optional[str] = None):
+		self.base_url = base_url
+		self.cache_dir = cache_dir
+
+	def directory(self) -> str:
+		if self.cache_dir is None:
+			self.cache_dir = get_cache_dir("blobs")
+		return self.cache_dir
+
+	def blob_path(self, digest: str) -> str:
+		return os.path.join(self.directory(), digest[:2], digest)
+
+	def files_path(self, file_id: int) -> str:
+		# file_ids are only unique within a server
+		server = urlsplit(self.base_url).netloc.replace(":", "_")
+		return os.path.join(self.directory(), "files", server, f"{file_id}.json")
+
+	def put(self, content: str) -> str:
+		"""Stores content (once) and returns its digest"""
+
+		data = content.encode("utf8")
+		digest = hashlib.sha256(data).hexdigest()
+		path = self.blob_path(digest)
+		if not os.path.exists(path):
+			os.makedirs(os.path.dirname(path), exist_ok=True)
+			tmp_path = temporary_path(path)
+			with open(tmp_path, "wb") as file:
+				file.write(data)
+			# Blobs are hardlinked into activities: editing one would edit them all
+			os.chmod(tmp_path, 0o444)
+			os.replace(tmp_path, path)
+		return digest
+
+	def read(self, digest: str) -> Optional[str]:
+		try:
+			with open(self.blob_path(digest), "rb") as file:
+				data = file.read()
+		except OSError:
+			return None
+		# A corrupted (or truncated) blob is as good as a missing one
+		if hashlib.sha256(data).hexdigest() != digest:
+			return None
+		return data.decode("utf8")
+
+	def get_files(self, file_id: int) -> Optional[Dict[str, str]]:
+		"""The files of file_id, if they were stored (and all their blobs are intact)"""
+
+		try:
+			with open(self.files_path(file_id), encoding="utf8") as file:
+				digests = json.load(file)
+		except (OSError, ValueError):
+			return None
+
+		files = {}
+		for filename, digest in digests.items():
+			content = self.read(digest)
+			if content is None:
+				return None
+			files[filename] = content
+		return files
+
+	def put_files(self, file_id: int, files: Dict[str, str]):
+		"""Stores the files of file_id"""
+
+		digests = {filename: self.put(content) for filename, content in files.items()}
+		path = self.files_path(file_id)
+		os.makedirs(os.path.dirname(path), exist_ok=True)
+		tmp_path = temporary_path(path)
+		with open(tmp_path, "w", encoding="utf8") as file:
+			json.dump(digests, file)
+		os.replace(tmp_path, path)
+
+	def link(self, content: str, path: str) -> bool:
+		"""
+		Places content at path as a hardlink to its blob, falling back to a copy
+		(eg. when the cache dir is on another filesystem). Returns whether it linked
+		"""
+
+		digest = self.put(content)
+		blob_path = self.blob_path(digest)
+		with span("link", "disk", path=path) as args:
+			try:
+				if os.path.samefile(blob_path, path):
+					args["linked"] = True
+					return True
+			except OSError:
+				pass
+
+			tmp_path = temporary_path(path)
+			try:
+				os.link(blob_path, tmp_path)
+				linked = True
+			except OSError:
+				shutil.copyfile(blob_path, tmp_path)
+				linked = False
+				args["bytes"] = os.path.getsize(tmp_path)
+			self.replace(tmp_path, path)
+			args["linked"] = linked
+		return linked
+
+	def replace(self, tmp_path: str, path: str):
+		"""
+		os.replace, even onto a read-only file (Windows refuses to replace those).
+		If it was a blob's hardlink, clearing its read-only bit cleared the
+		blob's too, so the blob is made read-only again
+		"""
+
+		try:
+			os.replace(tmp_path, path)
+			return
+		except PermissionError:
+			if os.stat(path).st_mode & stat.S_IWRITE:
+				raise
+
+		with open(path, "rb") as file:
+			old_blob = self.blob_path(hashlib.sha256(file.read()).hexdigest())
+		os.chmod(path, stat.S_IREAD | stat.S_IWRITE)
+		try:
+			os.replace(tmp_path, path)
+		finally:
+			if os.path.exists(old_blob):
+				os.chmod(old_blob, 0o444)
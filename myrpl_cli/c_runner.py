@@ -0,0 +1,274 @@
+"""
+Builds and tests C activities.
+
+Like ccache, every translation unit is compiled once into an object cache
+keyed by what goes into it (its source, the activity's headers, the flags
+and the compiler), and binaries are cached by the objects they link.
+Across test runs only edited files get recompiled, and an untouched
+activity isn't even relinked
+"""
+
+import hashlib
+import json
+import os
+import shlex
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from functools import lru_cache
+from typing import List, Optional
+
+from myrpl_cli.blobs import temporary_path
+from myrpl_cli.cache import get_cache_dir
+from myrpl_cli.errors import BuildError
+from myrpl_cli.io_runner import run_io_activity
+from myrpl_cli.models import ActivityRunResult, MyRPLMetadata
+from myrpl_cli.sandbox import EXEC_FLAG, Limits, resolve_status, sandbox_env
+from myrpl_cli.tracing import span
+
+SOURCE_SUFFIX = ".c"
+HEADER_SUFFIX = ".h"
+PYTHON_SUFFIX = ".py"
+ENTRYPOINT = "main.c"
+UNIT_TEST_FILENAME = "unit_test.c"
+
+# Used when the activity doesn't set its own compilation flags
+DEFAULT_FLAGS = ["-g", "-O2", "-std=c11", "-Wall"]
+LINK_FLAGS = ["-lm"]
+# RPL's C unit tests are written with Criterion, which brings its own main()
+UNIT_TEST_LINK_FLAGS = ["-lcriterion"]
+
+
+def is_c_language(language: Optional[str]) -> bool:
+	"""Whether an RPL language (c, c_std11, ...) is C"""
+
+	language = (language or "").lower()
+	return language == "c" or language.startswith("c_")
+
+
+def source_suffixes(language: Optional[str]) -> tuple:
+	"""Suffixes of the files a student edits in an activity of language"""
+
+	return (SOURCE_SUFFIX, HEADER_SUFFIX) if is_c_language(language) else (PYTHON_SUFFIX,)
+
+
+def unit_test_filename(language: Optional[str]) -> str:
+	return UNIT_TEST_FILENAME if is_c_language(language) else "unit_test.py"
+
+
+def is_c_activity(metadata: MyRPLMetadata) -> bool:
+	return metadata.activity is not None and is_c_language(metadata.activity.language)
+
+
+def compilation_flags(metadata: MyRPLMetadata) -> List[str]:
+	flags = metadata.activity.compilation_flags if metadata.activity is not None else None
+	return shlex.split(flags) if flags else list(DEFAULT_FLAGS)
+
+
+def default_compiler() -> str:
+	return os.environ.get("CC") or shutil.which("cc") or "gcc"
+
+
+@lru_cache(maxsize=None)
+def compiler_version(compiler: str) -> str:
+	"""The compiler's --version banner, so upgrading it invalidates the cache"""
+
+	try:
+		return subprocess.run([compiler, "--version"], capture_output=True, text=True, check=False).stdout
+	except OSError as e:
+		raise BuildError(f"{compiler} not found: {e}") from e
+
+
+def digest(*parts) -> str:
+	return hashlib.sha256(json.dumps(parts).encode("utf8")).hexdigest()
+
+
+def headers_digest(activity_path: str) -> str:
+	"""
+	Digest of every header in the activity. Any of them changing invalidates
+	all of its objects (system headers are covered by the compiler's version)
+	"""
+
+	hasher = hashlib.sha256()
+	for filename in sorted(os.listdir(activity_path)):
+		if filename.endswith(HEADER_SUFFIX):
+			hasher.update(filename.encode("utf8") + b"\0")
+			with open(os.path.join(activity_path, filename), "rb") as file:
+				hasher.update(hashlib.sha256(file.read()).digest())
+	return hasher.hexdigest()
+
+
+class ObjectCache:
+	"""Compiled objects and linked binaries, by the digest of their inputs"""
+
+	def __init__(self, cache_dir: Optional[str] = None, compiler: Optional[str] = None):
+		self.cache_dir = cache_dir
+		self.compiler = compiler or default_compiler()
+		self.lock = threading.Lock()
+		# Translation units actually compiled (as opposed to found in the cache)
+		self.compiled = 0
+		self.linked = 0
+
+	def directory(self) -> str:
+		if self.cache_dir is None:
+			self.cache_dir = get_cache_dir("c-objects")
+		return self.cache_dir
+
+	def path(self, key: str, suffix: str = "") -> str:
+		return os.path.join(self.directory(), key[:2], key + suffix)
+
+	def run_compiler(self, arguments: List[str], output_path: str, cwd: str):
+		"""Runs the compiler into a temporary file, moving it in place only if it succeeds"""
+
+		os.makedirs(os.path.dirname(output_path), exist_ok=True)
+		tmp_path = temporary_path(output_path)
+		process = subprocess.run(
+			[self.compiler, *arguments, "-o", tmp_path],
+			cwd=cwd,
+			stdin=subprocess.DEVNULL,
+			capture_output=True,
+			text=True,
+			errors="replace",
+		)
+		if process.returncode != 0:
+			if os.path.exists(tmp_path):
+				os.remove(tmp_path)
+			raise BuildError(process.stderr.strip() or f"{self.compiler} exited with {process.returncode}")
+		os.replace(tmp_path, output_path)
+
+	def compile(self, activity_path: str, filename: str, flags: List[str], headers: str) -> str:
+		"""The object of a translation unit, compiled only if it isn't cached yet"""
+
+		with open(os.path.join(activity_path, filename), "rb") as file:
+			source = hashlib.sha256(file.read()).hexdigest()
+		key = digest(compiler_version(self.compiler), flags, headers, filename, source)
+		object_path = self.path(key, ".o")
+
+		with span("compile", "build", path=filename) as args:
+			cached = os.path.exists(object_path)
+			if not cached:
+				self.run_compiler([*flags, "-c", filename], object_path, activity_path)
+				with self.lock:
+					self.compiled += 1
+			args["cached"] = cached
+		return object_path
+
+	def link(self, objects: List[str], flags: List[str]) -> str:
+		"""A binary linking objects, linked only if it isn't cached yet"""
+
+		key = digest(compiler_version(self.compiler), flags, [os.path.basename(path) for path in objects])
+		binary_path = self.path(key)
+
+		with span("link", "build") as args:
+			cached = os.path.exists(binary_path)
+			if not cached:
+				self.run_compiler([*objects, *flags], binary_path, self.directory())
+				with self.lock:
+					self.linked += 1
+			args["cached"] = cached
+		return binary_path
+
+	def build(self, activity_path: str, sources: List[str], flags: List[str], link_flags: List[str]) -> str:
+		"""Compiles (what changed of) sources and links them. Raises BuildError"""
+
+		headers = headers_digest(activity_path)
+		objects = [self.compile(activity_path, filename, flags, headers) for filename in sources]
+		return self.link(objects, [*flags, *link_flags])
+
+
+def activity_sources(activity_path: str, unit_tests: bool) -> List[str]:
+	"""
+	The translation units of an activity. Unit tests replace the
+	solution's main.c (Criterion provides main)
+	"""
+
+	sources = sorted(f for f in os.listdir(activity_path) if f.endswith(SOURCE_SUFFIX))
+	if unit_tests:
+		sources = [f for f in sources if f != ENTRYPOINT]
+	return sources
+
+
+def sandboxed(binary_path: str) -> List[str]:
+	"""Command line running a binary under the sandbox's resource limits"""
+
+	return [sys.executable, "-m", "myrpl_cli.sandbox", EXEC_FLAG, binary_path]
+
+
+def run_unit_tests(activity_path: str, binary_path: str, metadata, limits: Limits, start: float) -> ActivityRunResult:
+	"""Runs a Criterion test binary; its exit code tells whether every test passed"""
+
+	timed_out = False
+	try:
+		process = subprocess.run(
+			sandboxed(binary_path),
+			cwd=activity_path,
+			env=sandbox_env(limits),
+			stdin=subprocess.DEVNULL,
+			stdout=subprocess.PIPE,
+			stderr=subprocess.STDOUT,
+			text=True,
+			errors="replace",
+			timeout=limits.wall_time,
+		)
+		exit_code, output = process.returncode, process.stdout
+	except subprocess.TimeoutExpired as e:
+		timed_out = True
+		exit_code = -1
+		output = e.output.decode("utf8", errors="replace") if isinstance(e.output, bytes) else e.output or ""
+
+	if timed_out or exit_code < 0:
+		status = resolve_status(exit_code, [], timed_out)
+	else:
+		status = "SUCCESS" if exit_code == 0 else "FAILURE"
+
+	return ActivityRunResult(
+		path=activity_path,
+		metadata=metadata,
+		passed=status == "SUCCESS",
+		status=status,
+		exit_code=exit_code,
+		duration=time.perf_counter() - start,
+		output=output,
+	)
+
+
+def run_c_activity(
+	activity_path: str,
+	metadata: MyRPLMetadata,
+	limits: Optional[Limits] = None,
+	fail_fast: bool = False,
+	objects: Optional[ObjectCache] = None,
+) -> ActivityRunResult:
+	"""
+	Builds a C activity through the object cache and runs its
+	Criterion unit tests (unit_test.c) or its IO tests against the binary
+	"""
+
+	activity_path = os.path.abspath(activity_path)
+	limits = limits or Limits()
+	objects = objects or ObjectCache()
+	unit_tests = os.path.exists(os.path.join(activity_path, UNIT_TEST_FILENAME))
+	start = time.perf_counter()
+
+	link_flags = LINK_FLAGS + (UNIT_TEST_LINK_FLAGS if unit_tests else [])
+	try:
+		sources = activity_sources(activity_path, unit_tests)
+		if not unit_tests and ENTRYPOINT not in sources:
+			raise BuildError(f"{ENTRYPOINT} not found")
+		binary_path = objects.build(activity_path, sources, compilation_flags(metadata), link_flags)
+	except BuildError as e:
+		return ActivityRunResult(
+			path=activity_path,
+			metadata=metadata,
+			passed=False,
+			status="BUILD_ERROR",
+			exit_code=1,
+			duration=time.perf_counter() - start,
+			output=str(e),
+		)
+
+	if unit_tests:
+		return run_unit_tests(activity_path, binary_path, metadata, limits, start)
+	return run_io_activity(activity_path, metadata, limits, fail_fast=fail_fast, command=sandboxed(binary_path))
@@ -0,0 +1,96 @@
+import hashlib
+import os
+import sys
+import threading
+from typing import List, Optional
+
+from pydantic import ValidationError
+
+from myrpl_cli import __version__
+from myrpl_cli.models import ActivityRunResult
+
+CACHE_DIR_ENV_VAR = "MYRPL_CACHE_DIR"
+
+
+def get_cache_dir(*parts: str) -> str:
+	"""
+	Returns (and creates) myrpl's cache directory, or a subdirectory of it.
+	Honors $MYRPL_CACHE_DIR and then $XDG_CACHE_HOME
+	"""
+
+	base = os.environ.get(CACHE_DIR_ENV_VAR)
+	if not base:
+		xdg_cache = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+		base = os.path.join(xdg_cache, "myrpl-cli")
+
+	path = os.path.join(base, *parts)
+	os.makedirs(path, exist_ok=True)
+	return path
+
+
+def list_input_files(activity_path: str) -> List[str]:
+	"""
+	Lists every file that can affect an activity's tests (relative, sorted).
+	Hidden files and __pycache__ are ignored
+	"""
+
+	files = []
+	for dirpath, dirnames, filenames in os.walk(activity_path):
+		dirnames[:] = [d for d in dirnames if not d.startswith((".", "__"))]
+		for filename in filenames:
+			if filename.startswith("."):
+				continue
+			files.append(os.path.relpath(os.path.join(dirpath, filename), activity_path))
+
+	return sorted(files)
+
+
+def hash_activity(activity_path: str, extra: Optional[List[str]] = None) -> str:
+	"""
+	Hashes an activity's input files (names and contents), the interpreter
+	version and any extra strings (eg. pytest args)
+	"""
+
+	digest = hashlib.sha256()
+	for part in (sys.version, __version__, *(extra or [])):
+		digest.update(part.encode("utf8") + b"\0")
+
+	for relative_path in list_input_files(activity_path):
+		digest.update(relative_path.replace(os.sep, "/").encode("utf8") + b"\0")
+		with open(os.path.join(activity_path, relative_path), "rb") as file:
+			digest.update(hashlib.sha256(file.read()).digest())
+
+	return digest.hexdigest()
+
+
+class ResultCache:
+	"""Content addressed cache of activity test results"""
+
+	def __init__(self, cache_dir: Optional[str] = None):
+		self.cache_dir = cache_dir or get_cache_dir("test_results")
+
+	def entry_path(self, key: str) -> str:
+		"""Path of the entry for a given key"""
+
+		return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+	def get(self, key: str) -> Optional[ActivityRunResult]:
+		"""Returns the cached result for key, if any"""
+
+		try:
+			with open(self.entry_path(key), encoding="utf8") as file:
+				return ActivityRunResult.model_validate_json(file.read())
+		except (OSError, ValidationError):
+			return None
+
+	def put(self, key: str, result: ActivityRunResult):
+		"""Stores a result under key"""
+
+		path = self.entry_path(key)
+		os.makedirs(os.path.dirname(path), exist_ok=True)
+
+		# Write + rename so concurrent runs never read half written entries
+		tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+		with open(tmp_path, "w", encoding="utf8") as file:
+			file.write(result.model_dump_json())
+		os.replace(tmp_path, path)
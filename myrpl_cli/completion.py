@@ -0,0 +1,244 @@
+"""
+Shell completion for course IDs, categories and activity names.
+
+`list` and `fetch` keep a small index (completion.tsv, in the cache dir)
+of the courses, categories and activities they saw. The generated bash,
+zsh and fish scripts read it with awk, so completing never starts Python,
+touches the network or unlocks the keyring
+"""
+
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+
+from myrpl_cli.blobs import temporary_path
+from myrpl_cli.cache import get_cache_dir
+from myrpl_cli.models import Activity, Course
+
+INDEX_FILENAME = "completion.tsv"
+SHELLS = ("bash", "zsh", "fish")
+
+# Commands whose positional arguments are course IDs
+COURSE_COMMANDS = ("fetch", "status", "export")
+# Options taking a category or an activity (of the course IDs given)
+CATEGORY_OPTIONS = ("-c", "--category")
+ACTIVITY_OPTIONS = ("-a", "--activity")
+
+# Rows are kind, course ID, ID, name
+Row = Tuple[str, int, int, str]
+
+# Same lookup as get_cache_dir, in shell
+SHELL_INDEX_PATH = f'"${{MYRPL_CACHE_DIR:-${{XDG_CACHE_HOME:-$HOME/.cache}}/myrpl-cli}}/{INDEX_FILENAME}"'
+
+
+def index_path() -> str:
+	return os.path.join(get_cache_dir(), INDEX_FILENAME)
+
+
+def clean_name(name: str) -> str:
+	"""Names on a single line without tabs, so rows stay parseable"""
+
+	return re.sub(r"\s", " ", name).strip()
+
+
+def read_index(path: Optional[str] = None) -> List[Row]:
+	try:
+		with open(path or index_path(), encoding="utf8") as file:
+			lines = file.read().splitlines()
+	except OSError:
+		return []
+
+	rows = []
+	for line in lines:
+		fields = line.split("\t")
+		if len(fields) == 4 and fields[1].isdigit() and fields[2].isdigit():
+			rows.append((fields[0], int(fields[1]), int(fields[2]), fields[3]))
+	return rows
+
+
+def update_index(
+	courses: Optional[List[Course]] = None,
+	activities: Optional[Dict[int, List[Activity]]] = None,
+	path: Optional[str] = None,
+	all_courses: bool = False,
+):
+	"""
+	Adds (or replaces) courses, and the categories and activities of the courses
+	in activities (course ID -> all of its activities). With all_courses, courses
+	are every course there is, and the rest are dropped
+	"""
+
+	path = path or index_path()
+	activities = activities or {}
+	course_ids = {course.id for course in courses or []}
+	rows = [
+		row
+		for row in read_index(path)
+		if not (row[0] == "course" and (all_courses or row[1] in course_ids))
+		and not (row[0] != "course" and row[1] in activities)
+	]
+
+	for course in courses or []:
+		rows.append(("course", course.id, course.id, clean_name(course.name)))
+	for course_id, course_activities in activities.items():
+		categories = {activity.category_id: activity.category_name for activity in course_activities}
+		rows.extend(("category", course_id, category_id, clean_name(name)) for category_id, name in categories.items())
+		rows.extend(("activity", course_id, activity.id, clean_name(activity.name)) for activity in course_activities)
+
+	os.makedirs(os.path.dirname(path), exist_ok=True)
+	tmp_path = temporary_path(path)
+	with open(tmp_path, "w", encoding="utf8") as file:
+		file.writelines(f"{kind}\t{course_id}\t{item_id}\t{name}\n" for kind, course_id, item_id, name in rows)
+	os.replace(tmp_path, path)
+
+
+def awk_lookup(output: str) -> str:
+	"""
+	A shell command printing output (an awk expression) for every row of kind $1
+	belonging to one of the course IDs in $2 (any course if empty)
+	"""
+
+	program = f'$1 == kind && (courses == "" || index(" " courses " ", " " $2 " ")) {{ print {output} }}'
+	return f"""local index={SHELL_INDEX_PATH}
+	[ -r "$index" ] && awk -F '\\t' -v kind="$1" -v courses="$2" '{program}' "$index\""""
+
+
+def fetch_patterns(options: tuple) -> str:
+	"""case patterns matching "$command $prev" for fetch's options"""
+
+	return "|".join(f'"fetch {option}"' for option in options)
+
+
+def bash_script(commands: Dict[str, List[str]], value_options: List[str]) -> str:
+	options = "\n".join(f'\t\t{command}) options="{" ".join(opts)}" ;;' for command, opts in commands.items())
+	return f"""# myrpl bash completion: eval "$(myrpl completion bash)"
+_myrpl_index() {{
+	{awk_lookup('($1 == "course" ? $3 : $4)')}
+}}
+
+_myrpl() {{
+	local cur="${{COMP_WORDS[COMP_CWORD]}}" prev="${{COMP_WORDS[COMP_CWORD-1]}}"
+	local command="${{COMP_WORDS[1]}}" options="" kind="" ids="" skip="" word
+	if [ "$COMP_CWORD" -eq 1 ]; then
+		COMPREPLY=($(compgen -W "{" ".join(commands)}" -- "$cur"))
+		return
+	fi
+
+	# Course IDs typed so far (not option values) narrow down categories and activities
+	for word in "${{COMP_WORDS[@]:2:COMP_CWORD-2}}"; do
+		if [ -n "$skip" ]; then
+			skip=""
+		elif [[ "$word" =~ ^[0-9]+$ ]]; then
+			ids="$ids $word"
+		else
+			case "$word" in {"|".join(value_options)}) skip=1 ;; esac
+		fi
+	done
+
+	case "$command" in
+{options}
+	esac
+	case "$command $prev" in
+		{fetch_patterns(CATEGORY_OPTIONS)}) kind=category ;;
+		{fetch_patterns(ACTIVITY_OPTIONS)}) kind=activity ;;
+		*)
+			if [[ "$cur" == -* ]]; then
+				COMPREPLY=($(compgen -W "$options" -- "$cur"))
+				return
+			fi
+			case "$command" in {"|".join(COURSE_COMMANDS)}) kind=course ;; esac
+			;;
+	esac
+	[ -z "$kind" ] && return
+
+	local IFS=$'\\n'
+	COMPREPLY=($(compgen -W "$(_myrpl_index "$kind" "$ids")" -- "$cur"))
+	COMPREPLY=("${{COMPREPLY[@]// /\\\\ }}")
+}}
+
+complete -F _myrpl myrpl
+"""
+
+
+def zsh_script(commands: Dict[str, List[str]], value_options: List[str]) -> str:
+	options = "\n".join(f"\t\t{command}) options=({' '.join(opts)}) ;;" for command, opts in commands.items())
+	return f"""#compdef myrpl
+# myrpl zsh completion: eval "$(myrpl completion zsh)"
+_myrpl_index() {{
+	{awk_lookup('($1 == "course" ? $3 ":" $4 : $4)')}
+}}
+
+_myrpl() {{
+	local command=${{words[2]}} prev=${{words[CURRENT-1]}} kind="" ids="" skip="" word
+	local -a options candidates
+	if (( CURRENT == 2 )); then
+		compadd -- {" ".join(commands)}
+		return
+	fi
+
+	for word in ${{words[3,CURRENT-1]}}; do
+		if [[ -n $skip ]]; then
+			skip=""
+		elif [[ $word == <-> ]]; then
+			ids="$ids $word"
+		else
+			case $word in {"|".join(value_options)}) skip=1 ;; esac
+		fi
+	done
+
+	case $command in
+{options}
+	esac
+	case "$command $prev" in
+		{fetch_patterns(CATEGORY_OPTIONS)}) kind=category ;;
+		{fetch_patterns(ACTIVITY_OPTIONS)}) kind=activity ;;
+		*)
+			if [[ $PREFIX == -* ]]; then
+				compadd -- $options
+				return
+			fi
+			case $command in {"|".join(COURSE_COMMANDS)}) kind=course ;; esac
+			;;
+	esac
+	[[ -z $kind ]] && return
+
+	candidates=(${{(f)"$(_myrpl_index $kind "$ids")"}})
+	if [[ $kind == course ]]; then
+		_describe course candidates
+	else
+		compadd -a candidates
+	fi
+}}
+
+compdef _myrpl myrpl
+"""
+
+
+def fish_script(commands: Dict[str, List[str]], value_options: List[str]) -> str:
+	lines = [
+		"# myrpl fish completion: myrpl completion fish | source",
+		"function __myrpl_index",
+		"\tset -l dir $MYRPL_CACHE_DIR",
+		'\ttest -n "$dir"; or set dir (test -n "$XDG_CACHE_HOME"; and echo $XDG_CACHE_HOME; or echo $HOME/.cache)/myrpl-cli',
+		f"\ttest -r $dir/{INDEX_FILENAME}; or return",
+		f"\tawk -F '\\t' -v kind=$argv[1] '$1 == kind {{ print ($1 == \"course\" ? $3 \"\\t\" $4 : $4) }}' $dir/{INDEX_FILENAME}",
+		"end",
+		"",
+		"complete -c myrpl -f",
+		f'complete -c myrpl -n __fish_use_subcommand -a "{" ".join(commands)}"',
+		f'complete -c myrpl -n "__fish_seen_subcommand_from {" ".join(COURSE_COMMANDS)}" -a "(__myrpl_index course)"',
+	]
+	for command, opts in commands.items():
+		for option in opts:
+			flag = f"-l {option[2:]}" if option.startswith("--") else f"-s {option[1:]}"
+			lines.append(f'complete -c myrpl -n "__fish_seen_subcommand_from {command}" {flag}')
+	for options, kind in ((CATEGORY_OPTIONS, "category"), (ACTIVITY_OPTIONS, "activity")):
+		flags = f"-s {options[0][1:]} -l {options[1][2:]}"
+		lines.append(f'complete -c myrpl -n "__fish_seen_subcommand_from fetch" {flags} -x -a "(__myrpl_index {kind})"')
+	return "\n".join(lines) + "\n"
+
+
+def completion_script(shell: str, commands: Dict[str, List[str]], value_options: List[str]) -> str:
+	"""The completion script for shell, given every command, its options and which of them take a value"""
+
+	return {"bash": bash_script, "zsh": zsh_script, "fish": fish_script}[shell](commands, value_options)
@@ -1,5 +1,7 @@
 from keyrings.cryptfile.cryptfile import CryptFileKeyring
 
+from myrpl_cli.tracing import span
+
 SERVICE_NAME = "myrpl_cli"
 
 
@@ -8,16 +10,21 @@ class CredentialManager:
 		self.kr = CryptFileKeyring()
 
 	def get_stored_credentials(self):
-		username = self.kr.get_password(SERVICE_NAME, "username")
-		password = self.kr.get_password(SERVICE_NAME, "password")
+		# The first keyring access prompts for the keyring's password (unlock)
+		with span("get_stored_credentials", "keyring"):
+			username = self.kr.get_password(SERVICE_NAME, "username")
+			password = self.kr.get_password(SERVICE_NAME, "password")
 		return username, password
 
 	def store_credentials(self, username, password):
-		self.kr.set_password(SERVICE_NAME, "username", username)
-		self.kr.set_password(SERVICE_NAME, "password", password)
+		with span("store_credentials", "keyring"):
+			self.kr.set_password(SERVICE_NAME, "username", username)
+			self.kr.set_password(SERVICE_NAME, "password", password)
 
 	def get_stored_token(self):
-		return self.kr.get_password(SERVICE_NAME, "token")
+		with span("get_stored_token", "keyring"):
+			return self.kr.get_password(SERVICE_NAME, "token")
 
 	def store_token(self, token):
-		self.kr.set_password(SERVICE_NAME, "token", token)
+		with span("store_token", "keyring"):
+			self.kr.set_password(SERVICE_NAME, "token", token)
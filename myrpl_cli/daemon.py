@@ -0,0 +1,302 @@
+"""
+`myrpl daemon`: keeps the enrolled courses warm in the background.
+
+Every interval (give or take some jitter) it lists each course's activities
+and only looks into the ones that are new or changed since its last sync:
+new ones are saved to the mirror, and changed ones get their details, files
+and submissions refreshed in the caches (the mirror's copy is never
+overwritten, same as a plain `fetch`). It runs at low priority, one request
+at a time.
+
+A unix socket answers whether a course is up to date, so a foreground
+`fetch` or `status` can skip the network altogether
+"""
+
+import hashlib
+import json
+import logging
+import os
+import random
+import socket
+import socketserver
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import requests
+from pydantic import BaseModel
+from tqdm import tqdm
+
+from myrpl_cli.blobs import temporary_path
+from myrpl_cli.cache import get_cache_dir
+from myrpl_cli.errors import AuthError, OfflineError
+from myrpl_cli.local_tree import CourseIndex
+from myrpl_cli.models import Activity, Course
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INTERVAL = 15 * 60
+DEFAULT_JITTER = 0.1
+NICENESS = 10
+QUERY_TIMEOUT = 0.2
+# What a cycle logs and leaves for the next one: unreachable or rejecting API, expired
+# credentials, malformed responses (pydantic's ValidationError is a ValueError)
+SYNC_ERRORS = (requests.RequestException, OfflineError, AuthError, ValueError)
+
+
+class CourseSync(BaseModel):
+	"""CourseSync model (what the daemon last saw of a course)"""
+
+	name: str
+	synced_at: float
+	# Activity ID -> digest of its entry in the course's activity list
+	activities: Dict[int, str] = {}
+	# (category, name) of every activity, to tell whether the mirror still has them all
+	paths: List[Tuple[str, str]] = []
+
+
+class DaemonState(BaseModel):
+	"""DaemonState model (persisted, so a restarted daemon knows what changed)"""
+
+	root: str = ""
+	courses: Dict[int, CourseSync] = {}
+
+
+def daemon_dir() -> str:
+	return get_cache_dir("daemon")
+
+
+def socket_path() -> str:
+	return os.path.join(daemon_dir(), "daemon.sock")
+
+
+def activity_digest(activity: Activity) -> str:
+	"""Changes whenever the activity does (including its submission status)"""
+
+	return hashlib.sha256(activity.model_dump_json().encode("utf8")).hexdigest()
+
+
+def query_daemon(request: dict, path: Optional[str] = None, timeout: float = QUERY_TIMEOUT) -> Optional[dict]:
+	"""Asks a running daemon, returning None if there's none (or it doesn't answer in time)"""
+
+	if not hasattr(socket, "AF_UNIX"):
+		return None
+
+	try:
+		with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+			client.settimeout(timeout)
+			client.connect(path or socket_path())
+			client.sendall(json.dumps(request).encode("utf8") + b"\n")
+			with client.makefile("rb") as response:
+				return json.loads(response.readline())
+	except (OSError, ValueError):
+		return None
+
+
+def mirrors_course(root: str, course: dict) -> bool:
+	"""Whether the mirror at root has every activity the daemon last saw of a course"""
+
+	index = CourseIndex.scan(os.path.join(root, "courses", course["name"]))
+	return all(index.has_activity(category, name) for category, name in course.get("paths", []))
+
+
+def fresh_courses(
+	course_ids: Optional[List[int]], root: Optional[str] = None, path: Optional[str] = None
+) -> Optional[List[int]]:
+	"""
+	The courses (by default, every enrolled one) if a running daemon (syncing the
+	mirror at root, if given) says they're all up to date, None otherwise. Given
+	root, they must be whole there too: an activity deleted since the last sync
+	has to be fetched again
+	"""
+
+	answer = query_daemon({"course_ids": course_ids}, path)
+	if answer is None or (root is not None and answer.get("root") != os.path.realpath(root)):
+		return None
+
+	courses = answer.get("courses", {})
+	ids = course_ids or [int(course_id) for course_id in courses]
+	if not ids or not all(courses.get(str(course_id), {}).get("fresh") for course_id in ids):
+		return None
+	if root is not None and not all(mirrors_course(root, courses[str(course_id)]) for course_id in ids):
+		return None
+	return ids
+
+
+class Daemon:
+	"""Syncs the enrolled courses of a mirror (myrpl's root) on a schedule"""
+
+	def __init__(
+		self,
+		myrpl,
+		interval: float = DEFAULT_INTERVAL,
+		jitter: float = DEFAULT_JITTER,
+		state_path: Optional[str] = None,
+	):
+		self.myrpl = myrpl
+		self.interval = interval
+		self.jitter = jitter
+		self.state_path = state_path or os.path.join(daemon_dir(), "state.json")
+		self.state = self.load_state()
+		self.lock = threading.Lock()
+		self.stopped = threading.Event()
+		self.server = None
+
+	def load_state(self) -> DaemonState:
+		root = os.path.realpath(self.myrpl.root)
+		try:
+			with open(self.state_path, encoding="utf8") as file:
+				state = DaemonState(**json.load(file))
+		except (OSError, ValueError):
+			state = DaemonState()
+		# Another mirror's activities say nothing about this one
+		return state if state.root == root else DaemonState(root=root)
+
+	def save_state(self):
+		tmp_path = temporary_path(self.state_path)
+		with open(tmp_path, "w", encoding="utf8") as file:
+			file.write(self.state.model_dump_json())
+		os.replace(tmp_path, self.state_path)
+
+	def next_delay(self) -> float:
+		"""The interval, off by up to jitter (a fraction of it) either way"""
+
+		return self.interval * (1 + random.uniform(-self.jitter, self.jitter))
+
+	def sync_course(self, course: Course) -> int:
+		"""
+		Saves new (or locally missing) activities and warms the caches of
+		changed ones. Returns how many it looked into
+		"""
+
+		activities = self.myrpl.api.fetch_activities(course)
+		previous = self.state.courses.get(course.id)
+		known = previous.activities if previous is not None else {}
+		digests = {activity.id: activity_digest(activity) for activity in activities}
+		index = CourseIndex.scan(self.myrpl.course_path(course))
+
+		synced = 0
+		with tqdm(total=len(activities), disable=True) as pbar:
+			for activity in activities:
+				missing = not index.has_activity(activity.category_name, activity.name)
+				if known.get(activity.id) == digests[activity.id] and not missing:
+					continue
+				synced += 1
+				if missing:
+					self.myrpl.fetch_activity(activity, pbar, False, index, None)
+				elif activity.id in known:
+					# Changed (eg. submitted from the web): requesting it refreshes the
+					# persisted details, the blob store and the submission snapshots
+					self.myrpl.activity_files(self.myrpl.api.fetch_activity_info(activity))
+
+		with self.lock:
+			self.state.courses[course.id] = CourseSync(
+				name=course.name,
+				synced_at=time.time(),
+				activities=digests,
+				paths=[(activity.category_name, activity.name) for activity in activities],
+			)
+		return synced
+
+	def sync(self):
+		"""Syncs every enrolled course once (a course failing doesn't stop the rest)"""
+
+		api = self.myrpl.api
+		# A connection error turns the API offline for good: give the network another try
+		api.offline = False
+		try:
+			courses = self.myrpl.select_courses(all_enrolled=True)
+		except SYNC_ERRORS as e:
+			logger.warning("Can't list courses: %s", e)
+			return
+
+		for course in courses:
+			try:
+				start = time.perf_counter()
+				synced = self.sync_course(course)
+			except SYNC_ERRORS as e:
+				logger.warning("Couldn't sync %s: %s", course.name, e)
+				continue
+			if api.offline:
+				# Answered from the persisted responses: nothing new was learned
+				with self.lock:
+					self.state.courses.pop(course.id, None)
+				logger.warning("Couldn't sync %s: %s is unreachable", course.name, api.base_url)
+				return
+			logger.info("Synced %s (%i activities changed) in %.2fs", course.name, synced, time.perf_counter() - start)
+
+		with self.lock:
+			self.save_state()
+
+	def status(self, course_ids: Optional[List[int]] = None) -> dict:
+		"""Every (or the given) synced course, and whether it's fresh (synced less than an interval ago)"""
+
+		now = time.time()
+		max_age = self.interval * (1 + self.jitter)
+		with self.lock:
+			courses = {
+				course_id: {
+					"name": sync.name,
+					"synced_at": sync.synced_at,
+					"fresh": now - sync.synced_at <= max_age,
+					"paths": sync.paths,
+				}
+				for course_id, sync in self.state.courses.items()
+				if not course_ids or course_id in course_ids
+			}
+		return {"root": self.state.root, "pid": os.getpid(), "courses": courses}
+
+	def serve(self, path: Optional[str] = None):
+		"""Answers status queries on a unix socket, from a background thread"""
+
+		if not hasattr(socketserver, "ThreadingUnixStreamServer"):
+			logger.warning("Unix sockets aren't supported here: foreground commands won't know about the daemon")
+			return
+
+		path = path or socket_path()
+		if query_daemon({}, path) is not None:
+			raise OSError(f"a daemon is already listening on {path}")
+		if os.path.exists(path):
+			# Left behind by a daemon that didn't exit cleanly
+			os.remove(path)
+
+		daemon = self
+
+		class Handler(socketserver.StreamRequestHandler):
+			def handle(self):
+				try:
+					request = json.loads(self.rfile.readline())
+				except ValueError:
+					return
+				answer = daemon.status(request.get("course_ids"))
+				self.wfile.write(json.dumps(answer).encode("utf8") + b"\n")
+
+		self.server = socketserver.ThreadingUnixStreamServer(path, Handler)
+		self.server.daemon_threads = True
+		threading.Thread(target=self.server.serve_forever, name="myrpl-daemon", daemon=True).start()
+
+	def run(self, cycles: Optional[int] = None):
+		"""Syncs every interval (forever, or cycles times) until stopped"""
+
+		if hasattr(os, "nice"):
+			os.nice(NICENESS)
+		self.serve()
+		logger.info("Keeping the enrolled courses under %s warm, every %is", self.state.root, self.interval)
+		try:
+			cycle = 0
+			while not self.stopped.is_set():
+				self.sync()
+				cycle += 1
+				if cycles is not None and cycle >= cycles:
+					break
+				self.stopped.wait(self.next_delay())
+		finally:
+			self.close()
+
+	def close(self):
+		self.stopped.set()
+		if self.server is not None:
+			self.server.shutdown()
+			self.server.server_close()
+			os.remove(self.server.server_address)
+			self.server = None
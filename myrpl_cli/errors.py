@@ -6,9 +6,17 @@ class NotMyRPLDirectoryError(MyRPLError):
 	"""Not in a myrpl directory error"""
 
 
+class OfflineError(MyRPLError):
+	"""Response not available offline error"""
+
+
 class AuthError(BaseException):
 	"""Generic authentication error"""
 
 
 class MissingCredentialsError(AuthError):
 	"""Missing credentials error"""
+
+
+class BuildError(MyRPLError):
+	"""Compilation (or linking) error"""
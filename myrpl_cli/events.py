@@ -0,0 +1,54 @@
+"""
+Machine readable output (`--output ndjson`): one JSON object per event
+(course, activity saved or skipped, test result, ...), written to stdout
+as it happens and flushed right away, so scripts can process long runs
+as they go instead of scraping logs at the end
+"""
+
+import json
+import sys
+import threading
+from typing import Optional, TextIO
+
+from myrpl_cli.models import Activity, ActivityRunResult, Course
+
+OUTPUT_FORMATS = ("text", "ndjson")
+
+
+class EventStream:
+	"""Writes events as newline delimited JSON (safe to use from several threads)"""
+
+	def __init__(self, stream: Optional[TextIO] = None):
+		self.stream = stream or sys.stdout
+		self.lock = threading.Lock()
+
+	def emit(self, event: str, **fields):
+		line = json.dumps({"event": event, **fields}, ensure_ascii=False, default=str)
+		with self.lock:
+			self.stream.write(line + "\n")
+			self.stream.flush()
+
+
+def course_fields(course: Course) -> dict:
+	return {"id": course.id, "name": course.name, "enrolled": course.enrolled, "accepted": course.accepted}
+
+
+def activity_fields(activity: Activity) -> dict:
+	return {
+		"course_id": activity.course.id,
+		"category_id": activity.category_id,
+		"category": activity.category_name,
+		"id": activity.id,
+		"name": activity.name,
+		"status": activity.submission_status,
+	}
+
+
+def result_fields(result: ActivityRunResult) -> dict:
+	activity = result.metadata.activity
+	return {
+		"course_id": result.metadata.course.id,
+		"id": activity.id,
+		"name": activity.name,
+		**result.model_dump(mode="json", exclude={"metadata"}),
+	}
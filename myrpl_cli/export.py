@@ -0,0 +1,165 @@
+"""
+Streams a course into a tar (optionally compressed) or zip archive, written
+to a file or to stdout (eg. `myrpl export 57 | ssh host tar x`).
+
+Files are streamed one at a time, in chunks, straight into the archive:
+no copy of the course is made on disk and memory doesn't grow with its size
+"""
+
+import contextlib
+import io
+import os
+import sys
+import tarfile
+import time
+import zipfile
+from typing import BinaryIO, Dict, Iterator, Optional
+
+import toml
+
+from myrpl_cli.errors import MyRPLError
+
+# Archive format -> file name suffixes
+FORMATS = {
+	"tar": (".tar",),
+	"tar.gz": (".tar.gz", ".tgz"),
+	"tar.bz2": (".tar.bz2", ".tbz2"),
+	"tar.xz": (".tar.xz", ".txz"),
+	"tar.zst": (".tar.zst", ".tzst"),
+	"zip": (".zip",),
+}
+
+# Not worth shipping to other machines
+EXCLUDED_DIRS = {"__pycache__", ".pytest_cache"}
+
+
+def guess_format(output: str) -> str:
+	"""The format an output file name asks for (plain tar for stdout)"""
+
+	for archive_format, suffixes in FORMATS.items():
+		if output.endswith(suffixes):
+			return archive_format
+	if output == "-":
+		return "tar"
+	raise ValueError(f"can't tell the archive format of {output} (use one of {', '.join(FORMATS)})")
+
+
+def find_local_course(course_id: int, root: str = ".") -> Optional[str]:
+	"""The path of a course fetched under root, found by its .myrpl"""
+
+	courses_path = os.path.join(root, "courses")
+	if not os.path.isdir(courses_path):
+		return None
+
+	for entry in os.scandir(courses_path):
+		try:
+			metadata = toml.load(os.path.join(entry.path, ".myrpl"))
+		except (OSError, toml.TomlDecodeError):
+			continue
+		if metadata.get("course", {}).get("id") == course_id:
+			return entry.path
+	return None
+
+
+class Archive:
+	"""Closes (ie. finishes writing) the archive when its block exits"""
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *_):
+		self.close()
+
+	def close(self):
+		raise NotImplementedError
+
+
+class TarArchive(Archive):
+	"""A tar archive written in streaming mode (no seeking, so pipes work too)"""
+
+	def __init__(self, output: BinaryIO, compression: str = ""):
+		self.compressor = None
+		fileobj = output
+		if compression == "zst":
+			try:
+				import zstandard
+			except ImportError as e:
+				raise MyRPLError('.tar.zst archives need the zstd extra: pip install "myrpl-cli[zstd]"') from e
+			self.compressor = zstandard.ZstdCompressor().stream_writer(output, closefd=False)
+			fileobj, compression = self.compressor, ""
+
+		self.tar = tarfile.open(fileobj=fileobj, mode=f"w|{compression}", format=tarfile.PAX_FORMAT)
+
+	def add_file(self, path: str, arcname: str):
+		# Files hardlinked together (eg. unit tests from the blob store) are stored once
+		self.tar.add(path, arcname, recursive=False)
+
+	def add_bytes(self, arcname: str, data: bytes):
+		info = tarfile.TarInfo(arcname)
+		info.size = len(data)
+		info.mtime = int(time.time())
+		info.mode = 0o644
+		self.tar.addfile(info, io.BytesIO(data))
+
+	def close(self):
+		self.tar.close()
+		if self.compressor is not None:
+			self.compressor.close()
+
+
+class ZipArchive(Archive):
+	"""A deflated zip archive (written with data descriptors when output can't seek)"""
+
+	def __init__(self, output: BinaryIO):
+		self.zip = zipfile.ZipFile(output, "w", zipfile.ZIP_DEFLATED)
+
+	def add_file(self, path: str, arcname: str):
+		self.zip.write(path, arcname)
+
+	def add_bytes(self, arcname: str, data: bytes):
+		self.zip.writestr(arcname, data)
+
+	def close(self):
+		self.zip.close()
+
+
+def open_archive(output: BinaryIO, archive_format: str):
+	if archive_format == "zip":
+		return ZipArchive(output)
+	return TarArchive(output, archive_format.partition(".")[2])
+
+
+@contextlib.contextmanager
+def open_output(output: str) -> Iterator[BinaryIO]:
+	"""The file output names (stdout for "-", left open), removed if writing it fails"""
+
+	if output == "-":
+		yield sys.stdout.buffer
+		return
+
+	file = open(output, "wb")
+	try:
+		with file:
+			yield file
+	except BaseException:
+		os.unlink(output)
+		raise
+
+
+def add_tree(archive, path: str, arcname: str) -> int:
+	"""Adds every file below path (in a stable order) under arcname. Returns how many"""
+
+	count = 0
+	for dirpath, dirnames, filenames in os.walk(path):
+		dirnames[:] = sorted(d for d in dirnames if d not in EXCLUDED_DIRS)
+		relative = os.path.relpath(dirpath, path)
+		for filename in sorted(filenames):
+			member = arcname if relative == "." else f"{arcname}/{relative.replace(os.sep, '/')}"
+			archive.add_file(os.path.join(dirpath, filename), f"{member}/{filename}")
+			count += 1
+	return count
+
+
+def add_files(archive, arcname: str, files: Dict[str, str]):
+	for filename, content in files.items():
+		archive.add_bytes(f"{arcname}/{filename}", content.encode("utf8"))
@@ -0,0 +1,178 @@
+"""
+Dry run of `myrpl fetch` (`--plan`): which activities would be created,
+updated or skipped, and how many requests and bytes fetching them takes.
+
+Only the course and activity lists are requested; everything else comes
+from the local tree and its .myrpl metadata
+"""
+
+import os
+from typing import List, Literal, Optional
+
+from pydantic import BaseModel
+
+from myrpl_cli.blobs import BlobStore
+from myrpl_cli.local_tree import CourseIndex
+from myrpl_cli.models import Activity, Course
+
+# Requests made before any activity is saved: the course list and the activity list
+LIST_REQUESTS = 2
+
+Action = Literal["create", "update", "skip"]
+
+ACTION_SYMBOLS = {"create": "+", "update": "~"}
+
+
+class PlannedActivity(BaseModel):
+	"""What fetch would do with an activity"""
+
+	category: str
+	name: str
+	action: Action
+	requests: int
+	# Estimated response bytes (None when there's nothing local to estimate from)
+	bytes: Optional[int] = None
+	# Where the activity is saved locally under a different name, if it was renamed
+	renamed_from: Optional[str] = None
+
+
+class FetchPlan(BaseModel):
+	"""FetchPlan model (a whole `myrpl fetch` run, without running it)"""
+
+	course: str
+	force: bool
+	activities: List[PlannedActivity]
+	# Mean size of the local activities, used for the ones without a local copy
+	mean_bytes: Optional[int] = None
+
+	def count(self, action: Action) -> int:
+		return sum(1 for activity in self.activities if activity.action == action)
+
+	def unknown_sizes(self) -> int:
+		"""Activities to fetch whose size can't be estimated"""
+
+		if self.mean_bytes is not None:
+			return 0
+		return sum(1 for activity in self.activities if activity.action != "skip" and activity.bytes is None)
+
+	@property
+	def requests(self) -> int:
+		return LIST_REQUESTS + sum(activity.requests for activity in self.activities)
+
+	@property
+	def bytes(self) -> int:
+		return sum(
+			activity.bytes if activity.bytes is not None else self.mean_bytes or 0
+			for activity in self.activities
+			if activity.action != "skip"
+		)
+
+
+def activity_requests(activity: Activity, blobs: Optional[BlobStore] = None, force: bool = False) -> int:
+	"""
+	Requests save_activity makes: the activity's details, then either its starting
+	files (unless already in the blob store, and not forced) or, once it has been
+	submitted, its submissions and (at most) the latest one's files
+	"""
+
+	if activity.submission_status is not None:
+		return 3
+	if not force and blobs is not None and blobs.get_files(activity.file_id) is not None:
+		return 1
+	return 2
+
+
+def local_size(activity_path: str) -> int:
+	"""Bytes of an activity's saved files: roughly what downloading it again takes"""
+
+	size = 0
+	for dirpath, dirnames, filenames in os.walk(activity_path):
+		dirnames[:] = [d for d in dirnames if d != "__pycache__"]
+		for filename in filenames:
+			size += os.path.getsize(os.path.join(dirpath, filename))
+	return size
+
+
+def plan_fetch(
+	course: Course,
+	activities: List[Activity],
+	force: bool = False,
+	root: str = ".",
+	blobs: Optional[BlobStore] = None,
+	refresh: bool = False,
+) -> FetchPlan:
+	"""
+	Plans fetching activities the way MyRPL.fetch_course would, by comparing them
+	against the local tree. Refreshed, existing activities are updated too (like
+	forced ones, but their files may come from the blob store)
+	"""
+
+	course_path = os.path.join(root, "courses", course.name)
+	index = CourseIndex.scan(course_path)
+	local_ids = index.activity_ids()
+
+	planned = []
+	for activity in activities:
+		relative_path = os.path.join(activity.category_name, activity.name)
+		activity_path = os.path.join(course_path, relative_path)
+		exists = index.has_activity(activity.category_name, activity.name)
+
+		if exists and not force and not refresh:
+			planned.append(
+				PlannedActivity(category=activity.category_name, name=activity.name, action="skip", requests=0)
+			)
+			continue
+
+		previous = local_ids.get(activity.id)
+		renamed_from = previous if previous is not None and previous != relative_path else None
+		local_path = activity_path if exists else renamed_from and os.path.join(course_path, renamed_from)
+		planned.append(
+			PlannedActivity(
+				category=activity.category_name,
+				name=activity.name,
+				action="update" if exists else "create",
+				requests=activity_requests(activity, blobs, force),
+				bytes=local_size(local_path) if local_path else None,
+				renamed_from=renamed_from,
+			)
+		)
+
+	sizes = [local_size(os.path.join(course_path, path)) for path in local_ids.values()]
+	mean_bytes = sum(sizes) // len(sizes) if sizes else None
+	return FetchPlan(course=course.name, force=force, activities=planned, mean_bytes=mean_bytes)
+
+
+def format_size(size: int) -> str:
+	return f"{size / 1024:.1f} KiB"
+
+
+def format_plan(plan: FetchPlan) -> str:
+	"""Lists the activities to create or update, followed by the expected request count and bytes"""
+
+	lines = [
+		f"{plan.course}: {plan.count('create')} to create, {plan.count('update')} to update,"
+		f" {plan.count('skip')} to skip"
+	]
+	for activity in plan.activities:
+		if activity.action == "skip":
+			continue
+		size = activity.bytes if activity.bytes is not None else plan.mean_bytes
+		line = (
+			f"  {ACTION_SYMBOLS[activity.action]} {activity.category}/{activity.name}"
+			f" ({activity.requests} requests, {'~' + format_size(size) if size is not None else 'size unknown'})"
+		)
+		if activity.renamed_from:
+			line += f" (saved as {activity.renamed_from})"
+		lines.append(line)
+
+	total = f"Fetching would make at most {plan.requests} requests ({LIST_REQUESTS} of them already made to plan)"
+	to_fetch = plan.count("create") + plan.count("update")
+	unknown = plan.unknown_sizes()
+	if unknown == to_fetch > 0:
+		total += ", of unknown size (nothing fetched yet to estimate from)"
+	elif unknown:
+		total += f", ~{format_size(plan.bytes)} plus {unknown} activities of unknown size"
+	elif to_fetch:
+		total += f", ~{format_size(plan.bytes)}"
+	lines.append(total)
+	return "\n".join(lines)
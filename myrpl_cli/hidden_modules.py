@@ -0,0 +1,415 @@
+"""
+Recovers modules that unit tests import but only exist on RPL's servers
+(eg. `grafo`), by submitting a probe solution that prints them to stdout.
+
+Recovered modules are cached once per course, keyed by module name and the
+server's Python version (its cache tag, eg. cpython-310), so every other
+activity importing them reuses them without further submissions. Modules a
+probe couldn't recover aren't probed again either (unless forced, or by
+another version of myrpl-cli)
+"""
+
+import ast
+import base64
+import importlib.util
+import io
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+from typing import Dict, List, Optional, Set, Tuple
+
+from pydantic import BaseModel
+
+from myrpl_cli import __version__
+from myrpl_cli.api import API
+from myrpl_cli.cache import get_cache_dir
+from myrpl_cli.models import Activity, Submission
+
+logger = logging.getLogger(__name__)
+
+PROBE_DESCRIPTION = "myrpl-cli hidden module probe"
+START_MARKER = "#startmyrplmodule"
+END_MARKER = "#endmyrplmodule"
+DEFAULT_SOLUTION_FILENAME = "alumno.py"
+
+# Imported by the tests themselves, always available locally
+TEST_MODULES = {"unittest", "pytest", "timeout_decorator"}
+PENDING_STATUSES = (None, "PENDING", "ENQUEUED", "PROCESSING")
+POLL_INTERVAL_SECONDS = 2
+POLL_TIMEOUT_SECONDS = 300
+
+PROBE_TEMPLATE = """import base64
+import importlib.util
+import io
+import os
+import sys
+import zipfile
+
+
+def _myrpl_dump(name):
+	spec = importlib.util.find_spec(name)
+	buffer = io.BytesIO()
+	with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+		if spec.submodule_search_locations:
+			root = list(spec.submodule_search_locations)[0]
+			for dirpath, dirnames, filenames in os.walk(root):
+				dirnames[:] = [d for d in dirnames if d != "__pycache__"]
+				for filename in filenames:
+					path = os.path.join(dirpath, filename)
+					archive.write(path, os.path.join(name, os.path.relpath(path, root)))
+		else:
+			archive.write(spec.origin, os.path.basename(spec.origin))
+	print("{start}", name, sys.implementation.cache_tag, flush=True)
+	print(base64.b64encode(buffer.getvalue()).decode(), flush=True)
+	print("{end}", name, flush=True)
+
+
+for _name in {modules!r}:
+	try:
+		_myrpl_dump(_name)
+	except Exception:
+		pass
+
+
+def __getattr__(name):
+	# Lets the tests' `from alumno import anything` succeed
+	if name.startswith("__"):
+		raise AttributeError(name)
+	return lambda *args, **kwargs: None
+"""
+
+
+def imported_modules(source: str) -> List[str]:
+	"""Top level names of every absolute import in source, in order of appearance"""
+
+	modules = []
+	for node in ast.walk(ast.parse(source)):
+		if isinstance(node, ast.Import):
+			names = [alias.name for alias in node.names]
+		elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+			names = [node.module]
+		else:
+			continue
+		for name in names:
+			top_level = name.split(".")[0]
+			if top_level not in modules:
+				modules.append(top_level)
+
+	return modules
+
+
+def local_modules(activity_path: str) -> Set[str]:
+	"""Modules an activity provides itself (its .py files and packages)"""
+
+	modules = set()
+	for entry in os.scandir(activity_path):
+		if entry.is_file() and entry.name.endswith(".py"):
+			modules.add(entry.name[:-3])
+		elif entry.is_dir() and os.path.exists(os.path.join(entry.path, "__init__.py")):
+			modules.add(entry.name)
+	return modules
+
+
+def installed_locally(name: str, activity_path: Optional[str] = None) -> bool:
+	"""
+	Whether a module imports here from outside the activity (eg. numpy): it's
+	not RPL's to recover, and the server's build of it wouldn't run here anyway
+	"""
+
+	try:
+		spec = importlib.util.find_spec(name)
+	except (ImportError, ValueError):
+		return False
+	if spec is None:
+		return False
+	if activity_path is None:
+		return True
+
+	locations = [*(spec.submodule_search_locations or []), spec.origin]
+	paths = [os.path.abspath(location) for location in locations if location and os.path.isabs(location)]
+	if not paths:
+		# Built-in or frozen
+		return True
+	activity_path = os.path.abspath(activity_path) + os.sep
+	return not all(path.startswith(activity_path) for path in paths)
+
+
+def find_hidden_imports(unit_tests: str, provided: Set[str], activity_path: Optional[str] = None) -> List[str]:
+	"""
+	Modules the unit tests import that neither the stdlib, the tests' tooling,
+	the activity (at activity_path) nor the local installation provide
+	"""
+
+	try:
+		modules = imported_modules(unit_tests)
+	except SyntaxError:
+		return []
+
+	stdlib = getattr(sys, "stdlib_module_names", set())
+	return [
+		name
+		for name in modules
+		if name not in stdlib
+		and name not in TEST_MODULES
+		and name not in provided
+		and not installed_locally(name, activity_path)
+	]
+
+
+def probe_filename(unit_tests: str, provided: Set[str]) -> str:
+	"""The solution file the tests import (the probe is submitted in its place)"""
+
+	for name in imported_modules(unit_tests):
+		if name in provided:
+			return f"{name}.py"
+	return DEFAULT_SOLUTION_FILENAME
+
+
+def make_probe(modules: List[str]) -> str:
+	return PROBE_TEMPLATE.format(start=START_MARKER, end=END_MARKER, modules=list(modules))
+
+
+def parse_probe_output(stdout: str) -> Dict[str, Tuple[str, bytes]]:
+	"""Maps every module dumped by a probe to (server cache tag, zip archive)"""
+
+	recovered = {}
+	lines = iter(stdout.splitlines())
+	for line in lines:
+		parts = line.split()
+		if len(parts) != 3 or parts[0] != START_MARKER:
+			continue
+
+		_, name, cache_tag = parts
+		payload = []
+		for payload_line in lines:
+			if payload_line.split()[:2] == [END_MARKER, name]:
+				try:
+					recovered[name] = (cache_tag, base64.b64decode("".join(payload), validate=True))
+				except ValueError:
+					logger.warning("Couldn't decode hidden module %s", name)
+				break
+			payload.append(payload_line.strip())
+
+	return recovered
+
+
+def extract(archive: bytes, destination: str) -> List[str]:
+	"""Extracts a recovered module, refusing paths outside destination"""
+
+	destination = os.path.abspath(destination)
+	with zipfile.ZipFile(io.BytesIO(archive)) as zip_file:
+		names = zip_file.namelist()
+		for name in names:
+			path = os.path.abspath(os.path.join(destination, name))
+			if not path.startswith(destination + os.sep):
+				raise ValueError(f"unsafe path in hidden module archive: {name}")
+		zip_file.extractall(destination)
+
+	return names
+
+
+class HiddenModuleIndex(BaseModel):
+	"""HiddenModuleIndex model (what's been recovered for a course)"""
+
+	# Cache tag of the server's Python, as seen by the last probe
+	python: Optional[str] = None
+	# Cache tag -> recovered module names
+	modules: Dict[str, List[str]] = {}
+	# Probes aren't real solutions: fetch must never save them as the latest submission
+	probe_submissions: List[int] = []
+	# Cache tag ("" before any probe answered) -> module names a probe couldn't recover
+	failed: Dict[str, List[str]] = {}
+	# myrpl-cli version that recorded failed (a newer probe may do better)
+	failed_version: Optional[str] = None
+
+
+class HiddenModuleStore:
+	"""A course's recovered modules, as zip archives under the cache dir"""
+
+	def __init__(self, course_id: int, cache_dir: Optional[str] = None):
+		self.cache_dir = cache_dir or get_cache_dir("hidden-modules", str(course_id))
+		self.index_path = os.path.join(self.cache_dir, "index.json")
+		self.index = self.load_index()
+
+	def load_index(self) -> HiddenModuleIndex:
+		try:
+			with open(self.index_path, encoding="utf8") as file:
+				return HiddenModuleIndex(**json.load(file))
+		except (OSError, ValueError):
+			return HiddenModuleIndex()
+
+	def save_index(self):
+		os.makedirs(self.cache_dir, exist_ok=True)
+		fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+		with os.fdopen(fd, "w", encoding="utf8") as file:
+			file.write(self.index.model_dump_json())
+		os.replace(tmp_path, self.index_path)
+
+	def archive_path(self, name: str, cache_tag: str) -> str:
+		return os.path.join(self.cache_dir, cache_tag, f"{name}.zip")
+
+	def get(self, name: str) -> Optional[bytes]:
+		"""A module recovered from the server's current Python, if any"""
+
+		cache_tag = self.index.python
+		if cache_tag is None or name not in self.index.modules.get(cache_tag, []):
+			return None
+
+		try:
+			with open(self.archive_path(name, cache_tag), "rb") as file:
+				return file.read()
+		except OSError:
+			return None
+
+	def put(self, name: str, cache_tag: str, archive: bytes):
+		path = self.archive_path(name, cache_tag)
+		os.makedirs(os.path.dirname(path), exist_ok=True)
+		with open(path, "wb") as file:
+			file.write(archive)
+
+		self.index.python = cache_tag
+		modules = self.index.modules.setdefault(cache_tag, [])
+		if name not in modules:
+			modules.append(name)
+		self.save_index()
+
+	def failed(self, name: str) -> bool:
+		"""Whether a probe from this version already failed to recover a module from the server's current Python"""
+
+		if self.index.failed_version != __version__:
+			return False
+		return name in self.index.failed.get(self.index.python or "", [])
+
+	def add_failed(self, names: List[str]):
+		if self.index.failed_version != __version__:
+			self.index.failed, self.index.failed_version = {}, __version__
+		failed = self.index.failed.setdefault(self.index.python or "", [])
+		failed.extend(name for name in names if name not in failed)
+		self.save_index()
+
+	def add_probe(self, submission_id: int):
+		self.index.probe_submissions.append(submission_id)
+		self.save_index()
+
+
+class HiddenModuleExtractor:
+	"""Installs the hidden modules an activity's tests need, probing the server for the ones not cached"""
+
+	def __init__(
+		self,
+		api: API,
+		course_id: int,
+		store: Optional[HiddenModuleStore] = None,
+		poll_interval: float = POLL_INTERVAL_SECONDS,
+		poll_timeout: float = POLL_TIMEOUT_SECONDS,
+		force: bool = False,
+	):
+		self.api = api
+		self.store = store or HiddenModuleStore(course_id)
+		# Probes again (once per fetch) for modules a previous probe couldn't recover
+		self.force = force
+		self.probed: Set[str] = set()
+		self.poll_interval = poll_interval
+		self.poll_timeout = poll_timeout
+		# Guards the store; activities fetched concurrently mustn't probe the same module twice
+		self.lock = threading.Lock()
+		# Module name -> set once the probe recovering it finishes
+		self.in_flight: Dict[str, threading.Event] = {}
+
+	def install(self, activity: Activity, activity_path: str) -> List[str]:
+		"""Copies every hidden module the activity's unit tests import into it. Returns their names"""
+
+		unit_test_path = os.path.join(activity_path, "unit_test.py")
+		if not os.path.exists(unit_test_path):
+			return []
+
+		with open(unit_test_path, encoding="utf8") as file:
+			unit_tests = file.read()
+		provided = local_modules(activity_path)
+		hidden = find_hidden_imports(unit_tests, provided, activity_path)
+
+		with self.lock:
+			pending = {self.in_flight[name] for name in hidden if name in self.in_flight}
+			missing = [name for name in hidden if name not in self.in_flight and self.store.get(name) is None]
+			# Every probe is a real, graded submission
+			missing = [
+				name for name in missing if not self.store.failed(name) or (self.force and name not in self.probed)
+			]
+			if missing:
+				self.probed.update(missing)
+				done = threading.Event()
+				self.in_flight.update((name, done) for name in missing)
+
+		# Probes poll for minutes: other activities only wait on the modules they need
+		if missing:
+			try:
+				recovered = self.probe(activity, missing, probe_filename(unit_tests, provided))
+				with self.lock:
+					for name, (cache_tag, archive) in recovered.items():
+						self.store.put(name, cache_tag, archive)
+					self.store.add_failed([name for name in missing if name not in recovered])
+			finally:
+				with self.lock:
+					for name in missing:
+						del self.in_flight[name]
+				done.set()
+
+		for event in pending:
+			event.wait()
+
+		with self.lock:
+			archives = {name: self.store.get(name) for name in hidden}
+
+		installed = []
+		for name, archive in archives.items():
+			if archive is None:
+				logger.warning("Couldn't recover hidden module %s for %s", name, activity.name)
+				continue
+			extract(archive, activity_path)
+			installed.append(name)
+
+		if installed and self.store.index.python != sys.implementation.cache_tag:
+			logger.warning(
+				"Hidden modules of %s were recovered from %s: compiled ones (.pyc) won't import on %s",
+				activity.name,
+				self.store.index.python,
+				sys.implementation.cache_tag,
+			)
+
+		return installed
+
+	def probe(self, activity: Activity, modules: List[str], filename: str) -> Dict[str, Tuple[str, bytes]]:
+		"""Submits a probe solution dumping modules and waits for its stdout"""
+
+		logger.info("Recovering hidden modules %s via a probe submission...", ", ".join(modules))
+		with tempfile.TemporaryDirectory(prefix="myrpl-probe-") as tmp_dir:
+			probe_path = os.path.join(tmp_dir, filename)
+			with open(probe_path, "w", encoding="utf8") as file:
+				file.write(make_probe(modules))
+			response = self.api.submit(activity, probe_path, PROBE_DESCRIPTION)
+
+		submission = Submission(activity=activity, **response)
+		with self.lock:
+			self.store.add_probe(submission.id)
+
+		result = self.wait_for_result(submission)
+		if result is None:
+			logger.warning("Probe submission %i didn't finish in %is", submission.id, self.poll_timeout)
+			return {}
+
+		return parse_probe_output(result.stdout or "")
+
+	def wait_for_result(self, submission: Submission):
+		deadline = time.monotonic() + self.poll_timeout
+		while True:
+			result = self.api.fetch_submission_result(submission)
+			if result.submission_status not in PENDING_STATUSES:
+				return result
+			if time.monotonic() >= deadline:
+				return None
+			time.sleep(self.poll_interval)
@@ -0,0 +1,302 @@
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from pydantic import BaseModel
+
+from myrpl_cli.models import ActivityRunResult, CaseResult, IOTest, SubmissionStatus
+from myrpl_cli.sandbox import SCRIPT_FLAG, Limits, kill_process_tree, resolve_status, sandbox_env
+
+IO_TESTS_DIRNAME = "io_tests"
+INPUT_SUFFIX = ".in"
+OUTPUT_SUFFIX = ".out"
+ENTRYPOINT = "main.py"
+UNIT_TEST_FILENAMES = ("unit_test.py", "unit_test.c")
+
+# Statuses of failed cases, most important first
+STATUS_PRIORITY: List[SubmissionStatus] = ["BUILD_ERROR", "TIME_OUT", "RUNTIME_ERROR", "FAILURE"]
+
+
+class IOCase(BaseModel):
+	"""IOCase model (an IO test saved to disk)"""
+
+	name: str
+	input_path: str
+	output_path: str
+
+
+def io_test_files(io_tests: List[IOTest]) -> Dict[str, str]:
+	"""
+	Maps an activity's IO tests to the files they're saved as,
+	relative to the activity (io_tests/01 - name.in, io_tests/01 - name.out, ...)
+	"""
+
+	files = {}
+	for index, io_test in enumerate(io_tests, start=1):
+		name = f"{index:02d}"
+		if io_test.name:
+			name += " - " + re.sub(r"[^\w\- .]", "_", io_test.name).strip()
+		files[f"{IO_TESTS_DIRNAME}/{name}{INPUT_SUFFIX}"] = io_test.test_in
+		files[f"{IO_TESTS_DIRNAME}/{name}{OUTPUT_SUFFIX}"] = io_test.test_out
+
+	return files
+
+
+def is_io_activity(activity_path: str) -> bool:
+	"""Whether an activity is graded by IO tests rather than unit tests"""
+
+	return os.path.isdir(os.path.join(activity_path, IO_TESTS_DIRNAME)) and not any(
+		os.path.exists(os.path.join(activity_path, filename)) for filename in UNIT_TEST_FILENAMES
+	)
+
+
+def discover_cases(activity_path: str) -> List[IOCase]:
+	"""Lists the .in/.out pairs of an activity's io_tests directory"""
+
+	io_tests_path = os.path.join(activity_path, IO_TESTS_DIRNAME)
+	cases = []
+	for filename in sorted(os.listdir(io_tests_path)):
+		if not filename.endswith(INPUT_SUFFIX):
+			continue
+
+		name = filename[: -len(INPUT_SUFFIX)]
+		output_path = os.path.join(io_tests_path, name + OUTPUT_SUFFIX)
+		if os.path.exists(output_path):
+			cases.append(IOCase(name=name, input_path=os.path.join(io_tests_path, filename), output_path=output_path))
+
+	return cases
+
+
+def expected_lines(output_path: str) -> List[str]:
+	"""Reads an expected output, ignoring trailing whitespace (like RPL does)"""
+
+	with open(output_path, encoding="utf8") as file:
+		return file.read().rstrip().splitlines()
+
+
+def check_build(activity_path: str) -> Optional[str]:
+	"""Compiles every solution file, returning the first syntax error (if any)"""
+
+	for filename in sorted(os.listdir(activity_path)):
+		if not filename.endswith(".py"):
+			continue
+
+		with open(os.path.join(activity_path, filename), encoding="utf8") as file:
+			source = file.read()
+		try:
+			compile(source, filename, "exec")
+		except SyntaxError as e:
+			return f"{type(e).__name__}: {e}"
+
+	return None
+
+
+def stream_diff(stdout, expected: List[str]) -> Tuple[List[str], Optional[int]]:
+	"""
+	Compares output against expected line by line, as it's produced.
+	Returns the lines read and the index of the first mismatching line, if any
+	"""
+
+	actual = []
+	for line in stdout:
+		line = line.rstrip()
+		index = len(actual)
+		actual.append(line)
+
+		if index < len(expected):
+			if line != expected[index]:
+				return actual, index
+		elif line:
+			# Extra output (blank lines past the end are fine)
+			return actual, index
+
+	if len(actual) < len(expected):
+		return actual, len(actual)
+
+	return actual, None
+
+
+def describe_mismatch(expected: List[str], actual: List[str], index: int) -> str:
+	"""Human readable description of the first differing line"""
+
+	wanted = expected[index] if index < len(expected) else "<end of output>"
+	got = actual[index] if index < len(actual) else "<end of output>"
+	return f"line {index + 1}: expected {wanted!r}, got {got!r}"
+
+
+class CancelScope:
+	"""Lets the first failing case stop the ones still running"""
+
+	def __init__(self):
+		self.lock = threading.Lock()
+		self.cancelled = False
+		self.processes = set()
+
+	def register(self, process: subprocess.Popen):
+		"""Tracks a running case (killing it right away if already cancelled)"""
+
+		with self.lock:
+			self.processes.add(process)
+			if self.cancelled:
+				process.kill()
+
+	def unregister(self, process: subprocess.Popen):
+		with self.lock:
+			self.processes.discard(process)
+
+	def cancel(self):
+		"""Kills every running case"""
+
+		with self.lock:
+			self.cancelled = True
+			for process in self.processes:
+				kill_process_tree(process)
+
+
+def run_case(
+	activity_path: str,
+	case: IOCase,
+	limits: Limits,
+	scope: CancelScope,
+	command: Optional[List[str]] = None,
+) -> Optional[Tuple[CaseResult, SubmissionStatus]]:
+	"""
+	Feeds a case's input to the solution (main.py, unless given another command)
+	in its own process, diffing the output as it streams. Returns None if the case was cancelled
+	"""
+
+	expected = expected_lines(case.output_path)
+	start = time.perf_counter()
+	with open(case.input_path, "rb") as stdin, tempfile.TemporaryFile() as stderr:
+		process = subprocess.Popen(
+			command or [sys.executable, "-m", "myrpl_cli.sandbox", SCRIPT_FLAG, ENTRYPOINT],
+			cwd=activity_path,
+			env=sandbox_env(limits),
+			stdin=stdin,
+			stdout=subprocess.PIPE,
+			stderr=stderr,
+			text=True,
+			encoding="utf8",
+			errors="replace",
+			# Own process group, so killing the case kills the solution's children too
+			start_new_session=os.name == "posix",
+		)
+		scope.register(process)
+
+		timed_out = threading.Event()
+
+		def time_out():
+			timed_out.set()
+			kill_process_tree(process)
+
+		timer = threading.Timer(limits.wall_time, time_out) if limits.wall_time else None
+		if timer is not None:
+			timer.start()
+
+		try:
+			actual, mismatch = stream_diff(process.stdout, expected)
+			diverged = mismatch is not None and process.poll() is None
+			if diverged:
+				# No point in letting it finish
+				kill_process_tree(process)
+			process.stdout.close()
+			exit_code = process.wait()
+		finally:
+			if timer is not None:
+				timer.cancel()
+			scope.unregister(process)
+
+		duration = time.perf_counter() - start
+		stderr.seek(0)
+		errors = stderr.read().decode("utf8", errors="replace")
+
+	if timed_out.is_set():
+		status = "TIME_OUT"
+		message = f"timed out after {limits.wall_time:g}s"
+	elif scope.cancelled and exit_code < 0 and not diverged:
+		# Killed because another case failed first
+		return None
+	elif exit_code != 0 and not diverged:
+		status = resolve_status(exit_code, []) if exit_code < 0 else "RUNTIME_ERROR"
+		message = errors.strip() or f"exit code {exit_code}"
+	elif mismatch is not None:
+		status = "FAILURE"
+		message = describe_mismatch(expected, actual, mismatch)
+	else:
+		status = "SUCCESS"
+		message = None
+
+	result = CaseResult(
+		name=case.name,
+		passed=status == "SUCCESS",
+		duration=duration,
+		error_message=f"{status}: {message}" if message else None,
+	)
+	return result, status
+
+
+def run_io_activity(
+	activity_path: str,
+	metadata,
+	limits: Optional[Limits] = None,
+	fail_fast: bool = False,
+	jobs: Optional[int] = None,
+	command: Optional[List[str]] = None,
+) -> ActivityRunResult:
+	"""
+	Runs every IO case of an activity in parallel, one process per case.
+	With fail_fast the first failing case stops the rest. A command
+	(eg. an already built C binary) replaces main.py and its build check
+	"""
+
+	activity_path = os.path.abspath(activity_path)
+	limits = limits or Limits()
+	cases = discover_cases(activity_path)
+	start = time.perf_counter()
+
+	build_error = check_build(activity_path) if command is None else None
+	if build_error is not None or (command is None and not os.path.exists(os.path.join(activity_path, ENTRYPOINT))):
+		return ActivityRunResult(
+			path=activity_path,
+			metadata=metadata,
+			passed=False,
+			status="BUILD_ERROR",
+			exit_code=1,
+			duration=time.perf_counter() - start,
+			output=build_error or f"{ENTRYPOINT} not found",
+		)
+
+	scope = CancelScope()
+
+	def run(case):
+		if scope.cancelled:
+			return None
+		outcome = run_case(activity_path, case, limits, scope, command)
+		if fail_fast and outcome is not None and outcome[1] != "SUCCESS":
+			scope.cancel()
+		return outcome
+
+	with ThreadPoolExecutor(max_workers=jobs or os.cpu_count() or 1) as executor:
+		outcomes = [outcome for outcome in executor.map(run, cases) if outcome is not None]
+
+	case_results = [result for result, _ in outcomes]
+	statuses = {status for _, status in outcomes}
+	status = next((s for s in STATUS_PRIORITY if s in statuses), "SUCCESS")
+
+	failed = [result for result in case_results if not result.passed]
+	return ActivityRunResult(
+		path=activity_path,
+		metadata=metadata,
+		passed=status == "SUCCESS",
+		status=status,
+		exit_code=0 if status == "SUCCESS" else 1,
+		duration=time.perf_counter() - start,
+		output="\n".join(f"{result.name}: {result.error_message}" for result in failed),
+		cases=case_results,
+	)
@@ -0,0 +1,106 @@
+"""
+In-memory index of a fetched course's tree (courses/{course}/{category}/{activity}),
+built with a single os.scandir pass so fetch doesn't stat every path it's about to write
+"""
+
+import os
+import threading
+from typing import Dict, Optional, Set
+
+import toml
+
+METADATA_FILENAME = ".myrpl"
+
+
+class CourseIndex:
+	"""Which categories and activities of a course exist locally, and whether the course and categories have a .myrpl"""
+
+	def __init__(self, course_path: str):
+		self.course_path = course_path
+		# Category name -> its activities' names
+		self.categories: Dict[str, Set[str]] = {}
+		# Categories with a .myrpl ("" is the course itself)
+		self.metadata: Set[str] = set()
+		# Categories whose description.txt was claimed in this run
+		self.described: Set[str] = set()
+		self.lock = threading.Lock()
+
+	@classmethod
+	def scan(cls, course_path: str) -> "CourseIndex":
+		index = cls(course_path)
+		try:
+			course_entries = list(os.scandir(course_path))
+		except FileNotFoundError:
+			return index
+
+		for category in course_entries:
+			if category.name == METADATA_FILENAME:
+				index.metadata.add("")
+			if not category.is_dir():
+				continue
+
+			activities = index.categories.setdefault(category.name, set())
+			for entry in os.scandir(category.path):
+				if entry.name == METADATA_FILENAME:
+					index.metadata.add(category.name)
+				elif entry.is_dir():
+					activities.add(entry.name)
+
+		return index
+
+	def has_activity(self, category: str, name: str) -> bool:
+		return name in self.categories.get(category, ())
+
+	def has_metadata(self, category: Optional[str] = None) -> bool:
+		"""Whether the course (or one of its categories) has a .myrpl"""
+
+		return (category or "") in self.metadata
+
+	def add_activity(self, category: str, name: str):
+		"""Records an activity saved after the scan"""
+
+		with self.lock:
+			self.categories.setdefault(category, set()).add(name)
+
+	def claim_metadata(self, category: Optional[str] = None) -> bool:
+		"""
+		Whether the caller should write the course's (or category's) .myrpl:
+		it doesn't exist and no other activity of this fetch claimed it yet
+		"""
+
+		with self.lock:
+			if (category or "") in self.metadata:
+				return False
+			if category is not None:
+				self.categories.setdefault(category, set())
+			self.metadata.add(category or "")
+			return True
+
+	def claim_description(self, category: str) -> bool:
+		"""Whether the caller should write the category's description.txt (once per fetch)"""
+
+		with self.lock:
+			if category in self.described:
+				return False
+			self.described.add(category)
+			return True
+
+	def activity_ids(self) -> Dict[int, str]:
+		"""
+		Maps the id in every local activity's .myrpl to its path, relative to the course.
+		Activities without (a valid) .myrpl are left out
+		"""
+
+		ids = {}
+		for category, activities in self.categories.items():
+			for name in activities:
+				relative_path = os.path.join(category, name)
+				try:
+					metadata = toml.load(os.path.join(self.course_path, relative_path, METADATA_FILENAME))
+				except (OSError, toml.TomlDecodeError):
+					continue
+				activity_id = metadata.get("activity", {}).get("id")
+				if activity_id is not None:
+					ids[activity_id] = relative_path
+
+		return ids
@@ -1,8 +1,18 @@
+import os
+import sys
 import logging
 import argparse
 from dotenv import load_dotenv
-from myrpl_cli.errors import MissingCredentialsError, NotMyRPLDirectoryError
+from myrpl_cli.completion import SHELLS, completion_script
+from myrpl_cli.errors import MissingCredentialsError, MyRPLError, NotMyRPLDirectoryError, OfflineError
+from myrpl_cli.daemon import DEFAULT_INTERVAL, DEFAULT_JITTER, Daemon
+from myrpl_cli.events import OUTPUT_FORMATS, EventStream
+from myrpl_cli.export import FORMATS
 from myrpl_cli.myrpl import MyRPL
+from myrpl_cli.scheduler import DEFAULT_FETCH_JOBS
+from myrpl_cli.sandbox import Limits
+from myrpl_cli.metrics import METRICS_FILE_ENV_VAR, Metrics
+from myrpl_cli.tracing import tracer
 from myrpl_cli.api import API
 from myrpl_cli.credential_manager import CredentialManager
 from myrpl_cli import __version__
@@ -18,62 +28,402 @@ def login_command(myrpl: MyRPL):
 
 def fetch_command(myrpl: MyRPL, args):
 	try:
-		myrpl.fetch_course(args.course_id, args.token, args.force)
+		if not args.course_ids and not args.all_enrolled:
+			# Inside a course, category or activity directory
+			myrpl.fetch_here(args.force, args.hidden_modules, args.plan, args.category, args.activity)
+			return
+
+		if args.plan:
+			myrpl.plan_fetch_courses(args.course_ids, args.all_enrolled, args.force, args.category, args.activity)
+			return
+
+		myrpl.fetch_courses(
+			args.course_ids,
+			args.all_enrolled,
+			args.token,
+			args.force,
+			args.hidden_modules,
+			jobs=args.jobs,
+			categories=args.category,
+			names=args.activity,
+		)
 	except MissingCredentialsError:
 		logger.error("You haven't logged in yet. Do so with `myrpl login`")
+		# Scheduled syncs (cron) should see it failed
+		sys.exit(1)
+	except NotMyRPLDirectoryError:
+		logger.error("not a myrpl directory: .myrpl (or pass course IDs or --all-enrolled)")
+		sys.exit(1)
 
 
-def test_command(myrpl: MyRPL, args):
+def test_command(myrpl: MyRPL, args, pytest_args):
+	limits = Limits(
+		cpu_time=args.cpu_time or None,
+		wall_time=args.wall_time or None,
+		memory=args.memory * 1024**2 if args.memory else None,
+	)
+
 	try:
-		myrpl.test(args)
+		if args.watch:
+			myrpl.watch(pytest_args, jobs=args.jobs, use_cache=not args.no_cache, limits=limits)
+			return
+
+		results = myrpl.test(
+			pytest_args, jobs=args.jobs, use_cache=not args.no_cache, limits=limits, profile=args.profile
+		)
 	except NotMyRPLDirectoryError:
 		logger.error("not a myrpl directory: .myrpl")
+		sys.exit(1)
+
+	if not all(result.passed for result in results):
+		sys.exit(1)
 
 
 def list_command(myrpl: MyRPL, args):
 	myrpl.list(args.all)
 
 
+def status_command(myrpl: MyRPL, args):
+	try:
+		myrpl.status(args.course_id)
+	except NotMyRPLDirectoryError:
+		logger.error("not a myrpl directory: .myrpl (or pass a course ID)")
+		sys.exit(1)
+
+
+def diff_command(myrpl: MyRPL, args):
+	try:
+		myrpl.diff(args.old, args.new)
+	except NotMyRPLDirectoryError:
+		logger.error("not an activity directory: .myrpl")
+		sys.exit(1)
+	except ValueError as e:
+		logger.error("%s", e)
+		sys.exit(1)
+
+
+def export_command(myrpl: MyRPL, args):
+	try:
+		myrpl.export(args.course_id, args.output, args.format, args.from_api)
+	except (ValueError, MyRPLError) as e:
+		logger.error("%s", e)
+		sys.exit(1)
+
+
+def verify_command(myrpl: MyRPL, args):
+	try:
+		reports = myrpl.verify(args.path, repair=args.repair, jobs=args.jobs)
+	except NotMyRPLDirectoryError:
+		logger.error("%s is neither a myrpl directory (.myrpl) nor holds courses/", args.path)
+		sys.exit(1)
+
+	if not all(report.ok for report in reports):
+		sys.exit(1)
+
+
+def daemon_command(myrpl: MyRPL, args):
+	if args.offline:
+		logger.error("the daemon syncs from myrpl.ar: it can't run --offline")
+		sys.exit(1)
+
+	daemon = Daemon(myrpl, interval=args.interval, jitter=args.jitter)
+	try:
+		daemon.run()
+	except KeyboardInterrupt:
+		pass
+	except MissingCredentialsError:
+		logger.error("You haven't logged in yet. Do so with `myrpl login`")
+		sys.exit(1)
+	except OSError as e:
+		logger.error("%s", e)
+		sys.exit(1)
+
+
+def completion_command(args, subparsers):
+	actions = {name: subparser._actions for name, subparser in subparsers.choices.items()}
+	commands = {name: [option for action in actions[name] for option in action.option_strings] for name in actions}
+	value_options = sorted(
+		{
+			option
+			for name in actions
+			for action in actions[name]
+			if action.nargs != 0
+			for option in action.option_strings
+		}
+	)
+	print(completion_script(args.shell, commands, value_options), end="")
+
+
 def main():
 	parser = argparse.ArgumentParser(description="CLI tool for MyRPL course activities")
 	subparsers = parser.add_subparsers(dest="command", help="Available commands")
 
+	# Options every command takes
+	common_parser = argparse.ArgumentParser(add_help=False)
+	common_parser.add_argument(
+		"--trace",
+		metavar="FILE",
+		help="Record timing spans to FILE (Chrome trace JSON, or JSONL if FILE ends with .jsonl)",
+	)
+	common_parser.add_argument(
+		"--metrics",
+		metavar="FILE",
+		default=os.environ.get(METRICS_FILE_ENV_VAR),
+		help=f"Write Prometheus textfile metrics to FILE at the end of the run (default: ${METRICS_FILE_ENV_VAR})",
+	)
+	common_parser.add_argument(
+		"--offline",
+		action="store_true",
+		help="Answer from what previous runs saved, never touching the network or the keyring",
+	)
+
+	# Options of the commands that can report machine readable events
+	output_parser = argparse.ArgumentParser(add_help=False)
+	output_parser.add_argument(
+		"--output",
+		dest="output_format",
+		choices=OUTPUT_FORMATS,
+		default="text",
+		help="text, or ndjson: one JSON object per line for every event, as it happens (default: %(default)s)",
+	)
+
 	# Login command
-	subparsers.add_parser("login", help="Log in and store credentials")
+	subparsers.add_parser("login", help="Log in and store credentials", parents=[common_parser])
 
 	# List command
-	list_parser = subparsers.add_parser("list", help="List all registered courses and their IDs")
+	list_parser = subparsers.add_parser(
+		"list", help="List all registered courses and their IDs", parents=[common_parser, output_parser]
+	)
 	list_parser.add_argument("-a", "--all", action="store_true", help="List all courses, including hidden ones")
 
+	# Status command
+	status_parser = subparsers.add_parser(
+		"status", help="Show a course's activities and their RPL status", parents=[common_parser, output_parser]
+	)
+	status_parser.add_argument(
+		"course_id", type=int, nargs="?", default=None, help="Course ID (default: the current directory's course)"
+	)
+
 	# Fetch command
-	fetch_parser = subparsers.add_parser("fetch", help="Fetch and save activities for a given course ID")
-	fetch_parser.add_argument("course_id", type=int, help="ID of the course to fetch activities from")
+	fetch_parser = subparsers.add_parser(
+		"fetch", help="Fetch and save activities for the given course IDs", parents=[common_parser, output_parser]
+	)
+	fetch_parser.add_argument(
+		"course_ids",
+		type=int,
+		nargs="*",
+		help="IDs of the courses to fetch activities from (default: the current directory's course, category or activity)",
+	)
+	fetch_parser.add_argument(
+		"-c",
+		"--category",
+		action="append",
+		metavar="NAME|ID",
+		help="Only fetch activities of categories matching this ID or name glob (can be repeated)",
+	)
+	fetch_parser.add_argument(
+		"-a",
+		"--activity",
+		action="append",
+		metavar="NAME|ID",
+		help="Only fetch activities matching this ID or name glob (can be repeated)",
+	)
+	fetch_parser.add_argument(
+		"--all-enrolled", action="store_true", help="Fetch every course you're enrolled in (the ones `list` shows)"
+	)
+	fetch_parser.add_argument(
+		"-j",
+		"--jobs",
+		type=int,
+		default=None,
+		help=f"Number of activities to fetch at once, across all courses (default: {DEFAULT_FETCH_JOBS})",
+	)
 	fetch_parser.add_argument("-t", "--token", help="Bearer token for authentication.")
 	fetch_parser.add_argument("-f", "--force", action="store_true", help="Force overwrite of existing files")
+	fetch_parser.add_argument(
+		"--hidden-modules",
+		action="store_true",
+		help="Recover modules the tests import that only exist on RPL (submits a probe solution once per module)",
+	)
+	fetch_parser.add_argument(
+		"--plan",
+		action="store_true",
+		help="Only show which activities would be created, updated or skipped, and the requests and bytes it takes",
+	)
+
+	# Diff command
+	diff_parser = subparsers.add_parser(
+		"diff", help="Show the differences between two of the current activity's submissions", parents=[common_parser]
+	)
+	diff_parser.add_argument("old", type=int, help="Submission ID")
+	diff_parser.add_argument("new", type=int, nargs="?", default=None, help="Submission ID (default: the working copy)")
+
+	# Export command
+	export_parser = subparsers.add_parser(
+		"export", help="Stream a fetched course into a tar or zip archive", parents=[common_parser]
+	)
+	export_parser.add_argument("course_id", type=int, help="ID of the course to export")
+	export_parser.add_argument(
+		"-o", "--output", default="-", help="Archive to write (default: stdout, eg. `| ssh host tar x`)"
+	)
+	export_parser.add_argument(
+		"--format", choices=list(FORMATS), default=None, help="Archive format (default: from the output's name)"
+	)
+	export_parser.add_argument(
+		"--from-api", action="store_true", help="Build the archive from the API's responses instead of the fetched tree"
+	)
 
 	# Test command
-	subparsers.add_parser("test", help="Run the current course/category/activity tests")
+	test_parser = subparsers.add_parser(
+		"test",
+		help="Run the current course/category/activity tests. Unknown arguments are passed on to pytest",
+		parents=[common_parser, output_parser],
+	)
+	test_parser.add_argument(
+		"-j", "--jobs", type=int, default=None, help="Number of activities to test in parallel (default: CPU count)"
+	)
+	test_parser.add_argument(
+		"--no-cache", action="store_true", help="Rerun every activity, even the ones whose files haven't changed"
+	)
+	test_parser.add_argument(
+		"-w",
+		"--watch",
+		action="store_true",
+		help="Keep running, rerunning an activity's tests whenever its files change",
+	)
+	test_parser.add_argument(
+		"--profile",
+		action="store_true",
+		help="Report each test's time against its timeout, the solution's hot spots and peak memory",
+	)
+	default_limits = Limits()
+	test_parser.add_argument(
+		"--cpu-time",
+		type=float,
+		default=default_limits.cpu_time,
+		help="CPU seconds allowed per activity, 0 for no limit (default: %(default)s)",
+	)
+	test_parser.add_argument(
+		"--wall-time",
+		type=float,
+		default=default_limits.wall_time,
+		help="Wall clock seconds allowed per activity, 0 for no limit (default: %(default)s)",
+	)
+	test_parser.add_argument(
+		"--memory",
+		type=int,
+		default=default_limits.memory // 1024**2,
+		help="Address space allowed per activity in MiB, 0 for no limit (default: %(default)s)",
+	)
+
+	# Verify command
+	verify_parser = subparsers.add_parser(
+		"verify",
+		help="Check a mirror for missing, corrupted or orphaned activities and files",
+		parents=[common_parser],
+	)
+	verify_parser.add_argument(
+		"path",
+		nargs="?",
+		default=".",
+		help="A course, category or activity directory, or the directory holding courses/ (default: .)",
+	)
+	verify_parser.add_argument(
+		"--repair", action="store_true", help="Download the missing activities and files, and the corrupted ones"
+	)
+	verify_parser.add_argument(
+		"-j", "--jobs", type=int, default=None, help="Number of processes hashing files (default: CPU count)"
+	)
+
+	# Daemon command
+	daemon_parser = subparsers.add_parser(
+		"daemon",
+		help="Keep the enrolled courses under the current directory synced in the background",
+		parents=[common_parser],
+	)
+	daemon_parser.add_argument(
+		"--interval", type=float, default=DEFAULT_INTERVAL, help="Seconds between syncs (default: %(default)s)"
+	)
+	daemon_parser.add_argument(
+		"--jitter",
+		type=float,
+		default=DEFAULT_JITTER,
+		help="Randomly shift each sync by up to this fraction of the interval (default: %(default)s)",
+	)
+
+	# Completion command
+	completion_parser = subparsers.add_parser(
+		"completion",
+		help='Print a shell completion script (eg. `eval "$(myrpl completion bash)"`)',
+	)
+	completion_parser.add_argument("shell", choices=SHELLS, help="Shell to complete in")
 
 	# Version
 	parser.add_argument("-v", "--version", action="version", version=f"myrpl-cli {__version__}")
 
 	known_args, unknown_args = parser.parse_known_args()
 
-	cred_mgr = CredentialManager()
-	api = API(cred_mgr)
-	myrpl = MyRPL(api, cred_mgr)
-
-	if known_args.command == "login":
-		login_command(myrpl)
-	elif known_args.command == "list":
-		list_command(myrpl, known_args)
-	elif known_args.command == "fetch":
-		fetch_command(myrpl, known_args)
-	elif known_args.command == "test":
-		# Pass both known and unknown args to test_command
-		test_command(myrpl, unknown_args)
-	else:
-		parser.print_help()
+	trace_file = getattr(known_args, "trace", None)
+	if trace_file:
+		tracer.enable()
+
+	metrics_file = getattr(known_args, "metrics", None)
+	metrics = Metrics(known_args.command or "")
+	if metrics_file:
+		tracer.add_listener(metrics.on_span)
+
+	success = False
+	try:
+		if known_args.command == "completion":
+			# Shells run it at startup: no need for the API or the keyring
+			completion_command(known_args, subparsers)
+			success = True
+			return
+
+		offline = getattr(known_args, "offline", False)
+		# The keyring is only unlocked when it's needed (never offline)
+		cred_mgr = None if offline else CredentialManager()
+		api = API(cred_mgr, offline=offline)
+		myrpl = MyRPL(api, cred_mgr)
+		if getattr(known_args, "output_format", "text") == "ndjson":
+			myrpl.events = EventStream()
+
+		if known_args.command == "login":
+			login_command(myrpl)
+		elif known_args.command == "list":
+			list_command(myrpl, known_args)
+		elif known_args.command == "status":
+			status_command(myrpl, known_args)
+		elif known_args.command == "fetch":
+			fetch_command(myrpl, known_args)
+		elif known_args.command == "diff":
+			diff_command(myrpl, known_args)
+		elif known_args.command == "export":
+			export_command(myrpl, known_args)
+		elif known_args.command == "verify":
+			verify_command(myrpl, known_args)
+		elif known_args.command == "daemon":
+			daemon_command(myrpl, known_args)
+		elif known_args.command == "test":
+			# Pass both known and unknown args to test_command
+			test_command(myrpl, known_args, unknown_args)
+		else:
+			parser.print_help()
+		success = True
+	except OfflineError as e:
+		logger.error("%s. Run it online once so it's saved", e)
+		sys.exit(1)
+	except SystemExit as e:
+		success = e.code in (None, 0)
+		raise
+	finally:
+		if metrics_file:
+			metrics.finish(success)
+			metrics.write(metrics_file)
+		if trace_file:
+			tracer.write(trace_file)
+			print(tracer.summary(), file=sys.stderr)
+			logger.info("Trace written to %s", trace_file)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,159 @@
+"""
+Prometheus textfile metrics, written at the end of a run with `--metrics FILE`
+(or $MYRPL_METRICS_FILE) for node_exporter's textfile collector to scrape.
+
+Metrics are fed by the same spans --trace records (Metrics.on_span listens to the tracer)
+"""
+
+import os
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+METRICS_FILE_ENV_VAR = "MYRPL_METRICS_FILE"
+
+# Request latency histogram buckets, in seconds
+LATENCY_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+
+# Name -> (type, help)
+METRICS = {
+	"myrpl_requests_total": ("counter", "Requests made to myrpl.ar by route and status"),
+	"myrpl_request_duration_seconds": ("histogram", "Request latency by route"),
+	"myrpl_request_retries_total": ("counter", "Requests retried (eg. after a token renewal) by route"),
+	"myrpl_request_throttled_total": ("counter", "Requests answered with 429 Too Many Requests by route"),
+	"myrpl_response_bytes_total": ("counter", "Response body bytes by route, once decompressed"),
+	"myrpl_response_wire_bytes_total": ("counter", "Response body bytes by route, as transferred (compressed)"),
+	"myrpl_activities_total": ("counter", "Activities by outcome (fetched, updated or skipped)"),
+	"myrpl_written_bytes_total": ("counter", "Bytes written to disk"),
+	"myrpl_run_duration_seconds": ("gauge", "Duration of the last run"),
+	"myrpl_run_success": ("gauge", "Whether the last run succeeded (1) or failed (0)"),
+	"myrpl_run_timestamp_seconds": ("gauge", "When the last run finished, as a unix timestamp"),
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def escape(value: str) -> str:
+	return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(labels: Labels) -> str:
+	if not labels:
+		return ""
+	return "{" + ",".join(f'{name}="{escape(str(value))}"' for name, value in labels) + "}"
+
+
+def format_value(value: float) -> str:
+	return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Metrics:
+	"""Counters, gauges and histograms of a single run"""
+
+	def __init__(self, command: str = ""):
+		self.command = command
+		self.lock = threading.Lock()
+		self.values: Dict[str, Dict[Labels, float]] = defaultdict(lambda: defaultdict(float))
+		self.histograms: Dict[Labels, List[float]] = {}
+		self.start = time.perf_counter()
+
+	def labels(self, **labels) -> Labels:
+		return (("command", self.command), *sorted(labels.items()))
+
+	def inc(self, name: str, value: float = 1, **labels):
+		with self.lock:
+			self.values[name][self.labels(**labels)] += value
+
+	def set(self, name: str, value: float, **labels):
+		with self.lock:
+			self.values[name][self.labels(**labels)] = value
+
+	def observe(self, value: float, **labels):
+		"""Adds a request latency to its histogram (bucket counts, then sum and count)"""
+
+		key = self.labels(**labels)
+		with self.lock:
+			histogram = self.histograms.setdefault(key, [0] * (len(LATENCY_BUCKETS) + 2))
+			for index, bound in enumerate(LATENCY_BUCKETS):
+				if value <= bound:
+					histogram[index] += 1
+			histogram[-2] += value
+			histogram[-1] += 1
+
+	def on_span(self, event: dict):
+		"""Tracer listener: turns finished spans into metrics"""
+
+		args = event["args"]
+		if event["cat"] == "http":
+			route = {"method": args.get("method", ""), "route": args.get("route", "")}
+			status = args.get("status")
+			self.inc("myrpl_requests_total", status=str(status) if status is not None else "error", **route)
+			self.observe(event["dur"] / 1e6, **route)
+			if args.get("retry"):
+				self.inc("myrpl_request_retries_total", **route)
+			if status == 429:
+				self.inc("myrpl_request_throttled_total", **route)
+			if "bytes" in args:
+				self.inc("myrpl_response_bytes_total", args["bytes"], **route)
+				self.inc("myrpl_response_wire_bytes_total", args.get("wire_bytes", args["bytes"]), **route)
+		elif event["cat"] == "disk" and "bytes" in args:
+			self.inc("myrpl_written_bytes_total", args["bytes"])
+		elif event["name"] == "save_activity" and "outcome" in args:
+			self.inc("myrpl_activities_total", outcome=args["outcome"])
+
+	def finish(self, success: bool):
+		"""Sets the run's gauges"""
+
+		self.set("myrpl_run_duration_seconds", time.perf_counter() - self.start)
+		self.set("myrpl_run_success", 1 if success else 0)
+		self.set("myrpl_run_timestamp_seconds", time.time())
+
+	def render(self) -> str:
+		"""Prometheus text exposition format"""
+
+		lines = []
+		with self.lock:
+			for name, (metric_type, help_text) in METRICS.items():
+				if metric_type == "histogram":
+					if not self.histograms:
+						continue
+					lines.append(f"# HELP {name} {help_text}")
+					lines.append(f"# TYPE {name} {metric_type}")
+					for labels, histogram in sorted(self.histograms.items()):
+						for bound, count in zip(LATENCY_BUCKETS, histogram):
+							lines.append(
+								f"{name}_bucket{format_labels((*labels, ('le', f'{bound:g}')))} {format_value(count)}"
+							)
+						lines.append(
+							f"{name}_bucket{format_labels((*labels, ('le', '+Inf')))} {format_value(histogram[-1])}"
+						)
+						lines.append(f"{name}_sum{format_labels(labels)} {format_value(histogram[-2])}")
+						lines.append(f"{name}_count{format_labels(labels)} {format_value(histogram[-1])}")
+					continue
+
+				samples = self.values.get(name)
+				if not samples:
+					continue
+				lines.append(f"# HELP {name} {help_text}")
+				lines.append(f"# TYPE {name} {metric_type}")
+				for labels, value in sorted(samples.items()):
+					lines.append(f"{name}{format_labels(labels)} {format_value(value)}")
+
+		return "\n".join(lines) + "\n"
+
+	def write(self, path: str):
+		"""Writes the metrics atomically, so a scrape never sees a half written file"""
+
+		directory = os.path.dirname(os.path.abspath(path))
+		os.makedirs(directory, exist_ok=True)
+		fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".myrpl-", suffix=".prom.tmp")
+		try:
+			with os.fdopen(fd, "w", encoding="utf8") as file:
+				file.write(self.render())
+			os.chmod(tmp_path, 0o644)
+			os.replace(tmp_path, path)
+		except BaseException:
+			os.unlink(tmp_path)
+			raise
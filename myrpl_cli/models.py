@@ -1,7 +1,21 @@
-from typing import List, Optional, Literal
+from typing import Dict, List, Optional, Literal
 
 from pydantic import BaseModel, computed_field, field_validator
 
+SubmissionStatus = Literal[
+	"PENDING",
+	"ENQUEUED",
+	"PROCESSING",
+	"BUILD_ERROR",
+	"RUNTIME_ERROR",
+	"FAILURE",
+	"SUCCESS",
+	"TIME_OUT",
+	# Local runs only: pytest rejected its arguments (eg. a bad -k), or collected no tests
+	"USAGE_ERROR",
+	"NO_TESTS",
+]
+
 
 class CourseMetadata(BaseModel):
 	"""CourseMetadata model"""
@@ -23,6 +37,12 @@ class ActivityMetadata(BaseModel):
 	id: int
 	name: str
 	description: str
+	# Unset in activities fetched by older versions (which only kept Python)
+	language: Optional[str] = None
+	compilation_flags: Optional[str] = None
+	# sha256 of every file as it was fetched, for `myrpl verify`
+	files: Dict[str, str] = {}
+	read_only_files: Dict[str, str] = {}
 
 
 class MyRPLMetadata(BaseModel):
@@ -75,6 +95,15 @@ class Category(BaseModel):
 		)
 
 
+class IOTest(BaseModel):
+	"""IOTest model (an stdin/stdout test case)"""
+
+	id: int
+	name: str = ""
+	test_in: str = ""
+	test_out: str = ""
+
+
 class Activity(BaseModel):
 	"""Activity model"""
 
@@ -98,20 +127,12 @@ class Activity(BaseModel):
 	description: str
 
 	language: str
+	compilation_flags: str = ""
 	activity_unit_tests: Optional[str] = None
+	is_iotested: bool = False
+	activity_iotests: List[IOTest] = []
 	file_id: int
-	submission_status: Optional[
-		Literal[
-			"PENDING",
-			"ENQUEUED",
-			"PROCESSING",
-			"BUILD_ERROR",
-			"RUNTIME_ERROR",
-			"FAILURE",
-			"SUCCESS",
-			"TIME_OUT",
-		]
-	] = None
+	submission_status: Optional[SubmissionStatus] = None
 
 	@field_validator("submission_status", mode="before")
 	@classmethod
@@ -128,7 +149,13 @@ class Activity(BaseModel):
 		return MyRPLMetadata(
 			course=CourseMetadata(id=self.course.id, name=self.course.name),
 			category=CategoryMetadata(id=self.category.id, name=self.category.name),
-			activity=ActivityMetadata(id=self.id, name=self.name, description=self.description),
+			activity=ActivityMetadata(
+				id=self.id,
+				name=self.name,
+				description=self.description,
+				language=self.language,
+				compilation_flags=self.compilation_flags,
+			),
 		)
 
 
@@ -163,18 +190,7 @@ class Submission(BaseModel):
 	activity_starting_files_id: int
 	activity_language: str
 	activity_unit_tests: Optional[str] = None
-	submission_status: Optional[
-		Literal[
-			"PENDING",
-			"ENQUEUED",
-			"PROCESSING",
-			"BUILD_ERROR",
-			"RUNTIME_ERROR",
-			"FAILURE",
-			"SUCCESS",
-			"TIME_OUT",
-		]
-	] = None
+	submission_status: Optional[SubmissionStatus] = None
 	is_final_solution: Optional[bool] = None
 	exit_message: Optional[str] = None
 	stderr: Optional[str] = None
@@ -188,3 +204,43 @@ class SubmissionResult(Submission):
 	"""SubmissionResult model"""
 
 	submission: Submission
+
+
+class Hotspot(BaseModel):
+	"""Hotspot model (a profiled function of a solution)"""
+
+	function: str
+	calls: int
+	cumulative: float
+
+
+class CaseProfile(BaseModel):
+	"""CaseProfile model (profiling data of a single locally run test)"""
+
+	timeout: Optional[float] = None
+	peak_memory: int
+	hotspots: List[Hotspot] = []
+
+
+class CaseResult(BaseModel):
+	"""CaseResult model (a single locally run test)"""
+
+	name: str
+	passed: bool
+	duration: float
+	error_message: Optional[str] = None
+	profile: Optional[CaseProfile] = None
+
+
+class ActivityRunResult(BaseModel):
+	"""ActivityRunResult model (a local test run of a whole activity)"""
+
+	path: str
+	metadata: MyRPLMetadata
+	passed: bool
+	status: SubmissionStatus
+	exit_code: int
+	duration: float
+	output: str = ""
+	cases: List[CaseResult] = []
+	cached: bool = False
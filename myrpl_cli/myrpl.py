@@ -1,14 +1,40 @@
 import os
 import logging
 import getpass
-from typing import Optional
+import time
+from functools import partial
+from itertools import groupby
+from typing import Dict, List, Optional, Tuple
 
-import pytest
 import toml
 from tqdm import tqdm
 
-from myrpl_cli.errors import AuthError, NotMyRPLDirectoryError
-from myrpl_cli.models import Activity, MyRPLMetadata
+from myrpl_cli.c_runner import source_suffixes, unit_test_filename
+from myrpl_cli.cache import ResultCache
+from myrpl_cli.completion import update_index
+from myrpl_cli.export import add_files, add_tree, find_local_course, guess_format, open_archive, open_output
+from myrpl_cli.fetch_plan import format_plan, plan_fetch
+from myrpl_cli.hidden_modules import HiddenModuleExtractor, HiddenModuleStore
+from myrpl_cli.events import EventStream, activity_fields, course_fields, result_fields
+from myrpl_cli.daemon import fresh_courses
+from myrpl_cli.errors import AuthError, NotMyRPLDirectoryError, OfflineError
+from myrpl_cli.io_runner import io_test_files
+from myrpl_cli.local_tree import CourseIndex
+from myrpl_cli.models import Activity, ActivityRunResult, Course, MyRPLMetadata, Submission
+from myrpl_cli.tracing import span, traced_write
+from myrpl_cli.verify import (
+	VerifyReport,
+	check_activities,
+	compare_listing,
+	digests,
+	find_courses,
+	format_report,
+)
+from myrpl_cli.snapshots import SnapshotStore, format_diff
+from myrpl_cli.selection import filter_activities, tree_root
+from myrpl_cli.scheduler import DEFAULT_FETCH_JOBS, run_interleaved
+from myrpl_cli.sandbox import PROFILE_OPTION
+from myrpl_cli.runner import ActivityRunner, discover_activities, format_profile, format_summary, read_metadata
 from myrpl_cli.api import API
 from myrpl_cli.credential_manager import CredentialManager
 
@@ -22,6 +48,23 @@ class MyRPL:
 		self.api = api
 		self.cred_mgr = cred_mgr
 		self.api_token = None
+		# Directory holding courses/
+		self.root = "."
+		# Set for --output ndjson, which replaces the human readable output
+		self.events: Optional[EventStream] = None
+
+	def emit(self, event: str, **fields):
+		if self.events is not None:
+			self.events.emit(event, **fields)
+
+	def show(self, *args, **kwargs):
+		"""Prints human readable output (nothing with --output ndjson)"""
+
+		if self.events is None:
+			print(*args, **kwargs)
+
+	def progress(self, total: int) -> tqdm:
+		return tqdm(total=total, unit="activity", disable=self.events is not None)
 
 	def login(self):
 		"""Asks user for credentials, stores them and saves the token"""
@@ -43,68 +86,359 @@ class MyRPL:
 		"""Lists courses"""
 
 		courses = self.api.fetch_courses()
-		for course in courses:
-			if (course.enrolled and course.accepted) or all_courses:
-				print(f"{course.name}: {course.id}")
+		listed = [course for course in courses if (course.enrolled and course.accepted) or all_courses]
+		for course in listed:
+			self.show(f"{course.name}: {course.id}")
+			self.emit("course", **course_fields(course))
+		update_index(courses=listed, all_courses=True)
+
+	def find_course(self, course_id) -> Course:
+		return self.select_courses([course_id])[0]
 
-	def fetch_course(self, course_id, token=None, force=False):
-		"""Fetches all activities for a course id and saves them"""
+	def select_courses(self, course_ids=None, all_enrolled=False) -> List[Course]:
+		"""
+		Courses by id plus, with all_enrolled, every course `list` shows,
+		requesting the course list only once
+		"""
+
+		courses = self.api.fetch_courses()
+		selected = [course for course in courses if course.enrolled and course.accepted] if all_enrolled else []
+		for course_id in course_ids or []:
+			course = next((course for course in courses if course.id == course_id), None)
+			if course is None:
+				raise ValueError(f"Course with ID {course_id} not found.")
+			if course not in selected:
+				selected.append(course)
+		return selected
+
+	def status(self, course_id=None):
+		"""Prints a course's activities with their RPL status (by default, the current directory's course)"""
+
+		if course_id is None:
+			course_id = self.open_metadata().course.id
+
+		online = self.api.offline is False
+		if online and fresh_courses([course_id]) is not None:
+			# `myrpl daemon` keeps the persisted responses current
+			self.api.offline = True
+		try:
+			course = self.find_course(course_id)
+			activities = self.api.fetch_activities(course)
+		except OfflineError:
+			if not online:
+				raise
+			self.api.offline = False
+			course = self.find_course(course_id)
+			activities = self.api.fetch_activities(course)
+		finally:
+			if online:
+				self.api.offline = False
+		self.show(format_status(course, activities))
+		self.emit("course", **course_fields(course))
+		for activity in activities:
+			self.emit("activity", **activity_fields(activity))
+		solved = sum(1 for a in activities if a.submission_status == "SUCCESS")
+		self.emit("summary", solved=solved, total=len(activities))
+
+	def plan_fetch_courses(
+		self, course_ids=None, all_enrolled=False, force=False, categories=None, names=None, refresh=False
+	):
+		"""Prints what fetch_courses would create, update or skip, without fetching any activity"""
+
+		for course in self.select_courses(course_ids, all_enrolled):
+			activities = filter_activities(self.api.fetch_activities(course), categories, names)
+			plan = plan_fetch(course, activities, force, self.root, self.api.blobs, refresh)
+			self.show(format_plan(plan))
+			self.emit("plan", **plan.model_dump(mode="json"), requests=plan.requests, bytes=plan.bytes)
+
+	def fetch_course(self, course_id, token=None, force=False, hidden_modules=False, jobs=None):
+		"""Fetches all activities for a course id and saves them (see fetch_courses)"""
+
+		self.fetch_courses([course_id], token=token, force=force, hidden_modules=hidden_modules, jobs=jobs)
+
+	def fetch_courses(
+		self,
+		course_ids=None,
+		all_enrolled=False,
+		token=None,
+		force=False,
+		hidden_modules=False,
+		jobs=None,
+		categories=None,
+		names=None,
+	):
+		"""
+		Fetches all activities of several courses and saves them, on a single
+		pool of jobs workers shared (fairly interleaved) by every course.
+		Only activities matching the categories and names patterns (IDs or
+		globs) are fetched, filtered before requesting any of their details.
+		With hidden_modules, modules the unit tests import that only exist
+		on RPL's servers are recovered (via probe submissions) and saved too
+		"""
 
 		if token:
 			self.api_token = token
 
-		logger.info("Fetching course information for ID %i...", course_id)
-		courses = self.api.fetch_courses()
-		course = next((course for course in courses if course.id == course_id), None)
-		if course is None:
-			raise ValueError(f"Course with ID {course_id} not found.")
+		if not force and not hidden_modules and self.synced_by_daemon(course_ids, all_enrolled):
+			logger.info("Already up to date: `myrpl daemon` has just synced these courses")
+			return
 
-		logger.info("Fetching activities for course: %s...", course.name)
-		activities = self.api.fetch_activities(course)
+		logger.info("Fetching course information...")
+		courses = self.select_courses(course_ids, all_enrolled)
+		if not courses:
+			logger.warning("No courses to fetch")
+			return
 
+		course_activities = []
+		all_activities = {}
+		for course in courses:
+			logger.info("Fetching activities for course: %s...", course.name)
+			all_activities[course.id] = self.api.fetch_activities(course)
+			course_activities.append(filter_activities(all_activities[course.id], categories, names))
+		# Shell completion reads these instead of asking RPL
+		update_index(courses=courses, activities=all_activities)
+
+		total = sum(len(activities) for activities in course_activities)
 		logger.info(
-			"Found %i activities. Starting %s...",
-			len(activities),
+			"Found %i activities in %i courses. Starting %s...",
+			total,
+			len(courses),
 			"download" if force else "update",
 		)
-		with tqdm(total=len(activities), unit="activity") as pbar:
-			for activity in activities:
-				self.save_activity(activity, pbar, force)
 
-		logger.info(
-			"All activities for course %s (ID=%i) have been successfully %s.",
-			course.name,
-			course.id,
-			"saved" if force else "updated",
-		)
+		jobs = jobs or DEFAULT_FETCH_JOBS
+		self.api.set_pool_size(jobs)
+		with self.progress(total) as pbar:
+			groups = []
+			for course, activities in zip(courses, course_activities):
+				self.emit("course", **course_fields(course), activities=len(activities))
+				with span("scan", "disk", course=course.name):
+					index = CourseIndex.scan(self.course_path(course))
+				extractor = HiddenModuleExtractor(self.api, course.id, force=force) if hidden_modules else None
+				groups.append(
+					[partial(self.fetch_activity, activity, pbar, force, index, extractor) for activity in activities]
+				)
+			outcomes = run_interleaved(groups, jobs)
+		self.emit("summary", **{outcome: outcomes.count(outcome) for outcome in ("fetched", "updated", "skipped")})
 
-	def test(self, pytest_args):
+		for course in courses:
+			logger.info(
+				"All activities for course %s (ID=%i) have been successfully %s.",
+				course.name,
+				course.id,
+				"saved" if force else "updated",
+			)
+		if self.api.bytes_saved() > 0:
+			logger.info("Compression saved %.1f KiB of downloads", self.api.bytes_saved() / 1024)
+
+	def synced_by_daemon(self, course_ids=None, all_enrolled=False) -> bool:
+		"""Whether a daemon syncing this mirror has every course up to date"""
+
+		if not course_ids and not all_enrolled:
+			return False
+		if all_enrolled and fresh_courses(None, self.root) is None:
+			return False
+		return not course_ids or fresh_courses(course_ids, self.root) is not None
+
+	def fetch_here(self, force=False, hidden_modules=False, plan=False, categories=None, names=None):
+		"""
+		Fetches (or plans fetching) the course, category or activity of the current
+		.myrpl directory, narrowed down by categories and names patterns. An activity
+		is refreshed without requesting the course's activity list: its .myrpl and
+		read-only files, or every file when forced
+		"""
+
+		metadata = self.open_metadata()
+		self.root = tree_root(metadata)
+		course_id = metadata.course.id
+		if metadata.category:
+			categories = [str(metadata.category.id)]
+
+		if plan:
+			refresh = metadata.activity is not None
+			if refresh:
+				names = [str(metadata.activity.id)]
+			self.plan_fetch_courses([course_id], force=force, categories=categories, names=names, refresh=refresh)
+			return
+
+		if metadata.activity is None:
+			self.fetch_courses(
+				[course_id], force=force, hidden_modules=hidden_modules, categories=categories, names=names
+			)
+			return
+
+		course = self.find_course(course_id)
+		activity = self.api.fetch_activity(course, metadata.activity.id)
+		index = CourseIndex.scan(self.course_path(course))
+		extractor = HiddenModuleExtractor(self.api, course.id, force=force) if hidden_modules else None
+		with self.progress(1) as pbar:
+			self.fetch_activity(activity, pbar, force, index, extractor, detailed=True, refresh=True)
+
+		logger.info("Activity %s (ID=%i) has been successfully refreshed.", activity.name, activity.id)
+
+	def fetch_activity(
+		self,
+		activity: Activity,
+		pbar,
+		force: bool,
+		index: CourseIndex,
+		extractor: Optional[HiddenModuleExtractor],
+		detailed=False,
+		refresh=False,
+	) -> str:
+		"""Saves an activity (and its hidden modules, given an extractor) inside trace spans"""
+
+		with span("save_activity", "fetch", activity=activity.name) as args:
+			outcome = self.save_activity(activity, pbar, force, index, detailed, refresh)
+			args["outcome"] = outcome
+		self.emit("activity", **activity_fields(activity), outcome=outcome, path=self.activity_path(activity))
+		if extractor is not None:
+			with span("hidden_modules", "fetch", activity=activity.name) as args:
+				args["installed"] = extractor.install(activity, self.activity_path(activity))
+		return outcome
+
+	def export(self, course_id, output="-", archive_format=None, from_api=False):
+		"""
+		Streams a course into an archive (written to output, stdout for "-"): the
+		fetched tree or, from_api, the same tree built straight from the API's responses
+		"""
+
+		archive_format = archive_format or guess_format(output)
+		course_path = None
+		if not from_api:
+			course_path = find_local_course(course_id, self.root)
+			if course_path is None:
+				raise ValueError(f"Course {course_id} hasn't been fetched here (fetch it, or export it --from-api)")
+
+		with open_output(output) as file, open_archive(file, archive_format) as archive:
+			if from_api:
+				count = self.export_from_api(archive, course_id)
+			else:
+				count = add_tree(archive, course_path, f"courses/{os.path.basename(course_path)}")
+
+		logger.info("Exported %i files to %s", count, "stdout" if output == "-" else output)
+
+	def export_from_api(self, archive, course_id) -> int:
+		"""Adds a course's files to archive as they're fetched, one activity at a time"""
+
+		course = self.find_course(course_id)
+		activities = self.api.fetch_activities(course)
+		course_name = f"courses/{course.name}"
+		add_files(archive, course_name, {".myrpl": toml.dumps(course.metadata.model_dump())})
+
+		count, categories = 1, set()
+		with tqdm(total=len(activities), unit="activity") as pbar:
+			for activity in activities:
+				category = activity.category
+				category_name = f"{course_name}/{category.name}"
+				if category.name not in categories:
+					categories.add(category.name)
+					add_files(
+						archive,
+						category_name,
+						{".myrpl": toml.dumps(category.metadata.model_dump()), "description.txt": category.description},
+					)
+					count += 2
+
+				files, read_only_files = self.activity_files(self.api.fetch_activity_info(activity))
+				add_files(archive, f"{category_name}/{activity.name}", {**files, **read_only_files})
+				count += len(files) + len(read_only_files)
+				pbar.update(1)
+
+		return count
+
+	def test(self, pytest_args, jobs=None, use_cache=True, limits=None, profile=False) -> List[ActivityRunResult]:
 		"""
 		Run tests for current directory (course/category/activity)
 		"""
 
+		if profile:
+			pytest_args = [*pytest_args, PROFILE_OPTION]
+
 		meta = self.open_metadata()
 		if meta is None:
 			logger.error("can't run tests outside a myrpl directory")
-			return
+			return []
+
+		activity_paths = discover_activities(".")
+		if not activity_paths:
+			logger.warning("No activities found under %s", os.getcwd())
+			return []
 
-		logger.info("Running tests for:")
-		if meta.course is not None:
-			logger.info("Course: %s", meta.course.name)
-		if meta.category is not None:
-			logger.info("└──Category: %s", meta.category.name)
-		if meta.activity is not None:
-			logger.info("\t└──Activity: %s", meta.activity.name)
+		logger.info("Running tests for %i activities...", len(activity_paths))
+		start = time.perf_counter()
+		cache = ResultCache() if use_cache else None
+		runner = ActivityRunner(jobs=jobs, pytest_args=pytest_args, cache=cache, limits=limits)
+		results = runner.run(activity_paths, on_result=self.emit_result)
+		elapsed = time.perf_counter() - start
 
-		pytest.main(pytest_args)
+		for result in results:
+			# A lone activity behaves like plain pytest: always show its output
+			if not result.passed or len(results) == 1:
+				self.show(result.output)
 
-		logger.info("Finished tests for:")
-		if meta.course is not None:
-			logger.info("Course: %s", meta.course.name)
-		if meta.category is not None:
-			logger.info("└──Category: %s", meta.category.name)
-		if meta.activity is not None:
-			logger.info("\t└──Activity: %s", meta.activity.name)
+		if any(result.status == "USAGE_ERROR" for result in results):
+			logger.error("pytest rejected the arguments %s", " ".join(pytest_args))
+
+		if profile:
+			self.show(format_profile(results))
+
+		self.show(format_summary(results))
+		self.emit_summary(results, elapsed)
+		logger.info("Finished tests in %.2fs", elapsed)
+		return results
+
+	def emit_result(self, result: ActivityRunResult):
+		self.emit("test", **result_fields(result))
+
+	def emit_summary(self, results: List[ActivityRunResult], duration: float):
+		passed = sum(1 for result in results if result.passed)
+		self.emit("summary", passed=passed, failed=len(results) - passed, total=len(results), duration=duration)
+
+	def watch(self, pytest_args, jobs=None, use_cache=True, limits=None):
+		"""
+		Runs the current directory's tests, then reruns the
+		affected activity's tests every time a file changes
+		"""
+
+		# Preloads pytest and the tests' modules, which no other command needs
+		from myrpl_cli.watch import WarmPool, affected_activities, make_watcher
+
+		self.open_metadata()
+
+		activity_paths = discover_activities(".")
+		if not activity_paths:
+			logger.warning("No activities found under %s", os.getcwd())
+			return
+
+		pool = WarmPool(jobs)
+		watcher = make_watcher(activity_paths)
+		cache = ResultCache() if use_cache else None
+		runner = ActivityRunner(jobs=jobs, pytest_args=pytest_args, cache=cache, pool=pool, limits=limits)
+
+		try:
+			results = runner.run(activity_paths, on_result=self.emit_result)
+			self.show(format_summary(results))
+			logger.info("Watching %i activities for changes. Press Ctrl+C to stop", len(activity_paths))
+
+			while True:
+				changed = affected_activities(watcher.wait(), activity_paths)
+				if not changed:
+					continue
+
+				start = time.perf_counter()
+				results = runner.run(changed, on_result=self.emit_result)
+				for result in results:
+					if not result.passed:
+						self.show(result.output)
+				self.show(format_summary(results))
+				self.emit_summary(results, time.perf_counter() - start)
+				logger.info("Reran %i activities in %.2fs", len(results), time.perf_counter() - start)
+		except KeyboardInterrupt:
+			pass
+		finally:
+			watcher.close()
+			pool.close()
 
 	def open_metadata(self) -> Optional[MyRPLMetadata]:
 		"""
@@ -116,66 +450,288 @@ class MyRPL:
 
 		return MyRPLMetadata(**toml.load(".myrpl"))
 
-	def save_activity(self, activity: Activity, pbar, force=False):
+	def save_activity(
+		self,
+		activity: Activity,
+		pbar,
+		force=False,
+		index: Optional[CourseIndex] = None,
+		detailed=False,
+		refresh=False,
+	) -> str:
 		"""
-		Saves all relevant files for a given activity
+		Saves all relevant files for a given activity (requesting its details,
+		unless detailed). Whether it (and the course and category .myrpl) already
+		exist is looked up in index, scanned once per fetch (or here, when not given).
+		An existing activity is skipped, unless forced (overwritten) or refreshed
+		(all but the student's solution files are). Returns whether it was
+		"fetched", "updated" or "skipped"
 		"""
 
 		course = activity.course
 		category = activity.category
-		course_path = f"./courses/{course.name}"
-		category_path = f"./courses/{course.name}/{category.name}"
-		activity_path = f"./courses/{course.name}/{category.name}/{activity.name}"
-
-		if os.path.exists(f"{activity_path}/") and not force:
+		course_path = self.course_path(course)
+		category_path = os.path.join(course_path, category.name)
+		activity_path = self.activity_path(activity)
+		if index is None:
+			index = CourseIndex.scan(course_path)
+
+		exists = index.has_activity(category.name, activity.name)
+		if exists and not force and not refresh:
 			pbar.update(1)
 			pbar.set_description(f"Skipped: {activity.name}, already exists")
-			return
+			return "skipped"
+
+		outcome = "updated" if exists else "fetched"
 
-		activity = self.api.fetch_activity_info(activity)
+		if not detailed:
+			activity = self.api.fetch_activity_info(activity)
 		os.makedirs(activity_path, exist_ok=True)
 
-		course_metadata_path = os.path.join(course_path, ".myrpl")
-		if not os.path.exists(f"{course_metadata_path}/"):
-			with open(course_metadata_path, "w", encoding="utf8") as file:
-				file.write(toml.dumps(course.metadata.model_dump()))
+		if index.claim_metadata():
+			traced_write(os.path.join(course_path, ".myrpl"), toml.dumps(course.metadata.model_dump()))
 
-		category_metadata_path = os.path.join(category_path, ".myrpl")
-		if not os.path.exists(f"{category_metadata_path}/"):
-			with open(category_metadata_path, "w", encoding="utf8") as file:
-				file.write(toml.dumps(category.metadata.model_dump()))
+		if index.claim_metadata(category.name):
+			traced_write(os.path.join(category_path, ".myrpl"), toml.dumps(category.metadata.model_dump()))
 
-		category_description_path = f"./courses/{course.name}/{category.name}/description.txt"
-		with open(category_description_path, "w", encoding="utf8") as category_file:
-			category_file.write(category.description)
+		if index.claim_description(category.name):
+			traced_write(os.path.join(category_path, "description.txt"), category.description)
 
-		code_files = self.get_code_files(activity)
-		code_files = {k: v for k, v in code_files.items() if k.endswith(".py")}
+		files_to_save, files_to_link = self.activity_files(activity, force)
+		only = None
+		if exists and not force:
+			# The solution files may hold the student's work: only -f overwrites them
+			only = {".myrpl", "description.md", *files_to_link}
+		self.write_activity_files(activity_path, files_to_save, files_to_link, only)
 
-		files_to_save = {
-			".myrpl": toml.dumps(activity.metadata.model_dump()),
-			"description.md": activity.description,
-			**code_files,
-			"unit_test.py": activity.activity_unit_tests,
-		}
+		index.add_activity(category.name, activity.name)
+		pbar.update(1)
+		pbar.set_description(f"Saved: {activity.name}")
+		return outcome
+
+	def write_activity_files(
+		self, activity_path: str, files: Dict[str, str], files_to_link: Dict[str, str], only: Optional[set] = None
+	):
+		"""Writes (or links) an activity's files, or only some of them"""
 
-		for filename, content in files_to_save.items():
+		for filename, content in [*files.items(), *files_to_link.items()]:
+			if only is not None and filename not in only:
+				continue
 			file_path = os.path.join(activity_path, filename)
-			with open(file_path, "w", encoding="utf8") as file:
-				file.write(content)
+			# Only io_tests/ lives below the activity's directory
+			if os.path.dirname(filename):
+				os.makedirs(os.path.dirname(file_path), exist_ok=True)
+			if filename in files_to_link:
+				self.api.blobs.link(content, file_path)
+			else:
+				traced_write(file_path, content)
+
+	def activity_files(self, activity: Activity, force=False) -> Tuple[Dict[str, str], Dict[str, str]]:
+		"""
+		An activity's files (given its details), relative to its directory: the ones
+		the student edits, and the read-only ones (tests), which are hardlinked
+		from the blob store rather than copied. The .myrpl records all their hashes.
+		Forced, the code files are downloaded even if the blob store has them
+		"""
 
-		pbar.update(1)
-		pbar.set_description(f"Saved: {activity.name}")
+		code_files = self.get_code_files(activity, force)
+		suffixes = source_suffixes(activity.language)
+		code_files = {k: v for k, v in code_files.items() if k.endswith(suffixes)}
+
+		files = {"description.md": activity.description, **code_files}
+		read_only_files = io_test_files(activity.activity_iotests)
+		if activity.activity_unit_tests is not None:
+			read_only_files[unit_test_filename(activity.language)] = activity.activity_unit_tests
+
+		metadata = activity.metadata
+		metadata.activity.files = digests(files)
+		metadata.activity.read_only_files = digests(read_only_files)
+		return {".myrpl": toml.dumps(metadata.model_dump()), **files}, read_only_files
 
-	def get_code_files(self, activity):
+	def course_path(self, course: Course) -> str:
+		return os.path.join(self.root, "courses", course.name)
+
+	def activity_path(self, activity: Activity) -> str:
+		return os.path.join(self.course_path(activity.course), activity.category.name, activity.name)
+
+	def get_code_files(self, activity, force=False):
 		"""
-		Gets the latest submission or the initial code snippet files
+		Gets the latest submission (snapshotting it for `diff`) or the initial code snippet files
 		"""
 		if activity.submission_status is not None:
-			submissions = self.api.fetch_submissions(activity)
-			submissions.sort(key=lambda s: s.id)
+			submissions = self.student_submissions(activity)
+			if submissions:
+				last_submission = submissions[-1]
+				files = self.api.fetch_files(last_submission.submission_file_id, force=force)
+				self.snapshots(activity).add(last_submission.id, files)
+				return files
+
+		return self.api.fetch_files(activity.file_id, force=force)
+
+	def student_submissions(self, activity: Activity) -> List[Submission]:
+		"""An activity's submissions, oldest first"""
+
+		# Hidden module probes aren't the student's code
+		probes = set(HiddenModuleStore(activity.course.id).index.probe_submissions)
+		submissions = [s for s in self.api.fetch_submissions(activity) if s.id not in probes]
+		submissions.sort(key=lambda s: s.id)
+		return submissions
+
+	def snapshots(self, activity: Activity) -> SnapshotStore:
+		return SnapshotStore(self.api.base_url, activity.course.id, activity.id)
+
+	def diff(self, old_id: int, new_id: Optional[int] = None):
+		"""
+		Prints the differences between two submissions of the current directory's activity
+		(or between one and the working copy). Snapshots missing from the store are fetched first
+		"""
+
+		metadata = self.open_metadata()
+		if metadata.activity is None:
+			raise NotMyRPLDirectoryError("diff runs inside an activity directory")
+
+		store = SnapshotStore(self.api.base_url, metadata.course.id, metadata.activity.id)
+		wanted = [old_id] if new_id is None else [old_id, new_id]
+		if any(submission_id not in store for submission_id in wanted):
+			course = self.find_course(metadata.course.id)
+			activity = self.api.fetch_activity(course, metadata.activity.id)
+			for submission in self.student_submissions(activity):
+				if submission.id not in store:
+					store.add(submission.id, self.api.fetch_files(submission.submission_file_id, store=False))
+
+		old = store.get(old_id)
+		new = store.get(new_id) if new_id is not None else None
+		if old is None or (new_id is not None and new is None):
+			missing = old_id if old is None else new_id
+			raise ValueError(f"Submission {missing} isn't one of {metadata.activity.name}'s")
+
+		if new_id is None:
+			new = {}
+			for filename in old:
+				if os.path.isfile(filename):
+					with open(filename, encoding="utf8") as file:
+						new[filename] = file.read()
+
+		print(format_diff(old, new, f"#{old_id}", f"#{new_id}" if new_id is not None else "."), end="")
+
+	def verify(self, path=".", repair=False, jobs=None) -> List[VerifyReport]:
+		"""
+		Checks the courses of a mirror (or the course, category or activity of a
+		.myrpl directory) against the hashes fetch recorded and RPL's activity
+		list, printing a report per course. With repair, missing activities and
+		missing or corrupted files are downloaded again (and nothing else is)
+		"""
+
+		scopes = find_courses(path)
+		if not scopes:
+			raise NotMyRPLDirectoryError()
 
-			last_submission = submissions[-1]
-			return self.api.fetch_files(last_submission.submission_file_id)
-		else:
-			return self.api.fetch_files(activity.file_id)
+		reports = []
+		for course_path, metadata in scopes:
+			if metadata.category is None and metadata.activity is None:
+				self.root = os.path.normpath(os.path.join(course_path, os.pardir, os.pardir))
+				scope_path = course_path
+			else:
+				self.root = tree_root(metadata, path)
+				scope_path = path
+
+			report = self.verify_course(course_path, scope_path, metadata, jobs)
+			if repair and (not report.ok or any(check.unrecorded for check in report.activities)):
+				self.repair(report, metadata)
+				report = self.verify_course(course_path, scope_path, metadata, jobs)
+
+			print(format_report(report))
+			reports.append(report)
+		return reports
+
+	def verify_course(self, course_path: str, scope_path: str, metadata: MyRPLMetadata, jobs=None) -> VerifyReport:
+		"""Verifies the activities under scope_path (metadata's course, category or activity)"""
+
+		with span("scan", "disk", course=metadata.course.name):
+			activities = [(path, read_metadata(path)) for path in discover_activities(scope_path)]
+
+		with span("hash", "disk", course=metadata.course.name) as args:
+			checks = check_activities(activities, jobs)
+			args["activities"] = len(checks)
+
+		report = VerifyReport(
+			course=metadata.course.name,
+			course_id=metadata.course.id,
+			files=sum(len(m.activity.files) + len(m.activity.read_only_files) for _, m in activities),
+			activities=checks,
+		)
+
+		listed = self.listed_activities(metadata)
+		report.listed = listed is not None
+		if listed is not None:
+			compare_listing(report, listed)
+		return report
+
+	def listed_activities(self, metadata: MyRPLMetadata) -> Optional[List[Activity]]:
+		"""The activities RPL lists for a course (narrowed to metadata's category or activity), None if unavailable"""
+
+		try:
+			activities = self.api.fetch_activities(self.find_course(metadata.course.id))
+		except (OfflineError, ValueError) as e:
+			logger.warning("Can't get the activities of %s: %s", metadata.course.name, e)
+			return None
+
+		if metadata.category is not None:
+			activities = [a for a in activities if a.category_id == metadata.category.id]
+		if metadata.activity is not None:
+			activities = [a for a in activities if a.id == metadata.activity.id]
+		return activities
+
+	def repair(self, report: VerifyReport, metadata: MyRPLMetadata):
+		"""Downloads the report's missing activities and broken files, recording hashes where there were none"""
+
+		listed = {activity.id: activity for activity in self.listed_activities(metadata) or []}
+		broken = [*report.broken, *(check for check in report.activities if check.unrecorded and check.id in listed)]
+		missing = [listed[activity.id] for activity in report.missing]
+
+		repaired = 0
+		with self.progress(len(broken) + len(missing)) as pbar:
+			for check in broken:
+				if check.id not in listed:
+					logger.warning("Can't repair %s: RPL doesn't list it", check.path)
+					pbar.update(1)
+					continue
+				files, files_to_link = self.activity_files(self.api.fetch_activity_info(listed[check.id]))
+				self.write_activity_files(
+					check.path, files, files_to_link, {".myrpl", *check.missing, *check.corrupted}
+				)
+				repaired += 1
+				pbar.update(1)
+
+			if missing:
+				index = CourseIndex.scan(self.course_path(missing[0].course))
+				for activity in missing:
+					self.save_activity(activity, pbar, False, index)
+					repaired += 1
+
+		logger.info("Repaired %i activities of %s", repaired, report.course)
+
+
+def format_status(course: Course, activities: List[Activity]) -> str:
+	"""Formats a course's activities as a category → activity tree with their RPL status"""
+
+	lines = [course.name]
+	ordered = sorted(activities, key=lambda a: (a.category_name, a.name))
+	categories = [(name, list(group)) for name, group in groupby(ordered, key=lambda a: a.category_name)]
+	for i, (category_name, category_activities) in enumerate(categories):
+		last_category = i == len(categories) - 1
+		lines.append(f"{'└──' if last_category else '├──'} {category_name}")
+		indent = "    " if last_category else "│   "
+		for j, activity in enumerate(category_activities):
+			branch = "└──" if j == len(category_activities) - 1 else "├──"
+			if activity.submission_status == "SUCCESS":
+				line = f"✔ {activity.name}"
+			elif activity.submission_status is None:
+				line = f"· {activity.name}"
+			else:
+				line = f"✘ {activity.name} {activity.submission_status}"
+			lines.append(f"{indent}{branch} {line}")
+
+	solved = sum(1 for a in activities if a.submission_status == "SUCCESS")
+	lines.append(f"{solved}/{len(activities)} activities solved")
+	return "\n".join(lines)
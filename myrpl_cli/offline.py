@@ -0,0 +1,59 @@
+"""
+Persisted API responses, so commands can be answered without connectivity
+(`--offline`, or automatically once myrpl.ar can't be reached)
+"""
+
+import json
+import os
+import threading
+from typing import Optional
+from urllib.parse import urlsplit
+
+from myrpl_cli.cache import get_cache_dir
+from myrpl_cli.tracing import route_template
+
+# Routes whose (GET) responses are kept. Files aren't: fetch already saved them to the mirror
+PERSISTED_ROUTES = {
+	"/api/courses",
+	"/api/courses/{id}/activities",
+	"/api/courses/{id}/activities/{id}",
+	"/api/courses/{id}/activities/{id}/submissions",
+}
+
+
+class ResponseStore:
+	"""Last successful response of every persisted route, per server"""
+
+	def __init__(self, base_url: str, cache_dir: Optional[str] = None):
+		self.base_url = base_url
+		self.cache_dir = cache_dir
+
+	def directory(self) -> str:
+		if self.cache_dir is None:
+			self.cache_dir = get_cache_dir("responses", urlsplit(self.base_url).netloc.replace(":", "_"))
+		return self.cache_dir
+
+	def entry_path(self, url: str) -> str:
+		path = urlsplit(url).path.strip("/").replace("/", "_")
+		return os.path.join(self.directory(), f"{path}.json")
+
+	def get(self, url: str):
+		"""The persisted response for url, or None"""
+
+		try:
+			with open(self.entry_path(url), encoding="utf8") as file:
+				return json.load(file)
+		except (OSError, ValueError):
+			return None
+
+	def put(self, url: str, data):
+		"""Persists a response (only for PERSISTED_ROUTES)"""
+
+		if route_template(url) not in PERSISTED_ROUTES:
+			return
+
+		path = self.entry_path(url)
+		tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+		with open(tmp_path, "w", encoding="utf8") as file:
+			json.dump(data, file)
+		os.replace(tmp_path, path)
@@ -0,0 +1,122 @@
+"""
+pytest plugin loaded into every activity's test process.
+Dumps the per test outcomes as JSON so the runner can aggregate them.
+With --myrpl-profile every test also runs under cProfile and tracemalloc
+"""
+
+import cProfile
+import json
+import os
+import pstats
+import tracemalloc
+
+import pytest
+
+from myrpl_cli.sandbox import PROFILE_OPTION, REPORT_FILE_ENV_VAR
+
+HOTSPOT_COUNT = 5
+
+_cases = []
+_profiles = {}
+
+
+def pytest_addoption(parser):
+	parser.addoption(
+		PROFILE_OPTION,
+		action="store_true",
+		default=False,
+		help="myrpl: profile every test (hot spots in the solution and peak memory)",
+	)
+
+
+def declared_timeout(function):
+	"""
+	Returns the seconds given to @timeout_decorator.timeout(N) on a test, if any.
+	The decorator keeps them in its wrapper's closure
+	"""
+
+	function = getattr(function, "__func__", function)
+	while function is not None:
+		code = getattr(function, "__code__", None)
+		if code is not None and "seconds" in code.co_freevars and function.__closure__:
+			seconds = function.__closure__[code.co_freevars.index("seconds")].cell_contents
+			if isinstance(seconds, (int, float)):
+				return float(seconds)
+		function = getattr(function, "__wrapped__", None)
+
+	return None
+
+
+def hotspots(profiler: cProfile.Profile, root: str, test_file: str):
+	"""Top functions by cumulative time defined in the activity's own (non test) files"""
+
+	root, test_file = os.path.realpath(root), os.path.realpath(test_file)
+	entries = []
+	for (filename, line, function), (_, calls, _, cumulative, _) in pstats.Stats(profiler).stats.items():
+		# Builtins have no file ("~") and frozen modules have pseudo ones ("<frozen abc>")
+		if not os.path.isabs(filename):
+			continue
+		filename = os.path.realpath(filename)
+		if not filename.startswith(root + os.sep) or filename == test_file:
+			continue
+		entries.append(
+			{
+				"function": f"{os.path.relpath(filename, root)}:{line}({function})",
+				"calls": calls,
+				"cumulative": cumulative,
+			}
+		)
+
+	entries.sort(key=lambda entry: entry["cumulative"], reverse=True)
+	return entries[:HOTSPOT_COUNT]
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_call(item):
+	"""Profiles the test's call phase when asked to"""
+
+	if not item.config.getoption(PROFILE_OPTION):
+		yield
+		return
+
+	profiler = cProfile.Profile()
+	tracemalloc.start()
+	profiler.enable()
+	yield
+	profiler.disable()
+	_, peak_memory = tracemalloc.get_traced_memory()
+	tracemalloc.stop()
+
+	_profiles[item.nodeid] = {
+		"timeout": declared_timeout(getattr(item, "obj", None)),
+		"peak_memory": peak_memory,
+		"hotspots": hotspots(profiler, str(item.config.rootpath), str(item.path)),
+	}
+
+
+def pytest_runtest_logreport(report):
+	"""Records the outcome of every test (setup/teardown only when they fail)"""
+
+	if report.when != "call" and report.passed:
+		return
+
+	_cases.append(
+		{
+			"name": report.nodeid,
+			"passed": report.passed or report.skipped,
+			"duration": report.duration,
+			"error_message": report.longreprtext if report.failed else None,
+			"profile": _profiles.get(report.nodeid) if report.when == "call" else None,
+		}
+	)
+
+
+def pytest_sessionfinish(session, exitstatus):
+	"""Writes the recorded outcomes to the file requested by the runner"""
+
+	report_file = os.environ.get(REPORT_FILE_ENV_VAR)
+	if not report_file:
+		return
+
+	with open(report_file, "w", encoding="utf8") as file:
+		json.dump(_cases, file)
@@ -0,0 +1,302 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from itertools import groupby
+from typing import Callable, List, Optional
+
+import toml
+
+from myrpl_cli.c_runner import ObjectCache, is_c_activity, run_c_activity
+from myrpl_cli.cache import ResultCache, hash_activity
+from myrpl_cli.io_runner import is_io_activity, run_io_activity
+from myrpl_cli.models import ActivityRunResult, CaseResult, MyRPLMetadata
+from myrpl_cli.sandbox import REPORT_FILE_ENV_VAR, Limits, kill_process_tree, resolve_status, sandbox_env
+from myrpl_cli.tracing import span
+
+METADATA_FILENAME = ".myrpl"
+
+
+def read_metadata(path: str) -> MyRPLMetadata:
+	"""Reads and parses the metadata of a course/category/activity directory"""
+
+	return MyRPLMetadata(**toml.load(os.path.join(path, METADATA_FILENAME)))
+
+
+def discover_activities(root: str = ".") -> List[str]:
+	"""
+	Finds every activity directory (one whose .myrpl has activity metadata) under root
+	"""
+
+	activity_paths = []
+	for dirpath, dirnames, filenames in os.walk(root):
+		dirnames[:] = sorted(d for d in dirnames if not d.startswith((".", "__")))
+
+		if METADATA_FILENAME not in filenames:
+			continue
+
+		if read_metadata(dirpath).activity is not None:
+			activity_paths.append(dirpath)
+			# Activities don't nest
+			dirnames.clear()
+
+	return activity_paths
+
+
+def worker_env(report_file: str, limits: Limits) -> dict:
+	"""Environment for an activity's test process"""
+
+	env = sandbox_env(limits)
+	env[REPORT_FILE_ENV_VAR] = report_file
+	return env
+
+
+def pytest_arguments(path: str, pytest_args: List[str]) -> List[str]:
+	"""pytest arguments that run an activity's tests and report them back to myrpl"""
+
+	return [
+		"-p",
+		"myrpl_cli.pytest_plugin",
+		"-p",
+		"no:cacheprovider",
+		"--rootdir",
+		path,
+		*pytest_args,
+	]
+
+
+def pytest_command(path: str, pytest_args: List[str]) -> List[str]:
+	"""Command line that runs an activity's tests in a fresh, resource limited, interpreter"""
+
+	return [sys.executable, "-m", "myrpl_cli.sandbox", *pytest_arguments(path, pytest_args)]
+
+
+def read_cases(report_file: str) -> List[CaseResult]:
+	"""Parses the outcomes written by the pytest plugin"""
+
+	try:
+		with open(report_file, encoding="utf8") as file:
+			return [CaseResult(**case) for case in json.load(file)]
+	except (OSError, ValueError):
+		return []
+
+
+def run_activity(
+	path: str,
+	pytest_args: Optional[List[str]] = None,
+	limits: Optional[Limits] = None,
+) -> ActivityRunResult:
+	"""
+	Runs an activity's tests in its own resource limited interpreter,
+	so every activity gets a clean `alumno` module and a runaway
+	solution can't take the whole run down
+	"""
+
+	path = os.path.abspath(path)
+	metadata = read_metadata(path)
+	limits = limits or Limits()
+
+	with tempfile.TemporaryDirectory(prefix="myrpl-") as tmp_dir:
+		report_file = os.path.join(tmp_dir, "report.json")
+
+		start = time.perf_counter()
+		process = subprocess.Popen(
+			pytest_command(path, pytest_args or []),
+			cwd=path,
+			env=worker_env(report_file, limits),
+			stdin=subprocess.DEVNULL,
+			stdout=subprocess.PIPE,
+			stderr=subprocess.STDOUT,
+			text=True,
+			# Own process group, so a timeout kills the solution's children too
+			start_new_session=os.name == "posix",
+		)
+
+		timed_out = False
+		try:
+			output, _ = process.communicate(timeout=limits.wall_time)
+		except subprocess.TimeoutExpired:
+			timed_out = True
+			kill_process_tree(process)
+			output, _ = process.communicate()
+		duration = time.perf_counter() - start
+
+		cases = read_cases(report_file)
+
+	status = resolve_status(process.returncode, cases, timed_out)
+	return ActivityRunResult(
+		path=path,
+		metadata=metadata,
+		passed=status == "SUCCESS",
+		status=status,
+		exit_code=process.returncode,
+		duration=duration,
+		output=output,
+		cases=cases,
+	)
+
+
+class ActivityRunner:
+	"""Runs the tests of many activities in parallel, one process per activity"""
+
+	def __init__(
+		self,
+		jobs: Optional[int] = None,
+		pytest_args: Optional[List[str]] = None,
+		cache: Optional[ResultCache] = None,
+		pool=None,
+		limits: Optional[Limits] = None,
+	):
+		self.jobs = jobs or os.cpu_count() or 1
+		self.pytest_args = pytest_args or []
+		self.cache = cache
+		self.limits = limits or Limits()
+		# Optional myrpl_cli.watch.WarmPool, which skips interpreter and pytest startup
+		self.pool = pool
+		self.objects = ObjectCache()
+
+	def execute(self, path: str) -> ActivityRunResult:
+		"""
+		Runs a single activity: C ones through the object cache, IO tests
+		directly, unit tests on the warm pool if there's one
+		"""
+
+		fail_fast = "-x" in self.pytest_args or "--exitfirst" in self.pytest_args
+		metadata = read_metadata(path)
+		if is_c_activity(metadata):
+			return run_c_activity(path, metadata, self.limits, fail_fast=fail_fast, objects=self.objects)
+		if is_io_activity(path):
+			return run_io_activity(path, metadata, self.limits, fail_fast=fail_fast)
+		if self.pool is not None:
+			return self.pool.run(path, self.pytest_args, self.limits)
+		return run_activity(path, self.pytest_args, self.limits)
+
+	def run_one(self, path: str) -> ActivityRunResult:
+		"""Runs a single activity inside a trace span"""
+
+		with span("activity", "test", path=path) as args:
+			result = self.run_cached(path)
+			args.update(status=result.status, cached=result.cached)
+		return result
+
+	def run_cached(self, path: str) -> ActivityRunResult:
+		"""Runs a single activity, answering from the cache when its inputs haven't changed"""
+
+		if self.cache is None:
+			return self.execute(path)
+
+		key = hash_activity(path, [*self.pytest_args, self.limits.model_dump_json()])
+		cached = self.cache.get(key)
+		if cached is not None:
+			# The same contents may live at another path (eg. a copied activity)
+			return cached.model_copy(
+				update={"path": os.path.abspath(path), "metadata": read_metadata(path), "cached": True}
+			)
+
+		result = self.execute(path)
+		# Time outs and kills (eg. by the OOM killer) depend on the machine's load, not on the inputs
+		if result.status != "TIME_OUT" and result.exit_code >= 0:
+			self.cache.put(key, result)
+		return result
+
+	def run(
+		self,
+		activity_paths: List[str],
+		on_result: Optional[Callable[[ActivityRunResult], None]] = None,
+	) -> List[ActivityRunResult]:
+		"""Runs every activity and returns the results in activity_paths order"""
+
+		results = {}
+		# Each activity already runs in its own process; threads just wait on them
+		with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+			futures = {executor.submit(self.run_one, path): path for path in activity_paths}
+			for future in as_completed(futures):
+				result = future.result()
+				results[futures[future]] = result
+				if on_result is not None:
+					on_result(result)
+
+		return [results[path] for path in activity_paths]
+
+
+def format_summary(results: List[ActivityRunResult]) -> str:
+	"""Formats results as a course → category → activity tree"""
+
+	def course_key(result):
+		return result.metadata.course.name
+
+	def category_key(result):
+		return result.metadata.category.name if result.metadata.category else ""
+
+	lines = []
+	ordered = sorted(results, key=lambda r: (course_key(r), category_key(r), r.metadata.activity.name))
+	for course_name, course_results in groupby(ordered, key=course_key):
+		lines.append(course_name)
+		categories = [(name, list(group)) for name, group in groupby(course_results, key=category_key)]
+		for i, (category_name, category_results) in enumerate(categories):
+			last_category = i == len(categories) - 1
+			lines.append(f"{'└──' if last_category else '├──'} {category_name}")
+			indent = "    " if last_category else "│   "
+			for j, result in enumerate(category_results):
+				branch = "└──" if j == len(category_results) - 1 else "├──"
+				lines.append(f"{indent}{branch} {format_result(result)}")
+
+	passed = sum(1 for r in results if r.passed)
+	failed = len(results) - passed
+	lines.append(f"{passed} passed, {failed} failed")
+	return "\n".join(lines)
+
+
+def format_result(result: ActivityRunResult) -> str:
+	"""Formats a single activity line of the summary"""
+
+	mark = "✔" if result.passed else "✘"
+	line = f"{mark} {result.metadata.activity.name} ({result.duration:.2f}s{', cached' if result.cached else ''})"
+
+	if result.passed:
+		return line
+
+	line += f" {result.status}"
+	failed_cases = [case for case in result.cases if not case.passed]
+	if failed_cases:
+		line += f" ({len(failed_cases)}/{len(result.cases)} failed)"
+
+	return line
+
+
+# Tests using this much of their declared timeout are flagged in profiles
+TIMEOUT_WARNING_RATIO = 0.8
+
+
+def format_profile(results: List[ActivityRunResult]) -> str:
+	"""Formats the per test profiles of results (see --myrpl-profile)"""
+
+	lines = []
+	for result in sorted(results, key=lambda r: r.path):
+		profiled = [case for case in result.cases if case.profile is not None]
+		if not profiled:
+			continue
+
+		metadata = result.metadata
+		category_name = metadata.category.name if metadata.category else ""
+		lines.append(f"{metadata.course.name} / {category_name} / {metadata.activity.name}")
+
+		for case in profiled:
+			profile = case.profile
+			line = f"  {case.name.split('::')[-1]}: {case.duration:.2f}s"
+			if profile.timeout:
+				ratio = case.duration / profile.timeout
+				warning = " ⚠" if ratio >= TIMEOUT_WARNING_RATIO else ""
+				line += f" of {profile.timeout:g}s ({ratio:.0%}){warning}"
+			line += f", peak memory {profile.peak_memory / 1024**2:.1f} MiB"
+			lines.append(line)
+
+			for hotspot in profile.hotspots:
+				lines.append(f"      {hotspot.cumulative:8.3f}s {hotspot.calls:>8} calls  {hotspot.function}")
+
+	if lines:
+		lines.append("Profiled times include profiler overhead, so they overestimate real run times")
+	return "\n".join(lines)
@@ -0,0 +1,194 @@
+"""
+Resource limits for locally run tests, and the mapping of their
+outcome onto RPL's submission statuses.
+
+Also runnable as `python -m myrpl_cli.sandbox <pytest args>`, which
+applies the limits found in the environment and then runs pytest, or
+as `python -m myrpl_cli.sandbox --myrpl-script <script>` to run a
+solution's script instead (IO tests), or with `--myrpl-exec <binary>`
+to replace itself with a compiled solution (C activities)
+"""
+
+import math
+import os
+import runpy
+import signal
+import sys
+from typing import List, Optional
+
+from pydantic import BaseModel
+
+from myrpl_cli.models import CaseResult, SubmissionStatus
+
+try:
+	import resource
+except ImportError:  # Windows
+	resource = None
+
+CPU_TIME_ENV_VAR = "MYRPL_CPU_TIME"
+MEMORY_ENV_VAR = "MYRPL_MEMORY"
+SCRIPT_FLAG = "--myrpl-script"
+EXEC_FLAG = "--myrpl-exec"
+# Shared with the pytest plugin, which the runner mustn't import (it loads pytest)
+REPORT_FILE_ENV_VAR = "MYRPL_REPORT_FILE"
+PROFILE_OPTION = "--myrpl-profile"
+
+# Directory containing the myrpl_cli package, so sandboxed processes can import it
+PACKAGE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# pytest exit codes
+PYTEST_OK = 0
+PYTEST_TESTS_FAILED = 1
+PYTEST_INTERRUPTED = 2
+PYTEST_USAGE_ERROR = 4
+PYTEST_NO_TESTS_COLLECTED = 5
+
+TIME_OUT_ERRORS = ("TimeoutError", "Timed Out")
+RUNTIME_ERRORS = ("MemoryError", "RecursionError")
+
+
+class Limits(BaseModel):
+	"""Limits for an activity's test process"""
+
+	cpu_time: Optional[float] = 60
+	wall_time: Optional[float] = 120
+	memory: Optional[int] = 2 * 1024**3
+
+	def to_env(self) -> dict:
+		"""Environment variables that carry the limits into the test process"""
+
+		env = {}
+		if self.cpu_time is not None:
+			env[CPU_TIME_ENV_VAR] = str(self.cpu_time)
+		if self.memory is not None:
+			env[MEMORY_ENV_VAR] = str(self.memory)
+		return env
+
+	@classmethod
+	def from_env(cls) -> "Limits":
+		"""Reads the limits set by to_env"""
+
+		cpu_time = os.environ.get(CPU_TIME_ENV_VAR)
+		memory = os.environ.get(MEMORY_ENV_VAR)
+		return cls(
+			cpu_time=float(cpu_time) if cpu_time else None,
+			wall_time=None,
+			memory=int(memory) if memory else None,
+		)
+
+
+def sandbox_env(limits: Limits) -> dict:
+	"""Environment for a sandboxed process (python -m myrpl_cli.sandbox ...)"""
+
+	env = dict(os.environ)
+	env.update(limits.to_env())
+	env["PYTHONDONTWRITEBYTECODE"] = "1"
+	env["PYTHONPATH"] = os.pathsep.join(p for p in (PACKAGE_ROOT, env.get("PYTHONPATH")) if p)
+	return env
+
+
+def kill_process_tree(process):
+	"""Kills a test process (leading its own session) along with anything it spawned"""
+
+	if os.name == "posix":
+		try:
+			os.killpg(process.pid, signal.SIGKILL)
+		except ProcessLookupError:
+			pass
+	else:
+		process.kill()
+
+
+def apply_limits(limits: Limits):
+	"""
+	Applies CPU time and address space limits to the current process.
+	No-op where the resource module (or the limit) isn't available
+	"""
+
+	if resource is None:
+		return
+
+	if limits.cpu_time is not None:
+		# RLIMIT_CPU counts the whole process, so leave room for what it already used
+		usage = resource.getrusage(resource.RUSAGE_SELF)
+		soft = math.ceil(usage.ru_utime + usage.ru_stime + limits.cpu_time)
+		set_limit(resource.RLIMIT_CPU, soft, soft + 1)
+
+	if limits.memory is not None:
+		set_limit(resource.RLIMIT_AS, limits.memory, limits.memory)
+
+
+def set_limit(which: int, soft: int, hard: int):
+	"""Lowers a limit, never raising it above the current hard limit"""
+
+	_, current_hard = resource.getrlimit(which)
+	if current_hard != resource.RLIM_INFINITY:
+		soft, hard = min(soft, current_hard), min(hard, current_hard)
+
+	try:
+		resource.setrlimit(which, (soft, hard))
+	except (ValueError, OSError):
+		# eg. macOS doesn't support RLIMIT_AS
+		pass
+
+
+def resolve_status(exit_code: int, cases: List[CaseResult], timed_out: bool = False) -> SubmissionStatus:
+	"""Maps a test process' outcome onto RPL's submission statuses"""
+
+	if timed_out or (hasattr(signal, "SIGXCPU") and exit_code == -signal.SIGXCPU):
+		return "TIME_OUT"
+	if exit_code < 0:
+		# Killed by a signal (eg. segfault or the OOM killer)
+		return "RUNTIME_ERROR"
+	if exit_code == PYTEST_OK:
+		return "SUCCESS"
+	if exit_code == PYTEST_INTERRUPTED:
+		# Collection errors: alumno doesn't import (syntax errors, missing modules, ...)
+		return "BUILD_ERROR"
+	if exit_code == PYTEST_USAGE_ERROR:
+		# The arguments (or pytest's config) are wrong, not the solution
+		return "USAGE_ERROR"
+	if exit_code == PYTEST_NO_TESTS_COLLECTED:
+		# Nothing matched (eg. -k filtered every test out) or the activity has no tests
+		return "NO_TESTS"
+
+	if exit_code == PYTEST_TESTS_FAILED:
+		errors = [case.error_message or "" for case in cases if not case.passed]
+		if any(marker in error for error in errors for marker in TIME_OUT_ERRORS):
+			return "TIME_OUT"
+		if any(marker in error for error in errors for marker in RUNTIME_ERRORS):
+			return "RUNTIME_ERROR"
+		return "FAILURE"
+
+	return "RUNTIME_ERROR"
+
+
+def run_script(script: str):
+	"""Runs a script as __main__, like `python script` would"""
+
+	sys.argv = [script]
+	sys.path.insert(0, os.path.dirname(os.path.abspath(script)))
+	runpy.run_path(script, run_name="__main__")
+
+
+def main():
+	"""Applies the limits from the environment and runs pytest (or a script, or a binary)"""
+
+	if len(sys.argv) == 3 and sys.argv[1] == SCRIPT_FLAG:
+		apply_limits(Limits.from_env())
+		run_script(sys.argv[2])
+		return
+
+	if len(sys.argv) >= 3 and sys.argv[1] == EXEC_FLAG:
+		# The limits (and the CPU time used so far) carry over exec
+		apply_limits(Limits.from_env())
+		os.execv(sys.argv[2], sys.argv[2:])
+
+	import pytest
+
+	apply_limits(Limits.from_env())
+	sys.exit(int(pytest.main(sys.argv[1:])))
+
+
+if __name__ == "__main__":
+	main()
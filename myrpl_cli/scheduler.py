@@ -0,0 +1,45 @@
+"""
+Runs the activities of several courses on one thread pool. Tasks are
+interleaved course by course, so every course makes progress at the
+same pace, and the pool's size caps concurrent requests across all of them
+"""
+
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from itertools import chain, zip_longest
+from typing import Callable, List, TypeVar
+
+T = TypeVar("T")
+
+# Concurrent activity fetches (each one makes 2 to 3 requests in a row)
+DEFAULT_FETCH_JOBS = 8
+
+_MISSING = object()
+
+
+def interleave(groups: List[List[T]]) -> List[T]:
+	"""Round robin over groups: [[a1, a2], [b1], [c1, c2]] -> [a1, b1, c1, a2, c2]"""
+
+	return [item for item in chain.from_iterable(zip_longest(*groups, fillvalue=_MISSING)) if item is not _MISSING]
+
+
+def run_interleaved(groups: List[List[Callable[[], T]]], jobs: int = DEFAULT_FETCH_JOBS) -> List[T]:
+	"""
+	Runs every task, at most jobs at a time, started in interleave order.
+	Results are returned in that same order. The first failure (or an
+	interrupt, eg. Ctrl-C) cancels the tasks that haven't started and is raised
+	"""
+
+	tasks = interleave(groups)
+	with ThreadPoolExecutor(max_workers=max(jobs, 1)) as executor:
+		futures = [executor.submit(task) for task in tasks]
+		try:
+			done, _ = wait(futures, return_when=FIRST_EXCEPTION)
+		except BaseException:
+			executor.shutdown(cancel_futures=True)
+			raise
+		for future in futures:
+			if future in done and future.exception() is not None:
+				executor.shutdown(cancel_futures=True)
+				raise future.exception()
+
+	return [future.result() for future in futures]
@@ -0,0 +1,44 @@
+"""
+Picks which activities to fetch: `--category` and `--activity` filters, and
+the course/category/activity a .myrpl directory stands for
+"""
+
+import os
+from fnmatch import fnmatchcase
+from typing import List, Optional
+
+from myrpl_cli.models import Activity, MyRPLMetadata
+
+
+def matches(pattern: str, item_id: int, name: str) -> bool:
+	"""Whether pattern is item_id or a (case insensitive) glob matching name"""
+
+	if pattern.isdigit():
+		return int(pattern) == item_id
+	return fnmatchcase(name.casefold(), pattern.casefold())
+
+
+def filter_activities(
+	activities: List[Activity], categories: Optional[List[str]] = None, names: Optional[List[str]] = None
+) -> List[Activity]:
+	"""
+	Activities matching any of the category patterns and any of the activity
+	patterns (by ID or name glob). A missing filter matches everything
+	"""
+
+	return [
+		activity
+		for activity in activities
+		if (not categories or any(matches(p, activity.category_id, activity.category_name) for p in categories))
+		and (not names or any(matches(p, activity.id, activity.name) for p in names))
+	]
+
+
+def tree_root(metadata: MyRPLMetadata, path: str = ".") -> str:
+	"""
+	The directory holding courses/ for a .myrpl directory
+	(courses/{course}/{category}/{activity})
+	"""
+
+	depth = 2 + (metadata.category is not None) + (metadata.activity is not None)
+	return os.path.normpath(os.path.join(path, *[os.pardir] * depth))
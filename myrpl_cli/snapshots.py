@@ -0,0 +1,161 @@
+"""
+Local store of every submission's sources, for `myrpl diff`.
+
+Successive submissions are near-identical, so each version is kept as a
+line delta against the one stored before it, with a full keyframe every
+KEYFRAME_INTERVAL versions: reading any version applies at most
+KEYFRAME_INTERVAL - 1 deltas. Versions are zlib compressed
+"""
+
+import difflib
+import json
+import os
+import tempfile
+import zlib
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+
+from pydantic import BaseModel
+
+from myrpl_cli.cache import get_cache_dir
+
+KEYFRAME_INTERVAL = 16
+
+Files = Dict[str, str]
+
+
+class SnapshotVersion(BaseModel):
+	"""A stored submission: a keyframe, or a delta against base"""
+
+	id: int
+	base: Optional[int] = None
+
+
+class SnapshotIndex(BaseModel):
+	"""SnapshotIndex model (the versions of an activity, in the order they were stored)"""
+
+	versions: List[SnapshotVersion] = []
+
+
+def make_delta(base: Files, files: Files) -> dict:
+	"""
+	Per file, the runs of lines copied from the base's file of the same
+	name (["c", start, end]) and the lines inserted (["i", lines])
+	"""
+
+	delta = {}
+	for filename, content in files.items():
+		new_lines = content.splitlines(keepends=True)
+		base_lines = base.get(filename, "").splitlines(keepends=True)
+		operations = []
+		matcher = difflib.SequenceMatcher(None, base_lines, new_lines, autojunk=False)
+		for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+			if tag == "equal":
+				operations.append(["c", i1, i2])
+			elif j2 > j1:
+				operations.append(["i", new_lines[j1:j2]])
+		delta[filename] = operations
+	return delta
+
+
+def apply_delta(base: Files, delta: dict) -> Files:
+	files = {}
+	for filename, operations in delta.items():
+		base_lines = base.get(filename, "").splitlines(keepends=True)
+		lines = []
+		for operation in operations:
+			if operation[0] == "c":
+				lines.extend(base_lines[operation[1] : operation[2]])
+			else:
+				lines.extend(operation[1])
+		files[filename] = "".join(lines)
+	return files
+
+
+def format_diff(old: Files, new: Files, old_label: str, new_label: str) -> str:
+	"""Unified diff of every file in either version"""
+
+	chunks = []
+	for filename in sorted(set(old) | set(new)):
+		chunks.extend(
+			difflib.unified_diff(
+				old.get(filename, "").splitlines(keepends=True),
+				new.get(filename, "").splitlines(keepends=True),
+				fromfile=f"{old_label}/{filename}" if filename in old else "/dev/null",
+				tofile=f"{new_label}/{filename}" if filename in new else "/dev/null",
+			)
+		)
+	# Lines missing a final newline would run into the next header
+	return "".join(chunk if chunk.endswith("\n") else chunk + "\n" for chunk in chunks)
+
+
+class SnapshotStore:
+	"""An activity's submission sources, by submission id"""
+
+	def __init__(self, base_url: str, course_id: int, activity_id: int, cache_dir: Optional[str] = None):
+		server = urlsplit(base_url).netloc.replace(":", "_")
+		self.cache_dir = cache_dir or get_cache_dir("snapshots", server, str(course_id), str(activity_id))
+		self.index_path = os.path.join(self.cache_dir, "index.json")
+		self.index = self.load_index()
+
+	def load_index(self) -> SnapshotIndex:
+		try:
+			with open(self.index_path, encoding="utf8") as file:
+				return SnapshotIndex(**json.load(file))
+		except (OSError, ValueError):
+			return SnapshotIndex()
+
+	def write_atomically(self, path: str, data: bytes):
+		os.makedirs(self.cache_dir, exist_ok=True)
+		fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+		with os.fdopen(fd, "wb") as file:
+			file.write(data)
+		os.replace(tmp_path, path)
+
+	def version_path(self, submission_id: int) -> str:
+		return os.path.join(self.cache_dir, f"{submission_id}.z")
+
+	def versions(self) -> Dict[int, SnapshotVersion]:
+		return {version.id: version for version in self.index.versions}
+
+	def __contains__(self, submission_id: int) -> bool:
+		return submission_id in self.versions()
+
+	def add(self, submission_id: int, files: Files):
+		"""Stores a submission's files, as a delta against the last stored version unless a keyframe is due"""
+
+		if submission_id in self:
+			return
+
+		base = self.index.versions[-1].id if self.index.versions else None
+		if base is not None and len(self.index.versions) % KEYFRAME_INTERVAL != 0:
+			payload = {"delta": make_delta(self.get(base), files)}
+		else:
+			base, payload = None, {"files": files}
+
+		self.write_atomically(self.version_path(submission_id), zlib.compress(json.dumps(payload).encode("utf8"), 9))
+		self.index.versions.append(SnapshotVersion(id=submission_id, base=base))
+		self.write_atomically(self.index_path, self.index.model_dump_json().encode("utf8"))
+
+	def get(self, submission_id: int) -> Optional[Files]:
+		"""A submission's files, rebuilt from the closest keyframe before it"""
+
+		versions = self.versions()
+		if submission_id not in versions:
+			return None
+
+		chain = [versions[submission_id]]
+		while chain[-1].base is not None:
+			chain.append(versions[chain[-1].base])
+
+		files: Files = {}
+		for version in reversed(chain):
+			with open(self.version_path(version.id), "rb") as file:
+				payload = json.loads(zlib.decompress(file.read()))
+			files = payload["files"] if version.base is None else apply_delta(files, payload["delta"])
+		return files
+
+	def size(self) -> int:
+		"""Bytes on disk"""
+
+		return sum(entry.stat().st_size for entry in os.scandir(self.cache_dir) if entry.is_file())
@@ -0,0 +1,161 @@
+"""
+Lightweight span tracing, enabled with `--trace FILE`.
+
+Spans are kept in memory and written at the end of the run either as
+Chrome trace-event JSON (open it in chrome://tracing or Perfetto) or,
+for .jsonl files, as one event per line
+"""
+
+import contextlib
+import json
+import os
+import re
+import threading
+import time
+from collections import defaultdict
+from typing import Callable, List
+from urllib.parse import urlsplit
+
+ROUTE_COUNT = 10
+
+_ID_SEGMENT = re.compile(r"/\d+(?=/|$)")
+
+
+def route_template(url: str) -> str:
+	"""/api/courses/57/activities/5845 -> /api/courses/{id}/activities/{id}"""
+
+	return _ID_SEGMENT.sub("/{id}", urlsplit(url).path)
+
+
+class Tracer:
+	"""
+	Collects spans as Chrome trace events (complete events, ph X).
+	Listeners (eg. metrics) get every finished span, even when not recording
+	"""
+
+	def __init__(self):
+		self.recording = False
+		self.listeners: List[Callable[[dict], None]] = []
+		self.lock = threading.Lock()
+		self.events: List[dict] = []
+		self.origin = time.perf_counter()
+
+	@property
+	def enabled(self) -> bool:
+		return self.recording or bool(self.listeners)
+
+	def enable(self):
+		"""Starts recording spans (for write and summary)"""
+
+		self.recording = True
+		self.events = []
+		self.origin = time.perf_counter()
+
+	def add_listener(self, listener: Callable[[dict], None]):
+		self.listeners.append(listener)
+
+	def remove_listener(self, listener: Callable[[dict], None]):
+		self.listeners.remove(listener)
+
+	@contextlib.contextmanager
+	def span(self, name: str, category: str, **args):
+		"""
+		Records the time spent in the block. The yielded dict are the span's
+		args, so results known only at the end (status, bytes) can be added
+		"""
+
+		if not self.enabled:
+			yield {}
+			return
+
+		start = time.perf_counter()
+		try:
+			yield args
+		except BaseException as e:
+			args.setdefault("error", type(e).__name__)
+			raise
+		finally:
+			end = time.perf_counter()
+			event = {
+				"name": name,
+				"cat": category,
+				"ph": "X",
+				"ts": (start - self.origin) * 1e6,
+				"dur": (end - start) * 1e6,
+				"pid": os.getpid(),
+				"tid": threading.get_ident(),
+				"args": args,
+			}
+			if self.recording:
+				with self.lock:
+					self.events.append(event)
+			for listener in self.listeners:
+				listener(event)
+
+	def write(self, path: str):
+		"""Writes the spans as JSONL if path ends with .jsonl, as Chrome trace JSON otherwise"""
+
+		with self.lock:
+			events = sorted(self.events, key=lambda event: event["ts"])
+
+		with open(path, "w", encoding="utf8") as file:
+			if path.endswith(".jsonl"):
+				for event in events:
+					file.write(json.dumps(event, default=str) + "\n")
+			else:
+				json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, file, default=str)
+
+	def summary(self, count: int = ROUTE_COUNT) -> str:
+		"""Top routes by total time, plus the totals of every other span category"""
+
+		with self.lock:
+			events = list(self.events)
+
+		routes = defaultdict(lambda: [0, 0.0, 0, 0, 0])
+		categories = defaultdict(lambda: [0, 0.0])
+		for event in events:
+			if event["cat"] == "http":
+				args = event["args"]
+				route = routes[f"{args.get('method', '')} {args.get('route', '')}"]
+				route[0] += 1
+				route[1] += event["dur"] / 1e6
+				route[2] += args.get("bytes", 0)
+				route[3] += args.get("retry", 0)
+				route[4] += args.get("wire_bytes", args.get("bytes", 0))
+			else:
+				categories[event["cat"]][0] += 1
+				categories[event["cat"]][1] += event["dur"] / 1e6
+
+		lines = ["Top routes by total time:"]
+		top = sorted(routes.items(), key=lambda item: item[1][1], reverse=True)[:count]
+		for route, (calls, total, size, retries, wire_size) in top:
+			lines.append(
+				f"  {total:8.3f}s {calls:6d} calls {total / calls * 1000:8.1f}ms avg"
+				f" {size / 1024:10.1f} KiB ({wire_size / 1024:.1f} KiB transferred) {retries:4d} retries  {route}"
+			)
+		if not top:
+			lines.append("  (no requests)")
+
+		for category, (spans, total) in sorted(categories.items(), key=lambda item: item[1][1], reverse=True):
+			lines.append(f"{category}: {total:.3f}s in {spans} spans")
+
+		return "\n".join(lines)
+
+
+tracer = Tracer()
+
+
+def span(name: str, category: str, **args):
+	"""Shortcut for tracer.span (a no-op unless tracing was enabled)"""
+
+	return tracer.span(name, category, **args)
+
+
+def traced_write(path: str, content: str):
+	"""Writes a text file inside a `write` span"""
+
+	with span("write", "disk", path=path) as args:
+		with open(path, "w", encoding="utf8") as file:
+			file.write(content)
+		if tracer.enabled:
+			args["bytes"] = len(content.encode("utf8"))
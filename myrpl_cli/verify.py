@@ -0,0 +1,208 @@
+"""
+`myrpl verify`: checks a mirrored course against what fetch recorded.
+
+Every activity's .myrpl keeps the sha256 of each file as it was fetched.
+Files are hashed on a process pool (a few activities per task, so large
+mirrors don't pay a round trip per file) and activities are compared
+against the course's activity list to find missing and orphaned ones.
+Solution files are expected to change: only the read-only ones (tests)
+count as corrupted when they differ
+"""
+
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from pydantic import BaseModel
+
+from myrpl_cli.models import Activity, MyRPLMetadata
+from myrpl_cli.runner import METADATA_FILENAME, read_metadata
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class ActivityCheck(BaseModel):
+	"""ActivityCheck model (how an activity's files compare to their recorded hashes)"""
+
+	path: str
+	id: int
+	name: str
+	category_id: Optional[int] = None
+	missing: List[str] = []
+	# Read-only files (tests) that differ from what was fetched
+	corrupted: List[str] = []
+	# Solution files changed since they were fetched (the student's work)
+	edited: List[str] = []
+	# Fetched before hashes were recorded: only its .myrpl can be checked
+	unrecorded: bool = False
+
+	@property
+	def broken(self) -> bool:
+		return bool(self.missing or self.corrupted)
+
+
+class MissingActivity(BaseModel):
+	"""MissingActivity model (listed by RPL, but not in the mirror)"""
+
+	id: int
+	name: str
+	category: str
+
+
+class VerifyReport(BaseModel):
+	"""VerifyReport model (a course's verification)"""
+
+	course: str
+	course_id: int
+	files: int = 0
+	activities: List[ActivityCheck] = []
+	missing: List[MissingActivity] = []
+	# Local activities RPL doesn't list (any more)
+	orphaned: List[str] = []
+	# Whether the course's activity list was available (missing and orphaned need it)
+	listed: bool = True
+
+	@property
+	def broken(self) -> List[ActivityCheck]:
+		"""Activities with missing or corrupted files (orphans aside: there's nothing to repair them from)"""
+
+		return [check for check in self.activities if check.broken and check.path not in self.orphaned]
+
+	@property
+	def ok(self) -> bool:
+		"""Orphaned activities may be the student's own, so they're only reported"""
+
+		return not self.broken and not self.missing
+
+
+def find_courses(path: str = ".") -> List[Tuple[str, MyRPLMetadata]]:
+	"""
+	The courses to verify: the one of a .myrpl directory (with its metadata,
+	which narrows it down to a category or activity) or every course of a
+	mirror (a directory holding courses/), with their course path
+	"""
+
+	if os.path.exists(os.path.join(path, METADATA_FILENAME)):
+		metadata = read_metadata(path)
+		depth = (metadata.category is not None) + (metadata.activity is not None)
+		return [(os.path.normpath(os.path.join(path, *[os.pardir] * depth)), metadata)]
+
+	courses_path = os.path.join(path, "courses")
+	if not os.path.isdir(courses_path):
+		return []
+	return [
+		(entry.path, read_metadata(entry.path))
+		for entry in sorted(os.scandir(courses_path), key=lambda entry: entry.name)
+		if os.path.exists(os.path.join(entry.path, METADATA_FILENAME))
+	]
+
+
+def content_digest(content: str) -> str:
+	"""Digest of a file's contents, as fetch writes them (and file_digest reads them)"""
+
+	return hashlib.sha256(content.replace("\r\n", "\n").encode("utf8")).hexdigest()
+
+
+def digests(files: Dict[str, str]) -> Dict[str, str]:
+	return {filename: content_digest(content) for filename, content in files.items()}
+
+
+def file_digest(path: str) -> Optional[str]:
+	"""sha256 of a file (None if it's missing), ignoring CRLF line endings (eg. Windows checkouts)"""
+
+	hasher = hashlib.sha256()
+	try:
+		with open(path, "rb") as file:
+			pending_cr = b""
+			while chunk := file.read(CHUNK_SIZE):
+				chunk = pending_cr + chunk
+				# A \r\n split across chunks is still a line ending
+				pending_cr = b"\r" if chunk.endswith(b"\r") else b""
+				if pending_cr:
+					chunk = chunk[:-1]
+				hasher.update(chunk.replace(b"\r\n", b"\n"))
+			hasher.update(pending_cr)
+	except (FileNotFoundError, NotADirectoryError):
+		return None
+	return hasher.hexdigest()
+
+
+def hash_files(batch: List[Tuple[str, List[str]]]) -> List[Dict[str, Optional[str]]]:
+	"""Digests of the files of a batch of activities (run on the process pool)"""
+
+	return [
+		{filename: file_digest(os.path.join(activity_path, filename)) for filename in filenames}
+		for activity_path, filenames in batch
+	]
+
+
+def batches(items: list, jobs: int) -> List[list]:
+	"""Splits items in about 4 batches per worker, so they even out without a task per item"""
+
+	size = max(1, len(items) // (jobs * 4))
+	return [items[i : i + size] for i in range(0, len(items), size)]
+
+
+def check_activities(activities: List[Tuple[str, MyRPLMetadata]], jobs: Optional[int] = None) -> List[ActivityCheck]:
+	"""Hashes every recorded file of activities (path, metadata) and compares them"""
+
+	jobs = jobs or os.cpu_count() or 1
+	work = [(path, [*metadata.activity.files, *metadata.activity.read_only_files]) for path, metadata in activities]
+	if jobs == 1 or len(work) <= 1:
+		hashed = hash_files(work)
+	else:
+		with ProcessPoolExecutor(max_workers=jobs) as executor:
+			hashed = [digest for batch in executor.map(hash_files, batches(work, jobs)) for digest in batch]
+
+	checks = []
+	for (path, metadata), found in zip(activities, hashed):
+		activity = metadata.activity
+		check = ActivityCheck(
+			path=path,
+			id=activity.id,
+			name=activity.name,
+			category_id=metadata.category.id if metadata.category else None,
+			unrecorded=not activity.files and not activity.read_only_files,
+		)
+		recorded = {**activity.files, **activity.read_only_files}
+		for filename, digest in recorded.items():
+			if found[filename] is None:
+				check.missing.append(filename)
+			elif found[filename] != digest:
+				(check.corrupted if filename in activity.read_only_files else check.edited).append(filename)
+		checks.append(check)
+	return checks
+
+
+def compare_listing(report: VerifyReport, listed: List[Activity]):
+	"""Fills in the activities RPL lists that aren't local, and the local ones it doesn't list"""
+
+	local_ids = {check.id for check in report.activities}
+	listed_ids = {activity.id for activity in listed}
+	report.missing = [
+		MissingActivity(id=activity.id, name=activity.name, category=activity.category_name)
+		for activity in listed
+		if activity.id not in local_ids
+	]
+	report.orphaned = [check.path for check in report.activities if check.id not in listed_ids]
+
+
+def format_report(report: VerifyReport) -> str:
+	lines = [f"{report.course}: {len(report.activities)} activities, {report.files} files"]
+	for check in report.broken:
+		for kind in ("missing", "corrupted"):
+			lines.extend(f"  {kind}: {os.path.join(check.path, filename)}" for filename in getattr(check, kind))
+	lines.extend(f"  missing activity: {m.category}/{m.name} (ID={m.id})" for m in report.missing)
+	lines.extend(f"  orphaned activity: {path}" for path in report.orphaned)
+
+	edited = sum(len(check.edited) for check in report.activities)
+	unrecorded = sum(1 for check in report.activities if check.unrecorded)
+	if edited:
+		lines.append(f"  {edited} solution files edited since they were fetched")
+	if unrecorded:
+		lines.append(f"  {unrecorded} activities were fetched without hashes (`verify --repair` records them)")
+	if not report.listed:
+		lines.append("  couldn't get the activity list: missing and orphaned activities weren't checked")
+	lines.append("  OK" if report.ok else "  BROKEN (`myrpl verify --repair` downloads what's missing or corrupted)")
+	return "\n".join(lines)
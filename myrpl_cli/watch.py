@@ -0,0 +1,326 @@
+import ctypes
+import ctypes.util
+import multiprocessing
+import os
+import queue
+import select
+import struct
+import sys
+import tempfile
+import threading
+import time
+import unittest  # noqa: F401 (preloaded for the tests)
+from typing import Dict, List, Optional, Set, Tuple
+
+import pytest
+import timeout_decorator  # noqa: F401 (preloaded for the tests)
+
+from myrpl_cli.cache import list_input_files
+from myrpl_cli.models import ActivityRunResult
+from myrpl_cli.runner import pytest_arguments, read_cases, read_metadata
+from myrpl_cli.sandbox import REPORT_FILE_ENV_VAR, Limits, apply_limits, kill_process_tree, resolve_status
+
+# Modules every worker has imported before it's handed a job
+PRELOADED_MODULES = ["unittest", "timeout_decorator", "pytest", "myrpl_cli.pytest_plugin", "myrpl_cli.watch"]
+
+# Events closer than this are handled as a single change (editors usually write in bursts)
+DEBOUNCE_SECONDS = 0.05
+POLL_INTERVAL_SECONDS = 0.5
+
+
+def run_in_process(path: str, pytest_args: List[str]) -> ActivityRunResult:
+	"""
+	Runs an activity's tests in the current process.
+	Only meant for throwaway worker processes: it changes cwd, sys.path and fds 1 & 2
+	"""
+
+	path = os.path.abspath(path)
+	metadata = read_metadata(path)
+
+	os.chdir(path)
+	sys.path.insert(0, path)
+	sys.dont_write_bytecode = True
+
+	with tempfile.TemporaryDirectory(prefix="myrpl-") as tmp_dir:
+		report_file = os.path.join(tmp_dir, "report.json")
+		os.environ[REPORT_FILE_ENV_VAR] = report_file
+
+		with open(os.path.join(tmp_dir, "output.txt"), "w+", encoding="utf8") as output:
+			sys.stdout.flush()
+			sys.stderr.flush()
+			os.dup2(output.fileno(), 1)
+			os.dup2(output.fileno(), 2)
+
+			start = time.perf_counter()
+			exit_code = int(pytest.main(pytest_arguments(path, pytest_args)))
+			duration = time.perf_counter() - start
+
+			sys.stdout.flush()
+			sys.stderr.flush()
+			output.seek(0)
+			captured = output.read()
+
+		cases = read_cases(report_file)
+
+	status = resolve_status(exit_code, cases)
+	return ActivityRunResult(
+		path=path,
+		metadata=metadata,
+		passed=status == "SUCCESS",
+		status=status,
+		exit_code=exit_code,
+		duration=duration,
+		output=captured,
+		cases=cases,
+	)
+
+
+def warm_worker(conn):
+	"""Waits, with everything already imported, for a single job and runs it"""
+
+	try:
+		path, pytest_args, limits = conn.recv()
+	except EOFError:
+		return
+
+	if hasattr(os, "setsid"):
+		# Own process group, so a timeout kills the solution's children too
+		os.setsid()
+	apply_limits(Limits(**limits))
+	conn.send(run_in_process(path, pytest_args).model_dump())
+	conn.close()
+
+
+class WarmPool:
+	"""
+	Keeps `size` idle worker processes that already imported pytest & co.
+	Every worker runs a single job (so each activity gets a clean `alumno`)
+	and is replaced as soon as it's handed out
+	"""
+
+	def __init__(self, size: Optional[int] = None):
+		start_methods = multiprocessing.get_all_start_methods()
+		# Forking a threaded process is unsafe, so fork from a warm server instead when possible
+		if "forkserver" in start_methods:
+			self.ctx = multiprocessing.get_context("forkserver")
+			self.ctx.set_forkserver_preload(PRELOADED_MODULES)
+		else:
+			self.ctx = multiprocessing.get_context("spawn")
+
+		self.idle: "queue.Queue[Tuple[multiprocessing.process.BaseProcess, object]]" = queue.Queue()
+		self.lock = threading.Lock()
+		self.closed = False
+		for _ in range(size or os.cpu_count() or 1):
+			self.spawn()
+
+	def spawn(self):
+		"""Starts a new idle worker"""
+
+		parent_conn, child_conn = self.ctx.Pipe()
+		process = self.ctx.Process(target=warm_worker, args=(child_conn,), daemon=True)
+		with self.lock:
+			if self.closed:
+				return
+			process.start()
+		child_conn.close()
+		self.idle.put((process, parent_conn))
+
+	def run(self, path: str, pytest_args: List[str], limits: Optional[Limits] = None) -> ActivityRunResult:
+		"""Runs an activity's tests on an idle worker"""
+
+		limits = limits or Limits()
+		process, conn = self.idle.get()
+		threading.Thread(target=self.spawn, daemon=True).start()
+
+		start = time.perf_counter()
+		timed_out = False
+		try:
+			conn.send((os.path.abspath(path), pytest_args, limits.model_dump()))
+			if not conn.poll(limits.wall_time):
+				timed_out = True
+				kill_process_tree(process)
+			result = ActivityRunResult(**conn.recv())
+		except (EOFError, OSError):
+			process.join()
+			exit_code = process.exitcode if process.exitcode is not None else -1
+			status = resolve_status(exit_code, [], timed_out)
+			result = ActivityRunResult(
+				path=os.path.abspath(path),
+				metadata=read_metadata(path),
+				passed=False,
+				status=status,
+				exit_code=exit_code,
+				duration=time.perf_counter() - start,
+				output=f"Test worker stopped ({status}, exit code {exit_code})",
+			)
+		finally:
+			conn.close()
+
+		process.join()
+		return result
+
+	def close(self):
+		"""Stops every idle worker"""
+
+		with self.lock:
+			self.closed = True
+
+		while not self.idle.empty():
+			process, conn = self.idle.get_nowait()
+			conn.close()
+			process.join(timeout=1)
+			if process.is_alive():
+				process.terminate()
+
+
+def is_relevant(path: str) -> bool:
+	"""Whether a changed file can affect an activity's tests (skips editor & bytecode litter)"""
+
+	filename = os.path.basename(path)
+	return bool(filename) and not filename.startswith(".") and not filename.endswith(("~", ".pyc", ".swp"))
+
+
+class InotifyWatcher:
+	"""Watches directory trees for changes using Linux's inotify"""
+
+	IN_CLOSE_WRITE = 0x00000008
+	IN_MOVED_FROM = 0x00000040
+	IN_MOVED_TO = 0x00000080
+	IN_CREATE = 0x00000100
+	IN_DELETE = 0x00000200
+	IN_ISDIR = 0x40000000
+	MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+	EVENT_HEADER = struct.Struct("iIII")
+
+	def __init__(self, roots: List[str]):
+		self.libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+		self.fd = self.libc.inotify_init1(os.O_CLOEXEC | os.O_NONBLOCK)
+		if self.fd < 0:
+			raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+		self.watches: Dict[int, str] = {}
+		for root in roots:
+			for dirpath, dirnames, _ in os.walk(root):
+				dirnames[:] = [d for d in dirnames if not d.startswith((".", "__"))]
+				self.add_watch(dirpath)
+
+	def add_watch(self, path: str):
+		"""Starts watching a single directory"""
+
+		wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), self.MASK)
+		if wd < 0:
+			raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {path}")
+		self.watches[wd] = path
+
+	def read_events(self, timeout: Optional[float]) -> Set[str]:
+		"""Returns the paths changed within timeout seconds (or blocks when None)"""
+
+		ready, _, _ = select.select([self.fd], [], [], timeout)
+		if not ready:
+			return set()
+
+		changed = set()
+		buffer = os.read(self.fd, 64 * 1024)
+		offset = 0
+		while offset < len(buffer):
+			wd, mask, _, name_length = self.EVENT_HEADER.unpack_from(buffer, offset)
+			offset += self.EVENT_HEADER.size
+			name = buffer[offset : offset + name_length].rstrip(b"\0").decode(errors="replace")
+			offset += name_length
+
+			directory = self.watches.get(wd)
+			if directory is None or not name:
+				continue
+
+			path = os.path.join(directory, name)
+			if mask & self.IN_ISDIR:
+				if mask & (self.IN_CREATE | self.IN_MOVED_TO) and not name.startswith((".", "__")):
+					self.add_watch(path)
+				continue
+
+			changed.add(path)
+
+		return changed
+
+	def wait(self) -> Set[str]:
+		"""Blocks until something changes and returns every changed path"""
+
+		changed = set()
+		while not changed:
+			changed = {p for p in self.read_events(None) if is_relevant(p)}
+
+		# Let bursts of writes settle
+		while True:
+			more = self.read_events(DEBOUNCE_SECONDS)
+			if not more:
+				return changed
+			changed |= {p for p in more if is_relevant(p)}
+
+	def close(self):
+		os.close(self.fd)
+
+
+class PollingWatcher:
+	"""Watches directory trees by polling file stats, where inotify isn't available"""
+
+	def __init__(self, roots: List[str], interval: float = POLL_INTERVAL_SECONDS):
+		self.roots = roots
+		self.interval = interval
+		self.snapshot = self.take_snapshot()
+
+	def take_snapshot(self) -> Dict[str, Tuple[int, int]]:
+		"""Maps every relevant file to its (mtime, size)"""
+
+		snapshot = {}
+		for root in self.roots:
+			for relative_path in list_input_files(root):
+				path = os.path.join(root, relative_path)
+				try:
+					stat = os.stat(path)
+				except FileNotFoundError:
+					continue
+				snapshot[path] = (stat.st_mtime_ns, stat.st_size)
+		return snapshot
+
+	def wait(self) -> Set[str]:
+		"""Blocks until something changes and returns every changed path"""
+
+		while True:
+			time.sleep(self.interval)
+			snapshot = self.take_snapshot()
+			changed = {
+				path for path in snapshot.keys() | self.snapshot.keys() if snapshot.get(path) != self.snapshot.get(path)
+			}
+			self.snapshot = snapshot
+			if changed:
+				return changed
+
+	def close(self):
+		pass
+
+
+def make_watcher(roots: List[str]):
+	"""Returns an inotify watcher on Linux, falling back to polling elsewhere"""
+
+	if sys.platform.startswith("linux"):
+		try:
+			return InotifyWatcher(roots)
+		except (OSError, AttributeError):
+			pass
+
+	return PollingWatcher(roots)
+
+
+def affected_activities(changed_paths: Set[str], activity_paths: List[str]) -> List[str]:
+	"""Maps changed files to the activities containing them"""
+
+	roots = sorted((os.path.abspath(p) for p in activity_paths), key=len, reverse=True)
+	affected = set()
+	for changed_path in changed_paths:
+		changed_path = os.path.abspath(changed_path)
+		for root in roots:
+			if changed_path == root or changed_path.startswith(root + os.sep):
+				affected.add(root)
+				break
+
+	return sorted(affected)
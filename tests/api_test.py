@@ -7,7 +7,7 @@ import requests
 from myrpl_cli.errors import MissingCredentialsError
 from myrpl_cli.credential_manager import CredentialManager
 from myrpl_cli.models import Course, Activity, Submission, SubmissionResult
-from myrpl_cli.api import API
+from myrpl_cli.api import ACCEPT_ENCODING, API, CONNECT_TIMEOUT, READ_TIMEOUT
 
 
 @pytest.fixture(name="credential_manager")
@@ -74,8 +74,8 @@ def mock_submission(activity):
 def test_login(api):
 	"""It should login and return the login data"""
 
-	with patch("requests.post") as mock_post:
-		mock_response = Mock()
+	with patch.object(api.session, "post") as mock_post:
+		mock_response = Mock(status_code=200, content=b"{}", raw=None)
 		mock_response.json.return_value = {
 			"token_type": "Bearer",
 			"access_token": "test_token",
@@ -91,7 +91,8 @@ def test_login(api):
 			"username_or_email": "test@example.com",
 			"password": "password",
 		}
-		assert call_args[1]["timeout"] == 10
+		assert call_args[1]["timeout"] == (CONNECT_TIMEOUT, READ_TIMEOUT)
+		assert call_args[1]["headers"]["Accept-Encoding"] == ACCEPT_ENCODING
 
 		assert login_data["token_type"] == "Bearer"
 		assert login_data["access_token"] == "test_token"
@@ -0,0 +1,70 @@
+import os
+
+import pytest
+
+from benchmarks.history import BenchmarkRun, append_run, compare_runs, find_run, load_history
+from benchmarks.suite import BenchmarkResult, run_case
+from myrpl_cli.cache import CACHE_DIR_ENV_VAR
+
+
+def make_run(commit: str, wall_time: float, requests: float) -> BenchmarkRun:
+	result = BenchmarkResult(
+		name="fetch_course",
+		size=10,
+		rounds=1,
+		wall_time=wall_time,
+		wall_time_min=wall_time,
+		requests=requests,
+		bytes_sent=1000,
+		peak_rss=None,
+		files_written=47,
+	)
+	return BenchmarkRun(timestamp="2024-09-01T00:00:00+00:00", commit=commit, python="3", machine="x", results=[result])
+
+
+def test_compare_runs():
+	"""Only metrics that grew beyond the threshold should be flagged"""
+
+	base = make_run("aaaa", wall_time=1.0, requests=22)
+
+	assert not compare_runs(base, make_run("bbbb", wall_time=1.05, requests=22), threshold=0.1)
+
+	regressions = compare_runs(base, make_run("bbbb", wall_time=1.05, requests=40), threshold=0.1)
+	assert [(r.metric, r.base, r.head) for r in regressions] == [("requests", 22, 40)]
+
+
+def test_history(tmp_path):
+	history_file = str(tmp_path / "history.jsonl")
+	append_run(make_run("aaaa", 1.0, 22), history_file)
+	append_run(make_run("bbbb", 2.0, 22), history_file)
+
+	history = load_history(history_file)
+
+	assert find_run(history, "-1").commit == "bbbb"
+	assert find_run(history, "aa").commit == "aaaa"
+	with pytest.raises(ValueError):
+		find_run(history, "7")
+
+
+def test_run_case():
+	"""A case should count the requests and files a fetch costs"""
+
+	result = run_case("fetch_course", 4, rounds=1)
+
+	# courses + activities + (activity + files) per activity
+	assert result.requests == 2 + 2 * 4
+	# 4 activities (.myrpl, description.md, alumno.py, unit_test.py) + course .myrpl + 3 categories (.myrpl, description.txt)
+	assert result.files_written == 4 * 4 + 1 + 3 * 2
+	assert result.bytes_sent > 0
+
+
+def test_rounds_start_cold(tmp_path, monkeypatch):
+	"""Every round pays for its requests, whatever ran before it"""
+
+	monkeypatch.setenv(CACHE_DIR_ENV_VAR, str(tmp_path))
+
+	results = [run_case("fetch_course", 2, rounds=rounds) for rounds in (1, 2)]
+
+	assert results[0].requests == results[1].requests
+	assert results[0].bytes_sent == results[1].bytes_sent
+	assert not os.listdir(tmp_path)
@@ -0,0 +1,112 @@
+import os
+import stat
+
+import pytest
+
+from myrpl_cli.blobs import BlobStore
+from myrpl_cli.myrpl import MyRPL
+from tests.fake_server import FakeMyRPLServer, FakeServerConfig, make_course
+
+
+@pytest.fixture(name="server")
+def fake_server():
+	with FakeMyRPLServer(FakeServerConfig(), [make_course(1, activities=3)]) as server:
+		yield server
+
+
+@pytest.fixture(name="store")
+def blob_store(tmp_path):
+	return BlobStore("http://localhost:1234", str(tmp_path / "blobs"))
+
+
+def test_files_roundtrip(store):
+	files = {"alumno.py": "def f():\n\treturn 1\n", "helper.py": "def f():\n\treturn 1\n"}
+
+	store.put_files(7, files)
+
+	assert store.get_files(7) == files
+	assert store.get_files(8) is None
+	# Both files are the same blob
+	assert len(os.listdir(os.path.dirname(store.blob_path(store.put(files["alumno.py"]))))) == 1
+
+
+def test_corrupted_blob(store):
+	store.put_files(7, {"alumno.py": "print(1)\n"})
+	path = store.blob_path(store.put("print(1)\n"))
+	os.chmod(path, 0o644)
+	with open(path, "w", encoding="utf8") as file:
+		file.write("print(2)\n")
+
+	assert store.get_files(7) is None
+
+
+def test_link(store, tmp_path):
+	path = tmp_path / "unit_test.py"
+	path.write_text("stale", encoding="utf8")
+
+	assert store.link("def test(): pass\n", str(path))
+	assert store.link("def test(): pass\n", str(path))
+
+	assert path.read_text(encoding="utf8") == "def test(): pass\n"
+	assert os.path.samefile(path, store.blob_path(store.put("def test(): pass\n")))
+	assert not path.stat().st_mode & 0o222
+
+
+def test_link_over_read_only_file(store, tmp_path, monkeypatch):
+	"""Like Windows, refuse replacing read-only files: the old blob is left read-only"""
+
+	replace = os.replace
+
+	def windows_replace(src, dst):
+		if os.path.exists(dst) and not os.stat(dst).st_mode & stat.S_IWRITE:
+			raise PermissionError(13, "Access is denied")
+		replace(src, dst)
+
+	monkeypatch.setattr(os, "replace", windows_replace)
+	path = tmp_path / "unit_test.py"
+	store.link("def test(): pass\n", str(path))
+
+	assert store.link("def test(): assert True\n", str(path))
+
+	assert path.read_text(encoding="utf8") == "def test(): assert True\n"
+	assert not os.stat(store.blob_path(store.put("def test(): pass\n"))).st_mode & 0o222
+
+
+def test_link_falls_back_to_copy(store, tmp_path, monkeypatch):
+	def cross_device(*_):
+		raise OSError(18, "Invalid cross-device link")
+
+	monkeypatch.setattr(os, "link", cross_device)
+	path = tmp_path / "unit_test.py"
+
+	assert not store.link("def test(): pass\n", str(path))
+	assert path.read_text(encoding="utf8") == "def test(): pass\n"
+	# Editing the copy leaves the blob alone
+	path.write_text("edited", encoding="utf8")
+	assert store.read(store.put("def test(): pass\n")) == "def test(): pass\n"
+
+
+def test_mirrors_share_files(fake_api, server, tmp_path, monkeypatch):
+	"""A second mirror of the same course doesn't download any file again"""
+
+	for mirror in ("2024", "2025"):
+		(tmp_path / mirror).mkdir()
+		monkeypatch.chdir(tmp_path / mirror)
+		MyRPL(fake_api, fake_api.credential_manager).fetch_course(1)
+
+	assert server.requests["files"] == 3
+	unit_tests = list(tmp_path.glob("*/courses/*/*/*/unit_test.py"))
+	assert len(unit_tests) == 6
+	assert all(path.stat().st_nlink == 3 for path in unit_tests)
+
+
+def test_forced_fetch_skips_the_store(fake_api, server):
+	"""fetch -f recovers from a wrong file_id mapping"""
+
+	activity = fake_api.fetch_activities(fake_api.fetch_courses()[0])[0]
+	files = fake_api.fetch_files(activity.file_id)
+	fake_api.blobs.put_files(activity.file_id, {"alumno.py": "wrong"})
+
+	assert fake_api.fetch_files(activity.file_id)["alumno.py"] == "wrong"
+	assert fake_api.fetch_files(activity.file_id, force=True) == files
+	assert fake_api.fetch_files(activity.file_id) == files
@@ -0,0 +1,114 @@
+import shutil
+
+import pytest
+import toml
+
+from myrpl_cli.c_runner import ObjectCache, is_c_language, run_c_activity, source_suffixes, unit_test_filename
+from myrpl_cli.io_runner import io_test_files
+from myrpl_cli.models import IOTest
+from myrpl_cli.runner import ActivityRunner, read_metadata
+
+pytestmark = pytest.mark.skipif(shutil.which("cc") is None, reason="no C compiler")
+
+MAIN = '#include <stdio.h>\n#include "double.h"\n\nint main(void) {\n\tint n;\n\twhile (scanf("%d", &n) == 1)\n\t\tprintf("%d\\n", twice(n));\n\treturn 0;\n}\n'
+HEADER = "int twice(int n);\n"
+DOUBLE = '#include "double.h"\n\nint twice(int n) {\n\treturn 2 * n;\n}\n'
+
+
+@pytest.fixture(name="activity_path")
+def mock_c_activity(course_path):
+	"""Turns Activity 3 into an IO tested C activity split in two translation units"""
+
+	activity_path = course_path / "Test Category" / "Activity 3"
+	for filename in ("unit_test.py", "alumno.py"):
+		(activity_path / filename).unlink()
+
+	metadata = toml.load(activity_path / ".myrpl")
+	metadata["activity"]["language"] = "c_std11"
+	(activity_path / ".myrpl").write_text(toml.dumps(metadata), encoding="utf8")
+
+	(activity_path / "main.c").write_text(MAIN, encoding="utf8")
+	(activity_path / "double.h").write_text(HEADER, encoding="utf8")
+	(activity_path / "double.c").write_text(DOUBLE, encoding="utf8")
+
+	io_tests = [IOTest(id=i, name=f"case {i}", test_in=f"{i}\n", test_out=f"{2 * i}\n") for i in range(3)]
+	for filename, content in io_test_files(io_tests).items():
+		(activity_path / filename).parent.mkdir(exist_ok=True)
+		(activity_path / filename).write_text(content, encoding="utf8")
+
+	return activity_path
+
+
+def run(activity_path, objects):
+	return run_c_activity(str(activity_path), read_metadata(str(activity_path)), objects=objects)
+
+
+def test_languages():
+	assert is_c_language("c_std11") and is_c_language("C")
+	assert not is_c_language("PYTHON3") and not is_c_language(None)
+	assert source_suffixes("c") == (".c", ".h")
+	assert source_suffixes("python_3.7") == (".py",)
+	assert unit_test_filename("c") == "unit_test.c"
+
+
+def test_run_c_activity(activity_path, tmp_path):
+	"""A C activity should be built and its IO tests run against the binary"""
+
+	objects = ObjectCache(str(tmp_path / "objects"))
+	result = run(activity_path, objects)
+
+	assert result.status == "SUCCESS", result.output
+	assert len(result.cases) == 3
+	assert (objects.compiled, objects.linked) == (2, 1)
+
+
+def test_unchanged_units_are_not_recompiled(activity_path, tmp_path):
+	"""Only edited translation units should be recompiled, and an untouched activity not even relinked"""
+
+	objects = ObjectCache(str(tmp_path / "objects"))
+	run(activity_path, objects)
+
+	assert run(activity_path, objects).status == "SUCCESS"
+	assert (objects.compiled, objects.linked) == (2, 1)
+
+	(activity_path / "double.c").write_text(DOUBLE.replace("2 * n", "n + n"), encoding="utf8")
+	assert run(activity_path, objects).status == "SUCCESS"
+	assert (objects.compiled, objects.linked) == (3, 2)
+
+	# Headers are part of every unit's key
+	(activity_path / "double.h").write_text("/* doubles */\n" + HEADER, encoding="utf8")
+	assert run(activity_path, objects).status == "SUCCESS"
+	assert (objects.compiled, objects.linked) == (5, 3)
+
+
+def test_flags_are_part_of_the_key(activity_path, tmp_path):
+	objects = ObjectCache(str(tmp_path / "objects"))
+	run(activity_path, objects)
+
+	metadata = toml.load(activity_path / ".myrpl")
+	metadata["activity"]["compilation_flags"] = "-O0 -std=c99"
+	(activity_path / ".myrpl").write_text(toml.dumps(metadata), encoding="utf8")
+
+	assert run(activity_path, objects).status == "SUCCESS"
+	assert objects.compiled == 4
+
+
+def test_build_error(activity_path, tmp_path):
+	"""Compiler errors should be reported as BUILD_ERROR, and never cached"""
+
+	(activity_path / "double.c").write_text("int twice(int n) { return }\n", encoding="utf8")
+	objects = ObjectCache(str(tmp_path / "objects"))
+
+	result = run(activity_path, objects)
+
+	assert result.status == "BUILD_ERROR"
+	assert "double.c" in result.output
+	assert objects.compiled == 0
+
+
+def test_activity_runner(activity_path):
+	"""`myrpl test` should pick the C runner from the activity's language"""
+
+	result = ActivityRunner().run_one(str(activity_path))
+
+	assert result.status == "SUCCESS", result.output
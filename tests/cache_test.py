@@ -0,0 +1,67 @@
+import pytest
+
+from myrpl_cli.cache import ResultCache, hash_activity
+from myrpl_cli.runner import ActivityRunner, discover_activities
+
+
+def test_hash_activity_changes_with_contents(course_path):
+	"""Touching any input file should change that activity's key, and only that one"""
+
+	first, second = discover_activities(str(course_path))
+	first_key, second_key = hash_activity(first), hash_activity(second)
+
+	with open(f"{first}/alumno.py", "a", encoding="utf8") as file:
+		file.write("\n# edited\n")
+
+	assert hash_activity(first) != first_key
+	assert hash_activity(second) == second_key
+
+
+def test_hash_activity_ignores_hidden_files(course_path):
+	"""Byproducts such as __pycache__ or dotfiles shouldn't invalidate results"""
+
+	path = discover_activities(str(course_path))[0]
+	key = hash_activity(path)
+
+	(course_path / "Test Category" / "Activity 3" / "__pycache__").mkdir()
+	(course_path / "Test Category" / "Activity 3" / "__pycache__" / "alumno.pyc").write_bytes(b"\0")
+
+	assert hash_activity(path) == key
+
+
+def test_runner_reuses_cached_results(course_path, tmp_path):
+	"""Unchanged activities should be answered from the cache"""
+
+	runner = ActivityRunner(cache=ResultCache(str(tmp_path / "cache")))
+	paths = discover_activities(str(course_path))
+
+	first_run = runner.run(paths)
+	assert not any(result.cached for result in first_run)
+
+	(course_path / "Test Category" / "Activity 4" / "alumno.py").write_text(
+		"def resolver():\n\treturn 0\n", encoding="utf8"
+	)
+
+	second_run = runner.run(paths)
+	assert second_run[0].cached
+	assert second_run[0].passed
+	assert not second_run[1].cached
+	assert not second_run[1].passed
+
+
+@pytest.mark.parametrize("status, exit_code", [("TIME_OUT", -9), ("TIME_OUT", 1), ("RUNTIME_ERROR", -11)])
+def test_runner_doesnt_cache_nondeterministic_results(course_path, tmp_path, monkeypatch, status, exit_code):
+	"""A run that timed out or was killed may pass next time, with the same inputs"""
+
+	runner = ActivityRunner(cache=ResultCache(str(tmp_path / "cache")))
+	path = discover_activities(str(course_path))[0]
+	execute = runner.execute
+	monkeypatch.setattr(
+		runner, "execute", lambda path: execute(path).model_copy(update={"status": status, "exit_code": exit_code})
+	)
+
+	runner.run([path])
+	monkeypatch.setattr(runner, "execute", execute)
+
+	assert not runner.run([path])[0].cached
+	assert runner.run([path])[0].cached
@@ -0,0 +1,97 @@
+import shutil
+import subprocess
+
+import pytest
+
+from myrpl_cli.completion import completion_script, index_path, read_index, update_index
+from myrpl_cli.models import Course
+from myrpl_cli.myrpl import MyRPL
+from tests.fake_server import FakeMyRPLServer, FakeServerConfig, make_course
+
+COMMANDS = {"fetch": ["-a", "--activity", "-c", "--category", "-j", "--force"], "test": ["--watch"]}
+VALUE_OPTIONS = ["-a", "--activity", "-c", "--category", "-j"]
+
+
+@pytest.fixture(name="server")
+def fake_server():
+	with FakeMyRPLServer(FakeServerConfig(), [make_course(1, activities=4, categories=2)]) as server:
+		yield server
+
+
+def course(course_id, name):
+	return Course(
+		id=course_id,
+		name=name,
+		university="FIUBA",
+		university_course_id="1",
+		description="",
+		active=True,
+		semester="2c",
+		semester_start_date="",
+		semester_end_date="",
+		img_uri="",
+		date_created="",
+		last_updated="",
+	)
+
+
+def test_update_index(tmp_path):
+	"""Courses are merged in (or replaced, with all_courses), and names kept on one line"""
+
+	path = str(tmp_path / "completion.tsv")
+	update_index(courses=[course(1, "Algo\tI"), course(2, "Algo II")], path=path)
+	update_index(courses=[course(2, "Algoritmos II")], path=path)
+
+	assert read_index(path) == [("course", 1, 1, "Algo I"), ("course", 2, 2, "Algoritmos II")]
+
+	update_index(courses=[course(3, "Taller")], path=path, all_courses=True)
+
+	assert read_index(path) == [("course", 3, 3, "Taller")]
+
+
+def test_list_and_fetch_update_the_index(fake_api, server, tmp_path, monkeypatch):
+	monkeypatch.chdir(tmp_path)
+	myrpl = MyRPL(fake_api, fake_api.credential_manager)
+
+	myrpl.list()
+	myrpl.fetch_courses([1], categories=["1"])
+
+	rows = read_index()
+	activities = fake_api.fetch_activities(myrpl.find_course(1))
+	assert [row[0] for row in rows].count("course") == 1
+	# Every activity, not just the fetched ones
+	assert sorted(row[2] for row in rows if row[0] == "activity") == sorted(a.id for a in activities)
+	assert len({row[2] for row in rows if row[0] == "category"}) == 2
+
+
+@pytest.mark.skipif(shutil.which("bash") is None or shutil.which("awk") is None, reason="needs bash and awk")
+@pytest.mark.parametrize(
+	"words, expected",
+	[
+		(["myrpl", "fe"], ["fetch"]),
+		(["myrpl", "fetch", ""], ["1", "2"]),
+		(["myrpl", "fetch", "--f"], ["--force"]),
+		(["myrpl", "fetch", "-c", ""], ["Guia\\ 1", "Guia\\ 2"]),
+		(["myrpl", "fetch", "-j", "4", "2", "-a", ""], ["Parcial"]),
+		(["myrpl", "test", ""], []),
+	],
+)
+def test_bash_completion(words, expected):
+	"""The bash script completes from the index alone"""
+
+	update_index(courses=[course(1, "Algo I"), course(2, "Algo II")])
+	with open(index_path(), "a", encoding="utf8") as file:
+		file.write(
+			"category\t1\t10\tGuia 1\ncategory\t2\t20\tGuia 2\nactivity\t2\t30\tParcial\nactivity\t1\t31\tSuma\n"
+		)
+
+	script = completion_script("bash", COMMANDS, VALUE_OPTIONS)
+	test = f"COMP_WORDS=({' '.join(repr(word) for word in words)}); COMP_CWORD={len(words) - 1}; _myrpl"
+	output = subprocess.run(
+		["bash", "-c", f'{script}\n{test}; printf "%s\\n" "${{COMPREPLY[@]}}"'],
+		capture_output=True,
+		text=True,
+		check=True,
+	).stdout
+
+	assert output.splitlines() == (expected or [""])
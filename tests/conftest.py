@@ -0,0 +1,62 @@
+from unittest.mock import Mock
+
+import toml
+import pytest
+
+from myrpl_cli.api import API
+from myrpl_cli.cache import CACHE_DIR_ENV_VAR
+from myrpl_cli.credential_manager import CredentialManager
+from myrpl_cli.models import ActivityMetadata, CategoryMetadata, CourseMetadata, MyRPLMetadata
+from tests.fake_server import PASSWORD, USERNAME
+
+PASSING_TEST = "from alumno import resolver\n\n\ndef test_resolver():\n\tassert resolver() == {value}\n"
+
+
+@pytest.fixture(autouse=True)
+def isolated_cache_dir(tmp_path_factory, monkeypatch):
+	"""Keeps every test's cache (results, responses, hidden modules, ...) out of the real one"""
+
+	monkeypatch.setenv(CACHE_DIR_ENV_VAR, str(tmp_path_factory.mktemp("cache")))
+
+
+def write_metadata(path, metadata: MyRPLMetadata):
+	path.mkdir(parents=True, exist_ok=True)
+	(path / ".myrpl").write_text(toml.dumps(metadata.model_dump()), encoding="utf8")
+
+
+@pytest.fixture(name="course_path")
+def mock_course_tree(tmp_path):
+	"""
+	A course with two activities that both import `alumno`,
+	each with a different implementation
+	"""
+
+	course = CourseMetadata(id=1, name="Test Course")
+	category = CategoryMetadata(id=2, name="Test Category")
+	course_path = tmp_path / course.name
+	category_path = course_path / category.name
+
+	write_metadata(course_path, MyRPLMetadata(course=course))
+	write_metadata(category_path, MyRPLMetadata(course=course, category=category))
+
+	for activity_id, value in ((3, 1), (4, 2)):
+		activity = ActivityMetadata(id=activity_id, name=f"Activity {activity_id}", description="")
+		activity_path = category_path / activity.name
+		write_metadata(activity_path, MyRPLMetadata(course=course, category=category, activity=activity))
+		(activity_path / "alumno.py").write_text(f"def resolver():\n\treturn {value}\n", encoding="utf8")
+		(activity_path / "unit_test.py").write_text(PASSING_TEST.format(value=value), encoding="utf8")
+
+	return course_path
+
+
+@pytest.fixture(name="fake_api")
+def fake_server_api(server):
+	"""
+	An API client for the module's fake `server` fixture,
+	whose stored token is stale (so the first call renews it)
+	"""
+
+	credential_manager = Mock(spec=CredentialManager)
+	credential_manager.get_stored_credentials.return_value = (USERNAME, PASSWORD)
+	credential_manager.get_stored_token.return_value = "stale-token"
+	return API(credential_manager, base_url=server.url)
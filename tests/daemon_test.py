@@ -0,0 +1,143 @@
+import shutil
+
+import pytest
+
+from myrpl_cli.daemon import Daemon, fresh_courses, query_daemon
+from myrpl_cli.errors import AuthError
+from myrpl_cli.myrpl import MyRPL
+from tests.fake_server import FakeMyRPLServer, FakeServerConfig, make_course
+
+
+@pytest.fixture(name="server")
+def fake_server():
+	with FakeMyRPLServer(FakeServerConfig(), [make_course(1, activities=3), make_course(2, enrolled=False)]) as server:
+		yield server
+
+
+@pytest.fixture(name="myrpl")
+def mirror(fake_api, tmp_path, monkeypatch):
+	monkeypatch.chdir(tmp_path)
+	return MyRPL(fake_api, fake_api.credential_manager)
+
+
+@pytest.fixture(name="daemon")
+def running_daemon(myrpl):
+	daemon = Daemon(myrpl)
+	yield daemon
+	daemon.close()
+
+
+def test_sync_only_changed(myrpl, daemon, server, tmp_path):
+	"""Enrolled courses are saved, then only activities that changed are requested again"""
+
+	daemon.sync()
+
+	assert len(list((tmp_path / "courses").glob("*/*/*/.myrpl"))) == 3
+	assert server.requests["activity"] == 3
+
+	server.reset_stats()
+	daemon.sync()
+	assert server.requests["activity"] == 0
+
+	activity = myrpl.api.fetch_activities(myrpl.find_course(1))[0]
+	solution = tmp_path / "alumno.py"
+	solution.write_text("print('submitted from the web')\n", encoding="utf8")
+	myrpl.api.submit(activity, str(solution))
+	# RPL's activity list reports the new status too
+	next(a for a in server.courses[1].activities if a["id"] == activity.id)["submission_status"] = "SUCCESS"
+	edited = tmp_path / "courses" / activity.course.name / activity.category_name / activity.name / "alumno.py"
+	edited.write_text("# local work in progress\n", encoding="utf8")
+
+	server.reset_stats()
+	daemon.sync()
+
+	assert server.requests["activity"] == 1
+	assert server.requests["submissions"] == 1
+	# The mirror is only ever added to
+	assert edited.read_text(encoding="utf8") == "# local work in progress\n"
+	# ...but the submission is already snapshotted for `diff`
+	assert len(myrpl.snapshots(activity).index.versions) == 1
+
+
+def test_state_survives_restarts(myrpl, daemon, server):
+	daemon.sync()
+	server.reset_stats()
+
+	Daemon(myrpl).sync()
+
+	assert server.requests["activity"] == 0
+
+
+def test_foreground_commands_ask_the_daemon(myrpl, daemon, server, capsys):
+	"""With a fresh daemon, fetch and status don't touch the network"""
+
+	assert fresh_courses([1]) is None
+	daemon.serve()
+	daemon.sync()
+
+	answer = query_daemon({"course_ids": [1]})
+	assert answer["courses"]["1"]["fresh"]
+	assert fresh_courses(None, ".") == [1]
+	assert fresh_courses([1], "/elsewhere") is None
+
+	server.reset_stats()
+	myrpl.fetch_courses([1])
+	myrpl.fetch_courses(all_enrolled=True)
+	myrpl.status(1)
+
+	assert sum(server.requests.values()) == 0
+	assert "0/3 activities solved" in capsys.readouterr().out
+	assert not myrpl.api.offline
+
+	daemon.interval = 0
+	assert fresh_courses([1]) is None
+
+
+def test_missing_activities_are_fetched(myrpl, daemon, server, tmp_path):
+	"""An activity deleted from the mirror isn't up to date, even if RPL's copy didn't change"""
+
+	daemon.serve()
+	daemon.sync()
+	deleted = next((tmp_path / "courses").glob("*/*/*/.myrpl")).parent
+	shutil.rmtree(deleted)
+
+	assert fresh_courses([1], ".") is None
+	myrpl.fetch_courses([1])
+	assert deleted.is_dir()
+
+	shutil.rmtree(deleted)
+	server.reset_stats()
+	daemon.sync()
+
+	assert deleted.is_dir()
+	assert server.requests["activity"] == 1
+
+
+@pytest.mark.parametrize("error", [AuthError("token expired"), ValueError("malformed activity list")])
+def test_failing_course_doesnt_stop_the_rest(myrpl, daemon, server, monkeypatch, error):
+	"""A course that can't be synced is logged and retried next cycle, the others still sync"""
+
+	server.courses[2].course.update(enrolled=True, accepted=True)
+	fetch_activities = myrpl.api.fetch_activities
+
+	def failing_fetch_activities(course):
+		if course.id == 1:
+			raise error
+		return fetch_activities(course)
+
+	with monkeypatch.context() as patch:
+		patch.setattr(myrpl.api, "fetch_activities", failing_fetch_activities)
+		daemon.sync()
+
+	assert list(daemon.state.courses) == [2]
+
+	daemon.sync()
+
+	assert sorted(daemon.state.courses) == [1, 2]
+
+
+def test_one_daemon_per_socket(myrpl, daemon):
+	daemon.serve()
+
+	with pytest.raises(OSError):
+		Daemon(myrpl).serve()
@@ -0,0 +1,92 @@
+import io
+import json
+
+import pytest
+
+from myrpl_cli.events import EventStream
+from myrpl_cli.myrpl import MyRPL
+from tests.fake_server import FakeMyRPLServer, FakeServerConfig, make_course
+
+
+class FlushCounter(io.StringIO):
+	def __init__(self):
+		super().__init__()
+		self.flushes = 0
+
+	def flush(self):
+		self.flushes += 1
+		super().flush()
+
+
+@pytest.fixture(name="server")
+def fake_server():
+	with FakeMyRPLServer(FakeServerConfig(), [make_course(1, activities=3, categories=1)]) as server:
+		yield server
+
+
+def events(stream):
+	return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+
+def ndjson_myrpl(api):
+	myrpl = MyRPL(api, api.credential_manager)
+	myrpl.events = EventStream(FlushCounter())
+	return myrpl
+
+
+def test_every_event_is_flushed():
+	stream = FlushCounter()
+	EventStream(stream).emit("course", id=1, name="Algo I")
+	EventStream(stream).emit("course", id=2, name="Algo II")
+
+	assert stream.flushes == 2
+	assert events(stream) == [
+		{"event": "course", "id": 1, "name": "Algo I"},
+		{"event": "course", "id": 2, "name": "Algo II"},
+	]
+
+
+def test_fetch_events(fake_api, server, tmp_path, monkeypatch, capsys):
+	"""fetch reports the course, every activity saved or skipped, and a summary (and nothing else on stdout)"""
+
+	monkeypatch.chdir(tmp_path)
+	myrpl = ndjson_myrpl(fake_api)
+
+	myrpl.fetch_courses([1])
+	myrpl.fetch_courses([1])
+
+	emitted = events(myrpl.events.stream)
+	assert [event["event"] for event in emitted] == ["course", *["activity"] * 3, "summary"] * 2
+	assert {event["outcome"] for event in emitted[1:4]} == {"fetched"}
+	assert {event["outcome"] for event in emitted[6:9]} == {"skipped"}
+	assert emitted[-1] == {"event": "summary", "fetched": 0, "updated": 0, "skipped": 3}
+	assert all((tmp_path / event["path"]).is_dir() for event in emitted if event["event"] == "activity")
+	assert capsys.readouterr().out == ""
+
+
+def test_list_and_status_events(fake_api, server, monkeypatch, capsys):
+	myrpl = ndjson_myrpl(fake_api)
+
+	myrpl.list()
+	myrpl.status(1)
+
+	emitted = events(myrpl.events.stream)
+	assert emitted[0]["event"] == "course" and emitted[0]["id"] == 1
+	assert [event["event"] for event in emitted[1:]] == ["course", *["activity"] * 3, "summary"]
+	assert emitted[-1] == {"event": "summary", "solved": 0, "total": 3}
+	assert capsys.readouterr().out == ""
+
+
+def test_test_events(fake_api, course_path, monkeypatch, capsys):
+	"""Every test result is reported as it completes, then the summary"""
+
+	monkeypatch.chdir(course_path)
+	myrpl = ndjson_myrpl(fake_api)
+
+	results = myrpl.test([], use_cache=False)
+
+	emitted = events(myrpl.events.stream)
+	assert [event["event"] for event in emitted] == ["test", "test", "summary"]
+	assert {event["name"] for event in emitted[:2]} == {result.metadata.activity.name for result in results}
+	assert emitted[-1]["total"] == 2
+	assert capsys.readouterr().out == ""
@@ -0,0 +1,105 @@
+import io
+import importlib.util
+import tarfile
+import zipfile
+
+import pytest
+
+from myrpl_cli.errors import MyRPLError
+from myrpl_cli.export import guess_format, open_archive
+from myrpl_cli.myrpl import MyRPL
+from tests.fake_server import FakeMyRPLServer, FakeServerConfig, make_course
+
+
+class Pipe(io.BytesIO):
+	"""Like a pipe: no seeking"""
+
+	def seekable(self):
+		return False
+
+	def seek(self, *_):
+		raise io.UnsupportedOperation("seek")
+
+	def tell(self):
+		raise io.UnsupportedOperation("tell")
+
+
+@pytest.fixture(name="server")
+def fake_server():
+	with FakeMyRPLServer(FakeServerConfig(), [make_course(1, activities=4)]) as server:
+		yield server
+
+
+def read_tar(path) -> dict:
+	with tarfile.open(path) as tar:
+		return {member.name: tar.extractfile(member).read() for member in tar.getmembers() if member.isfile()}
+
+
+def test_export_tree(fake_api, server, tmp_path, monkeypatch):
+	"""The archive holds the fetched tree as is, and the one built from the API matches it"""
+
+	monkeypatch.chdir(tmp_path)
+	myrpl = MyRPL(fake_api, fake_api.credential_manager)
+	myrpl.fetch_course(1)
+	(tmp_path / "courses" / "Course 1" / "__pycache__").mkdir()
+	(tmp_path / "courses" / "Course 1" / "__pycache__" / "x.pyc").write_bytes(b"\0")
+
+	myrpl.export(1, "mirror.tar.gz")
+	myrpl.export(1, "api.tar.xz", from_api=True)
+	myrpl.export(1, "mirror.zip")
+
+	mirror = read_tar("mirror.tar.gz")
+	on_disk = {
+		path.relative_to(tmp_path).as_posix(): path.read_bytes()
+		for path in (tmp_path / "courses").rglob("*")
+		if path.is_file() and "__pycache__" not in path.parts
+	}
+	assert mirror == on_disk
+	assert read_tar("api.tar.xz") == mirror
+	with zipfile.ZipFile("mirror.zip") as archive:
+		assert {name: archive.read(name) for name in archive.namelist()} == mirror
+
+
+def test_export_missing_course(fake_api, server, tmp_path, monkeypatch):
+	monkeypatch.chdir(tmp_path)
+
+	with pytest.raises(ValueError):
+		MyRPL(fake_api, fake_api.credential_manager).export(1, "course.tar")
+	assert not (tmp_path / "course.tar").exists()
+
+
+@pytest.mark.parametrize("archive_format", ["tar", "tar.gz", "zip"])
+def test_archive_to_pipe(archive_format, tmp_path):
+	(tmp_path / "alumno.py").write_text("print(1)\n", encoding="utf8")
+	pipe = Pipe()
+
+	with open_archive(pipe, archive_format) as archive:
+		archive.add_file(str(tmp_path / "alumno.py"), "course/alumno.py")
+		archive.add_bytes("course/.myrpl", b"[course]\n")
+
+	pipe = io.BytesIO(pipe.getvalue())
+	if archive_format == "zip":
+		with zipfile.ZipFile(pipe) as archive:
+			assert archive.read("course/alumno.py") == b"print(1)\n"
+	else:
+		with tarfile.open(fileobj=pipe) as archive:
+			assert archive.extractfile("course/.myrpl").read() == b"[course]\n"
+
+
+def test_guess_format():
+	assert guess_format("course.tgz") == "tar.gz"
+	assert guess_format("course.tar.zst") == "tar.zst"
+	assert guess_format("-") == "tar"
+	with pytest.raises(ValueError):
+		guess_format("course.rar")
+
+
+@pytest.mark.skipif(importlib.util.find_spec("zstandard") is not None, reason="zstandard is installed")
+def test_zstd_needs_zstandard(fake_api, server, tmp_path, monkeypatch):
+	monkeypatch.chdir(tmp_path)
+	myrpl = MyRPL(fake_api, fake_api.credential_manager)
+	myrpl.fetch_course(1)
+
+	with pytest.raises(MyRPLError, match=r"myrpl-cli\[zstd\]"):
+		myrpl.export(1, "course.tar.zst")
+	assert not (tmp_path / "course.tar.zst").exists()
@@ -0,0 +1,499 @@
+"""
+Local stand-in for myrpl.ar, serving every route myrpl_cli.api uses.
+
+Supports per route latency, error and 429 injection, expiring tokens and
+synthetic courses of any size, so fetch/submit/renewal paths can be
+exercised and benchmarked offline:
+
+	with FakeMyRPLServer(FakeServerConfig(), [make_course(1, activities=100)]) as server:
+		api = API(credential_manager, base_url=server.url)
+
+Or standalone: python -m tests.fake_server --activities 1000 --port 8080
+"""
+
+import argparse
+import email.parser
+import email.policy
+import gzip
+import itertools
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+from pydantic import BaseModel
+
+USERNAME = "student@example.com"
+PASSWORD = "password"
+
+UNIT_TEST_TEMPLATE = """import unittest
+import timeout_decorator
+from alumno import resolver
+
+
+class Test(unittest.TestCase):
+	@timeout_decorator.timeout(2)
+	def test_resolver(self):
+		self.assertEqual(resolver(), {value})
+"""
+
+
+class FakeServerConfig(BaseModel):
+	"""Behavior of the fake server. Per route settings are keyed by route name (see ROUTES)"""
+
+	latency: Dict[str, float] = {}
+	default_latency: float = 0
+	error_rate: Dict[str, float] = {}
+	throttle_rate: Dict[str, float] = {}
+	retry_after: int = 1
+	token_ttl: Optional[float] = None
+	seed: int = 0
+	# Actually run submitted solutions against the activity's unit tests (capturing stdout)
+	run_submissions: bool = False
+	# gzip responses for clients that accept it (bytes_sent counts the compressed size)
+	compression: bool = True
+
+
+class FakeCourse(BaseModel):
+	"""A synthetic course with its activities, files and submissions"""
+
+	course: dict
+	activities: List[dict]
+	details: Dict[int, dict]
+	files: Dict[int, Dict[str, str]]
+	submissions: Dict[int, List[dict]] = {}
+	# Modules the unit tests import that are only available on the server
+	hidden_files: Dict[str, str] = {}
+
+
+def make_course(
+	course_id: int,
+	activities: int = 10,
+	categories: int = 3,
+	enrolled: bool = True,
+	file_size: int = 200,
+	first_activity_id: Optional[int] = None,
+	hidden_files: Optional[Dict[str, str]] = None,
+) -> FakeCourse:
+	"""
+	Builds a synthetic course shaped like the real API's responses.
+	The unit tests of every activity import the modules in hidden_files
+	"""
+
+	first_activity_id = first_activity_id if first_activity_id is not None else course_id * 100_000
+	course = {
+		"id": course_id,
+		"name": f"Course {course_id}",
+		"university": "FIUBA",
+		"university_course_id": str(course_id),
+		"description": f"Synthetic course {course_id}",
+		"active": True,
+		"semester": "2C-2024",
+		"semester_start_date": "2024-08-01T00:00:00Z",
+		"semester_end_date": "2024-12-15T00:00:00Z",
+		"img_uri": "http://example.com/image.png",
+		"date_created": "2024-08-01T00:00:00Z",
+		"last_updated": "2024-08-01T00:00:00Z",
+		"enrolled": enrolled,
+		"accepted": enrolled,
+	}
+
+	hidden_files = hidden_files or {}
+	hidden_modules = sorted({filename.split(".")[0] for filename in hidden_files})
+	activity_list, details, files = [], {}, {}
+	for index in range(activities):
+		activity_id = first_activity_id + index
+		category_id = course_id * 1000 + index % max(categories, 1)
+		file_id = activity_id
+		padding = "#" * max(file_size - 40, 0)
+
+		activity = {
+			"id": activity_id,
+			"course_id": course_id,
+			"category_id": category_id,
+			"category_name": f"{category_id % 1000} - Category {category_id % 1000}",
+			"category_description": f"Category {category_id}",
+			"name": f"{index:04d} - Activity {activity_id}",
+			"description": f"Return {index}",
+			"language": "PYTHON3",
+			"is_iotested": False,
+			"active": True,
+			"deleted": False,
+			"points": 1,
+			"file_id": file_id,
+			"submission_status": "",
+			"date_created": "2024-08-01T00:00:00Z",
+			"last_updated": "2024-08-01T00:00:00Z",
+		}
+		activity_list.append(activity)
+		details[activity_id] = {
+			**activity,
+			"activity_unit_tests": "".join(f"import {module}\n" for module in hidden_modules)
+			+ UNIT_TEST_TEMPLATE.format(value=index),
+			"activity_iotests": [],
+			"compilation_flags": "",
+		}
+		files[file_id] = {"alumno.py": f"def resolver():\n\t# {padding}\n\treturn None\n"}
+
+	return FakeCourse(course=course, activities=activity_list, details=details, files=files, hidden_files=hidden_files)
+
+
+def submission_files_payload(submission: dict) -> dict:
+	"""finalSubmission and /final answer with the submission's files info rather than the submission itself"""
+
+	payload = {
+		key: submission[key]
+		for key in (
+			"id",
+			"submission_file_name",
+			"submission_file_type",
+			"submission_file_id",
+			"activity_starting_files_name",
+			"activity_starting_files_type",
+			"activity_starting_files_id",
+			"activity_language",
+			"is_iotested",
+		)
+	}
+	return {
+		**payload,
+		"activity_unit_tests_content": submission["activity_unit_tests"],
+		"compilation_flags": "",
+		"activity_iotests": [],
+	}
+
+
+def run_submission(course: FakeCourse, activity: dict, files: Dict[str, str]) -> tuple:
+	"""Runs a solution against its unit tests, next to the course's hidden modules"""
+
+	with tempfile.TemporaryDirectory(prefix="fake-rpl-") as tmp_dir:
+		for filename, content in {**course.hidden_files, **files}.items():
+			with open(os.path.join(tmp_dir, filename), "w", encoding="utf8") as file:
+				file.write(content)
+		with open(os.path.join(tmp_dir, "unit_test.py"), "w", encoding="utf8") as file:
+			file.write(activity["activity_unit_tests"])
+
+		completed = subprocess.run(
+			[sys.executable, "-m", "unittest", "unit_test"],
+			cwd=tmp_dir,
+			capture_output=True,
+			text=True,
+			timeout=60,
+			check=False,
+		)
+
+	status = "SUCCESS" if completed.returncode == 0 else "FAILURE"
+	return status, completed.stdout, completed.stderr
+
+
+# Route name, method, path pattern
+ROUTES = [
+	("login", "POST", r"/api/auth/login"),
+	("courses", "GET", r"/api/courses"),
+	("activities", "GET", r"/api/courses/(?P<course_id>\d+)/activities"),
+	("activity", "GET", r"/api/courses/(?P<course_id>\d+)/activities/(?P<activity_id>\d+)"),
+	("files", "GET", r"/api/getFileForStudent/(?P<file_id>\d+)"),
+	("submissions", "GET", r"/api/courses/(?P<course_id>\d+)/activities/(?P<activity_id>\d+)/submissions"),
+	("submit", "POST", r"/api/courses/(?P<course_id>\d+)/activities/(?P<activity_id>\d+)/submissions"),
+	("final_submission", "GET", r"/api/courses/(?P<course_id>\d+)/activities/(?P<activity_id>\d+)/finalSubmission"),
+	("result", "GET", r"/api/submissions/(?P<submission_id>\d+)/result"),
+	(
+		"set_final",
+		"PUT",
+		r"/api/courses/(?P<course_id>\d+)/activities/(?P<activity_id>\d+)/submissions/(?P<submission_id>\d+)/final",
+	),
+]
+COMPILED_ROUTES = [(name, method, re.compile(f"^{pattern}$")) for name, method, pattern in ROUTES]
+
+
+class FakeMyRPLServer:
+	"""Threaded HTTP server answering like myrpl.ar"""
+
+	def __init__(self, config: Optional[FakeServerConfig] = None, courses: Optional[List[FakeCourse]] = None, port=0):
+		self.config = config or FakeServerConfig()
+		self.courses = {course.course["id"]: course for course in (courses or [make_course(1)])}
+		self.random = random.Random(self.config.seed)
+		self.lock = threading.Lock()
+		self.tokens: Dict[str, float] = {}
+		self.token_ids = itertools.count(1)
+		self.submission_ids = itertools.count(1)
+		self.file_ids = itertools.count(10**9)
+		self.requests: Counter = Counter()
+		self.bytes_sent = 0
+		self.bytes_decoded = 0
+		self.httpd = ThreadingHTTPServer(("127.0.0.1", port), self.handler_class())
+		self.httpd.daemon_threads = True
+		self.thread: Optional[threading.Thread] = None
+
+	@property
+	def url(self) -> str:
+		host, port = self.httpd.server_address[:2]
+		return f"http://{host}:{port}"
+
+	def start(self) -> "FakeMyRPLServer":
+		self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+		self.thread.start()
+		return self
+
+	def stop(self):
+		self.httpd.shutdown()
+		self.httpd.server_close()
+
+	def __enter__(self):
+		return self.start()
+
+	def __exit__(self, *_):
+		self.stop()
+
+	def reset_stats(self):
+		with self.lock:
+			self.requests.clear()
+			self.bytes_sent = 0
+			self.bytes_decoded = 0
+
+	def issue_token(self) -> str:
+		with self.lock:
+			token = f"token-{next(self.token_ids)}"
+			ttl = self.config.token_ttl
+			self.tokens[token] = time.monotonic() + ttl if ttl is not None else float("inf")
+		return token
+
+	def expire_tokens(self):
+		"""Makes every issued token invalid (forces a renewal)"""
+
+		with self.lock:
+			self.tokens.clear()
+
+	def is_authorized(self, header: Optional[str]) -> bool:
+		if not header or not header.startswith("Bearer "):
+			return False
+		with self.lock:
+			expires_at = self.tokens.get(header[len("Bearer ") :])
+		return expires_at is not None and time.monotonic() < expires_at
+
+	def roll(self, rates: Dict[str, float], route: str) -> bool:
+		rate = rates.get(route, 0)
+		with self.lock:
+			return rate > 0 and self.random.random() < rate
+
+	def find_activity(self, course_id: int, activity_id: int) -> Optional[dict]:
+		course = self.courses.get(course_id)
+		return course.details.get(activity_id) if course else None
+
+	def find_submission(self, submission_id: int):
+		for course in self.courses.values():
+			for activity_id, submissions in course.submissions.items():
+				for submission in submissions:
+					if submission["id"] == submission_id:
+						return course, activity_id, submission
+		return None
+
+	def handle(self, route: str, params: dict, body: bytes, headers) -> tuple:
+		"""Returns (status, payload) for an already authorized request"""
+
+		if route == "courses":
+			return 200, [course.course for course in self.courses.values()]
+
+		if route == "activities":
+			course = self.courses.get(int(params["course_id"]))
+			return (200, course.activities) if course else (404, {"message": "course not found"})
+
+		if route == "activity":
+			activity = self.find_activity(int(params["course_id"]), int(params["activity_id"]))
+			return (200, activity) if activity else (404, {"message": "activity not found"})
+
+		if route == "files":
+			file_id = int(params["file_id"])
+			for course in self.courses.values():
+				if file_id in course.files:
+					return 200, course.files[file_id]
+			return 404, {"message": "file not found"}
+
+		course = self.courses.get(int(params.get("course_id", 0)))
+		activity_id = int(params.get("activity_id", 0))
+
+		if route == "submissions":
+			if course is None:
+				return 404, {"message": "course not found"}
+			return 200, course.submissions.get(activity_id, [])
+
+		if route == "submit":
+			activity = self.find_activity(int(params["course_id"]), activity_id)
+			if activity is None:
+				return 404, {"message": "activity not found"}
+			return 201, self.create_submission(course, activity, body, headers.get("Content-Type", ""))
+
+		if route == "final_submission":
+			if course is None:
+				return 404, {"message": "course not found"}
+			finals = [s for s in course.submissions.get(activity_id, []) if s.get("is_final_solution")]
+			return (200, submission_files_payload(finals[-1])) if finals else (404, {"message": "no final submission"})
+
+		if route == "result":
+			found = self.find_submission(int(params["submission_id"]))
+			if found is None:
+				return 404, {"message": "submission not found"}
+			return 200, found[2]
+
+		if route == "set_final":
+			found = self.find_submission(int(params["submission_id"]))
+			if found is None:
+				return 404, {"message": "submission not found"}
+			for submission in found[0].submissions[found[1]]:
+				submission["is_final_solution"] = submission["id"] == int(params["submission_id"])
+			return 200, submission_files_payload(found[2])
+
+		return 404, {"message": "not found"}
+
+	def create_submission(self, course: FakeCourse, activity: dict, body: bytes, content_type: str) -> dict:
+		"""Stores an uploaded solution and 'grades' it instantly"""
+
+		message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+			f"Content-Type: {content_type}\r\n\r\n".encode() + body
+		)
+		files = {}
+		for part in message.iter_parts():
+			filename = part.get_filename()
+			if filename:
+				files[filename] = part.get_payload(decode=True).decode("utf8", errors="replace")
+
+		with self.lock:
+			submission_id = next(self.submission_ids)
+			file_id = next(self.file_ids)
+		course.files[file_id] = files
+
+		status, stdout, stderr = "SUCCESS", "", ""
+		if self.config.run_submissions:
+			status, stdout, stderr = run_submission(course, activity, files)
+
+		submission = {
+			"id": submission_id,
+			"submission_file_name": f"{course.course['id']}_{activity['id']}_{submission_id}",
+			"submission_file_type": "application/gzip",
+			"submission_file_id": file_id,
+			"is_iotested": activity["is_iotested"],
+			"activity_starting_files_name": "starting_files.tar.gz",
+			"activity_starting_files_type": "application/gzip",
+			"activity_starting_files_id": activity["file_id"],
+			"activity_language": "python_3.10",
+			"activity_unit_tests": activity["activity_unit_tests"],
+			"submission_status": status,
+			"is_final_solution": False,
+			"exit_message": "",
+			"stderr": stderr,
+			"stdout": stdout,
+			"io_test_run_results": [],
+			"unit_test_run_results": [],
+			"submission_date": "2024-09-01T00:00:00Z",
+		}
+		course.submissions.setdefault(activity["id"], []).append(submission)
+		activity["submission_status"] = status
+		return submission
+
+	def handler_class(self):
+		server = self
+
+		class Handler(BaseHTTPRequestHandler):
+			protocol_version = "HTTP/1.1"
+
+			def log_message(self, *_):
+				pass
+
+			def dispatch(self):
+				path = self.path.split("?", 1)[0]
+				length = int(self.headers.get("Content-Length") or 0)
+				body = self.rfile.read(length) if length else b""
+
+				for route, method, pattern in COMPILED_ROUTES:
+					match = pattern.match(path)
+					if match and method == self.command:
+						break
+				else:
+					return self.reply(404, {"message": f"no route for {self.command} {path}"}, "unknown")
+
+				with server.lock:
+					server.requests[route] += 1
+
+				latency = server.config.latency.get(route, server.config.default_latency)
+				if latency:
+					time.sleep(latency)
+
+				if server.roll(server.config.throttle_rate, route):
+					return self.reply(
+						429, {"message": "Too Many Requests"}, route, {"Retry-After": str(server.config.retry_after)}
+					)
+				if server.roll(server.config.error_rate, route):
+					return self.reply(500, {"message": "Injected error"}, route)
+
+				if route == "login":
+					credentials = json.loads(body or b"{}")
+					if credentials.get("username_or_email") != USERNAME or credentials.get("password") != PASSWORD:
+						return self.reply(401, {"message": "Bad credentials"}, route)
+					return self.reply(200, {"token_type": "Bearer", "access_token": server.issue_token()}, route)
+
+				if not server.is_authorized(self.headers.get("Authorization")):
+					return self.reply(401, {"message": "Unauthorized"}, route)
+
+				status, payload = server.handle(route, match.groupdict(), body, self.headers)
+				return self.reply(status, payload, route)
+
+			def reply(self, status: int, payload, route: str, headers: Optional[dict] = None):
+				data = json.dumps(payload).encode("utf8")
+				with server.lock:
+					server.bytes_decoded += len(data)
+				if server.config.compression and "gzip" in self.headers.get("Accept-Encoding", ""):
+					data = gzip.compress(data)
+					headers = {**(headers or {}), "Content-Encoding": "gzip"}
+
+				self.send_response(status)
+				self.send_header("Content-Type", "application/json")
+				self.send_header("Content-Length", str(len(data)))
+				for name, value in (headers or {}).items():
+					self.send_header(name, value)
+				self.end_headers()
+				self.wfile.write(data)
+				with server.lock:
+					server.bytes_sent += len(data)
+
+			do_GET = do_POST = do_PUT = dispatch
+
+		return Handler
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Fake myrpl.ar server")
+	parser.add_argument("--port", type=int, default=8080)
+	parser.add_argument("--courses", type=int, default=1, help="Number of synthetic courses")
+	parser.add_argument("--activities", type=int, default=10, help="Activities per course")
+	parser.add_argument("--latency", type=float, default=0, help="Seconds added to every response")
+	parser.add_argument("--error-rate", type=float, default=0, help="Share of 500 responses on every route")
+	parser.add_argument("--throttle-rate", type=float, default=0, help="Share of 429 responses on every route")
+	parser.add_argument("--token-ttl", type=float, default=None, help="Seconds before issued tokens expire")
+	args = parser.parse_args()
+
+	route_names = [name for name, _, _ in ROUTES if name != "login"]
+	config = FakeServerConfig(
+		default_latency=args.latency,
+		error_rate={name: args.error_rate for name in route_names},
+		throttle_rate={name: args.throttle_rate for name in route_names},
+		token_ttl=args.token_ttl,
+	)
+	courses = [make_course(course_id, activities=args.activities) for course_id in range(1, args.courses + 1)]
+	server = FakeMyRPLServer(config, courses, port=args.port)
+	print(f"Serving fake myrpl.ar on {server.url} (login: {USERNAME} / {PASSWORD})")
+	try:
+		server.httpd.serve_forever()
+	except KeyboardInterrupt:
+		server.stop()
+
+
+if __name__ == "__main__":
+	main()
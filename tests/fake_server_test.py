@@ -0,0 +1,68 @@
+import os
+
+import pytest
+import requests
+
+from myrpl_cli.myrpl import MyRPL
+from tests.fake_server import FakeMyRPLServer, FakeServerConfig, make_course
+
+
+@pytest.fixture(name="server")
+def fake_server():
+	with FakeMyRPLServer(FakeServerConfig(), [make_course(1, activities=6), make_course(2, enrolled=False)]) as server:
+		yield server
+
+
+def test_renews_token(fake_api, server):
+	"""A stale stored token should be renewed once and the call retried"""
+
+	courses = fake_api.fetch_courses()
+
+	assert [course.id for course in courses] == [1, 2]
+	assert server.requests["login"] == 1
+	assert server.requests["courses"] == 2
+	fake_api.credential_manager.store_token.assert_called_once()
+
+
+def test_fetch_and_submit(fake_api, tmp_path):
+	"""Every route api.py uses should be served"""
+
+	course = fake_api.fetch_courses()[0]
+	activity = fake_api.fetch_activity_info(fake_api.fetch_activities(course)[0])
+	assert "def resolver" in fake_api.fetch_files(activity.file_id)["alumno.py"]
+
+	solution = tmp_path / "alumno.py"
+	solution.write_text("def resolver():\n\treturn 0\n", encoding="utf8")
+	submission_response = fake_api.submit(activity, str(solution), "first try")
+
+	submissions = fake_api.fetch_submissions(activity)
+	assert [s.id for s in submissions] == [submission_response["id"]]
+	assert fake_api.fetch_files(submissions[0].submission_file_id) == {"alumno.py": "def resolver():\n\treturn 0\n"}
+	assert fake_api.fetch_submission_result(submissions[0]).submission_status == "SUCCESS"
+
+	fake_api.set_final_submission(submissions[0])
+	assert fake_api.fetch_final_submission(activity).id == submissions[0].id
+
+
+def test_injected_throttling(fake_api, server):
+	server.config.throttle_rate = {"courses": 1.0}
+
+	with pytest.raises(requests.HTTPError) as error:
+		fake_api.fetch_courses()
+
+	assert error.value.response.status_code == 429
+	assert error.value.response.headers["Retry-After"] == "1"
+
+
+def test_fetch_course(fake_api, tmp_path, monkeypatch):
+	"""fetch should mirror a whole course from the fake server"""
+
+	monkeypatch.chdir(tmp_path)
+	myrpl = MyRPL(fake_api, fake_api.credential_manager)
+
+	myrpl.fetch_course(1)
+
+	category_path = tmp_path / "courses" / "Course 1" / "0 - Category 0"
+	activities = sorted(os.listdir(category_path))
+	assert activities == [".myrpl", "0000 - Activity 100000", "0003 - Activity 100003", "description.txt"]
+	assert (category_path / "0000 - Activity 100000" / "unit_test.py").exists()
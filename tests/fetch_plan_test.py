@@ -0,0 +1,71 @@
+import os
+import shutil
+
+import pytest
+
+from myrpl_cli.fetch_plan import LIST_REQUESTS, plan_fetch
+from myrpl_cli.myrpl import MyRPL
+from tests.fake_server import FakeMyRPLServer, FakeServerConfig, make_course
+
+LIST_ROUTES = {"courses", "activities", "login"}
+
+
+@pytest.fixture(name="server")
+def fake_server():
+	course = make_course(1, activities=4)
+	first = course.activities[0]
+	first["submission_status"] = course.details[first["id"]]["submission_status"] = "FAILURE"
+	with FakeMyRPLServer(FakeServerConfig(), [course]) as server:
+		yield server
+
+
+def activity_requests(server) -> int:
+	return sum(count for route, count in server.requests.items() if route not in LIST_ROUTES)
+
+
+def test_plan_matches_fetch(fake_api, server, tmp_path, monkeypatch):
+	"""The plan should predict the requests fetch makes, while only requesting the course and activity lists"""
+
+	monkeypatch.chdir(tmp_path)
+	myrpl = MyRPL(fake_api, fake_api.credential_manager)
+	course = myrpl.find_course(1)
+	activities = fake_api.fetch_activities(course)
+
+	plan = plan_fetch(course, activities, blobs=fake_api.blobs)
+	assert [activity.action for activity in plan.activities] == ["create"] * 4
+	assert plan.unknown_sizes() == 4
+	assert activity_requests(server) == 0
+
+	myrpl.fetch_course(1)
+	assert activity_requests(server) == plan.requests - LIST_REQUESTS
+
+	plan = plan_fetch(course, activities, blobs=fake_api.blobs)
+	assert [activity.action for activity in plan.activities] == ["skip"] * 4
+	assert plan.requests == LIST_REQUESTS
+
+	server.reset_stats()
+	plan = plan_fetch(course, activities, force=True, blobs=fake_api.blobs)
+	myrpl.fetch_course(1, force=True)
+	assert [activity.action for activity in plan.activities] == ["update"] * 4
+	# Forced, even starting files already in the blob store are downloaded again
+	assert [activity.requests for activity in plan.activities] == [3, 2, 2, 2]
+	assert activity_requests(server) <= plan.requests - LIST_REQUESTS
+	assert plan.bytes > 0 and plan.unknown_sizes() == 0
+
+
+def test_plan_renamed_activity(fake_api, server, tmp_path, monkeypatch):
+	"""A local copy saved under an old name is found through its .myrpl, and used to estimate the size"""
+
+	monkeypatch.chdir(tmp_path)
+	myrpl = MyRPL(fake_api, fake_api.credential_manager)
+	myrpl.fetch_course(1)
+	course = myrpl.find_course(1)
+	activities = fake_api.fetch_activities(course)
+	old_path = myrpl.activity_path(activities[1])
+	shutil.move(old_path, os.path.join(os.path.dirname(old_path), "Old name"))
+
+	planned = plan_fetch(course, activities).activities[1]
+
+	assert planned.action == "create"
+	assert planned.renamed_from == os.path.join(activities[1].category_name, "Old name")
+	assert planned.bytes > 0
@@ -0,0 +1,137 @@
+import io
+import os
+import threading
+import zipfile
+from types import SimpleNamespace
+
+import pytest
+
+from myrpl_cli.cache import CACHE_DIR_ENV_VAR
+from myrpl_cli.hidden_modules import (
+	START_MARKER,
+	HiddenModuleExtractor,
+	HiddenModuleStore,
+	find_hidden_imports,
+	parse_probe_output,
+)
+from myrpl_cli.myrpl import MyRPL
+from tests.fake_server import FakeMyRPLServer, FakeServerConfig, make_course
+
+GRAFO = "class Grafo:\n\tdef __init__(self, es_dirigido=False):\n\t\tself.es_dirigido = es_dirigido\n"
+
+
+@pytest.fixture(name="server")
+def fake_server():
+	courses = [make_course(1, activities=3, hidden_files={"grafo.py": GRAFO})]
+	with FakeMyRPLServer(FakeServerConfig(run_submissions=True), courses) as server:
+		yield server
+
+
+def test_find_hidden_imports():
+	unit_tests = (
+		"import unittest\nimport timeout_decorator\nfrom collections import deque\n"
+		"import grafo\nfrom grafo.algoritmos import bfs\nfrom alumno import resolver\nfrom . import helpers\n"
+	)
+
+	assert find_hidden_imports(unit_tests, {"alumno"}) == ["grafo"]
+	assert find_hidden_imports("this isn't python", set()) == []
+
+
+def test_installed_packages_arent_hidden(tmp_path, monkeypatch):
+	"""Packages installed here are never probed for, but modules only the activity has are"""
+
+	unit_tests = "import toml\nfrom pydantic import BaseModel\nimport grafo\n"
+	(tmp_path / "grafo.py").write_text(GRAFO, encoding="utf8")
+	monkeypatch.syspath_prepend(str(tmp_path))
+
+	assert find_hidden_imports(unit_tests, set(), str(tmp_path)) == ["grafo"]
+	assert find_hidden_imports(unit_tests, set()) == []
+
+
+def test_parse_probe_output():
+	"""Truncated or foreign output shouldn't be mistaken for a module"""
+
+	stdout = (
+		f"noise\n{START_MARKER} grafo cpython-310\naGk=\n#endmyrplmodule grafo\n{START_MARKER} cut cpython-310\naGk=\n"
+	)
+
+	assert parse_probe_output(stdout) == {"grafo": ("cpython-310", b"hi")}
+
+
+def test_fetch_recovers_hidden_modules(fake_api, server, tmp_path, monkeypatch):
+	"""A single probe should recover grafo for every activity, and never be saved as the student's code"""
+
+	monkeypatch.setenv(CACHE_DIR_ENV_VAR, str(tmp_path / "cache"))
+	monkeypatch.chdir(tmp_path)
+	myrpl = MyRPL(fake_api, fake_api.credential_manager)
+
+	myrpl.fetch_course(1, hidden_modules=True)
+	myrpl.fetch_course(1, force=True, hidden_modules=True)
+
+	assert server.requests["submit"] == 1
+	activity_paths = [path for path in (tmp_path / "courses").glob("*/*/*") if path.is_dir()]
+	assert len(activity_paths) == 3
+	for activity_path in activity_paths:
+		assert (activity_path / "grafo.py").read_text(encoding="utf8") == GRAFO
+		assert START_MARKER not in (activity_path / "alumno.py").read_text(encoding="utf8")
+	assert os.listdir(tmp_path / "cache" / "hidden-modules" / "1")
+
+
+def test_unrecoverable_modules_are_not_probed_again(fake_api, server, tmp_path, monkeypatch):
+	"""A module the server doesn't have costs a single probe, until forced"""
+
+	monkeypatch.chdir(tmp_path)
+	server.courses[1].hidden_files = {}
+	myrpl = MyRPL(fake_api, fake_api.credential_manager)
+
+	myrpl.fetch_course(1, hidden_modules=True)
+	myrpl.fetch_course(1, hidden_modules=True)
+
+	assert server.requests["submit"] == 1
+	assert not list((tmp_path / "courses").glob("*/*/*/grafo.py"))
+
+	myrpl.fetch_course(1, force=True, hidden_modules=True)
+
+	assert server.requests["submit"] == 2
+
+
+def test_probes_dont_block_other_activities(tmp_path):
+	"""An activity needing another module proceeds while a probe polls; one needing the same module waits for it"""
+
+	probing, finish = threading.Event(), threading.Event()
+	probes = []
+
+	def probe(activity, modules, filename):
+		probes.append(modules)
+		if modules == ["grafo"]:
+			probing.set()
+			assert finish.wait(10)
+		archive = io.BytesIO()
+		with zipfile.ZipFile(archive, "w") as zip_file:
+			zip_file.writestr(f"{modules[0]}.py", "")
+		return {modules[0]: ("cpython-310", archive.getvalue())}
+
+	extractor = HiddenModuleExtractor(None, 1, HiddenModuleStore(1, str(tmp_path / "cache")))
+	extractor.probe = probe
+	installed = {}
+
+	def install(name, module):
+		activity_path = tmp_path / name
+		activity_path.mkdir()
+		(activity_path / "unit_test.py").write_text(f"import {module}\n", encoding="utf8")
+		installed[name] = extractor.install(SimpleNamespace(name=name), str(activity_path))
+
+	first = threading.Thread(target=install, args=("first", "grafo"))
+	first.start()
+	assert probing.wait(10)
+	same = threading.Thread(target=install, args=("same", "grafo"))
+	same.start()
+
+	install("other", "pila")
+	assert installed == {"other": ["pila"]}
+
+	finish.set()
+	first.join(10)
+	same.join(10)
+	assert installed == {"other": ["pila"], "first": ["grafo"], "same": ["grafo"]}
+	assert probes == [["grafo"], ["pila"]]
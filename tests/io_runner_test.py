@@ -0,0 +1,112 @@
+import sys
+import time
+
+import pytest
+
+from myrpl_cli.io_runner import discover_cases, io_test_files, is_io_activity, run_io_activity
+from myrpl_cli.models import IOTest
+from myrpl_cli.runner import read_metadata
+from myrpl_cli.sandbox import Limits
+
+ECHO_DOUBLE = "for line in open(0):\n\tprint(int(line) * 2)\n"
+
+
+@pytest.fixture(name="activity_path")
+def mock_io_activity(course_path):
+	"""Turns Activity 3 into an IO tested activity with three cases"""
+
+	activity_path = course_path / "Test Category" / "Activity 3"
+	(activity_path / "unit_test.py").unlink()
+	(activity_path / "main.py").write_text(ECHO_DOUBLE, encoding="utf8")
+
+	io_tests = [
+		IOTest(id=i, name=f"case {i}", test_in=f"{i}\n{i + 1}\n", test_out=f"{2 * i}\n{2 * i + 2}\n") for i in range(3)
+	]
+	for filename, content in io_test_files(io_tests).items():
+		(activity_path / filename).parent.mkdir(exist_ok=True)
+		(activity_path / filename).write_text(content, encoding="utf8")
+
+	return activity_path
+
+
+def run(activity_path, **kwargs):
+	return run_io_activity(str(activity_path), read_metadata(str(activity_path)), **kwargs)
+
+
+def test_io_test_files():
+	"""IO tests should be saved as numbered .in/.out pairs with filesystem safe names"""
+
+	files = io_test_files([IOTest(id=7, name="a/b", test_in="1", test_out="2")])
+
+	assert files == {"io_tests/01 - a_b.in": "1", "io_tests/01 - a_b.out": "2"}
+
+
+def test_discover_cases(activity_path):
+	assert is_io_activity(str(activity_path))
+	assert [case.name for case in discover_cases(str(activity_path))] == ["01 - case 0", "02 - case 1", "03 - case 2"]
+
+
+def test_run_io_activity(activity_path):
+	"""A correct solution should pass every case, each with its own timing"""
+
+	result = run(activity_path)
+
+	assert result.status == "SUCCESS", result.output
+	assert len(result.cases) == 3
+	assert all(case.passed and case.duration > 0 for case in result.cases)
+
+
+def test_run_io_activity_mismatch(activity_path):
+	"""The first differing line should be reported"""
+
+	(activity_path / "main.py").write_text("print(0)\n", encoding="utf8")
+
+	result = run(activity_path)
+
+	assert result.status == "FAILURE"
+	assert "02 - case 1: FAILURE: line 1: expected '2', got '0'" in result.output
+
+
+def test_run_io_activity_fail_fast(activity_path):
+	"""With fail_fast, a failing case should stop the remaining ones"""
+
+	(activity_path / "main.py").write_text("print('wrong')\n", encoding="utf8")
+
+	result = run(activity_path, fail_fast=True, jobs=1)
+
+	assert result.status == "FAILURE"
+	assert len(result.cases) == 1
+
+
+def test_run_io_activity_time_out(activity_path):
+	"""A hanging solution should be killed and reported as TIME_OUT"""
+
+	(activity_path / "main.py").write_text("while True:\n\tpass\n", encoding="utf8")
+
+	result = run(activity_path, limits=Limits(wall_time=1))
+
+	assert result.status == "TIME_OUT"
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="process groups are POSIX only")
+def test_run_io_activity_time_out_kills_children(activity_path):
+	"""A child holding the output pipe shouldn't keep a timed out case waiting"""
+
+	(activity_path / "main.py").write_text(
+		"import subprocess, sys, time\n\n"
+		"subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(60)'])\n"
+		"time.sleep(60)\n",
+		encoding="utf8",
+	)
+
+	start = time.perf_counter()
+	result = run(activity_path, limits=Limits(wall_time=1))
+
+	assert result.status == "TIME_OUT"
+	assert time.perf_counter() - start < 30
+
+
+def test_run_io_activity_build_error(activity_path):
+	(activity_path / "main.py").write_text("print(\n", encoding="utf8")
+
+	assert run(activity_path).status == "BUILD_ERROR"
@@ -0,0 +1,52 @@
+import os
+
+import pytest
+
+from myrpl_cli import myrpl as myrpl_module
+from myrpl_cli.local_tree import CourseIndex
+from myrpl_cli.myrpl import MyRPL
+from tests.fake_server import FakeMyRPLServer, FakeServerConfig, make_course
+
+
+@pytest.fixture(name="server")
+def fake_server():
+	with FakeMyRPLServer(FakeServerConfig(), [make_course(1, activities=6, categories=2)]) as server:
+		yield server
+
+
+def test_scan(course_path):
+	index = CourseIndex.scan(str(course_path))
+
+	assert index.has_activity("Test Category", "Activity 3")
+	assert not index.has_activity("Test Category", "Activity 5")
+	assert not index.has_activity("Other Category", "Activity 3")
+	assert index.has_metadata() and index.has_metadata("Test Category")
+	assert index.activity_ids() == {
+		3: os.path.join("Test Category", "Activity 3"),
+		4: os.path.join("Test Category", "Activity 4"),
+	}
+
+
+def test_scan_missing_course(tmp_path):
+	index = CourseIndex.scan(str(tmp_path / "nothing here"))
+
+	assert not index.categories and not index.has_metadata()
+
+
+def test_fetch_writes_metadata_once(fake_api, server, tmp_path, monkeypatch):
+	"""The course and category .myrpl are written once, not once per activity"""
+
+	monkeypatch.chdir(tmp_path)
+	written = []
+	traced_write = myrpl_module.traced_write
+	monkeypatch.setattr(
+		myrpl_module, "traced_write", lambda path, content: (written.append(path), traced_write(path, content))
+	)
+	myrpl = MyRPL(fake_api, fake_api.credential_manager)
+
+	myrpl.fetch_course(1)
+	myrpl.fetch_course(1, force=True)
+
+	metadata = [path for path in written if path.endswith(".myrpl")]
+	assert len(metadata) == 1 + 2 + 6 * 2
+	assert (tmp_path / "courses" / "Course 1" / ".myrpl").is_file()
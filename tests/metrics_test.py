@@ -0,0 +1,104 @@
+import pytest
+import requests
+
+from myrpl_cli.metrics import Metrics
+from myrpl_cli.myrpl import MyRPL
+from myrpl_cli.tracing import tracer
+from tests.fake_server import FakeMyRPLServer, FakeServerConfig, make_course
+
+
+@pytest.fixture(name="server")
+def fake_server():
+	with FakeMyRPLServer(FakeServerConfig(), [make_course(1, activities=3)]) as server:
+		yield server
+
+
+@pytest.fixture(name="metrics")
+def listening_metrics():
+	metrics = Metrics("fetch")
+	tracer.add_listener(metrics.on_span)
+	yield metrics
+	tracer.remove_listener(metrics.on_span)
+
+
+def test_fetch_metrics(fake_api, server, metrics, tmp_path, monkeypatch):
+	"""A sync should be counted by route, retry, throttle and activity outcome"""
+
+	monkeypatch.chdir(tmp_path)
+	myrpl = MyRPL(fake_api, fake_api.credential_manager)
+	myrpl.fetch_course(1)
+	myrpl.fetch_course(1)
+	server.config.throttle_rate = {"courses": 1.0}
+	with pytest.raises(requests.HTTPError):
+		myrpl.fetch_course(1)
+	metrics.finish(success=False)
+
+	lines = metrics.render().splitlines()
+
+	assert 'myrpl_requests_total{command="fetch",method="GET",route="/api/courses",status="200"} 2' in lines
+	assert 'myrpl_requests_total{command="fetch",method="GET",route="/api/courses",status="429"} 1' in lines
+	assert 'myrpl_request_retries_total{command="fetch",method="GET",route="/api/courses"} 1' in lines
+	assert 'myrpl_request_throttled_total{command="fetch",method="GET",route="/api/courses"} 1' in lines
+	assert 'myrpl_activities_total{command="fetch",outcome="fetched"} 3' in lines
+	assert 'myrpl_activities_total{command="fetch",outcome="skipped"} 3' in lines
+	assert (
+		'myrpl_request_duration_seconds_count{command="fetch",method="GET",route="/api/courses/{id}/activities/{id}"} 3'
+		in lines
+	)
+	assert 'myrpl_run_success{command="fetch"} 0' in lines
+	assert "# TYPE myrpl_request_duration_seconds histogram" in lines
+
+	# At least every saved file, but unit tests: they're hardlinked from the blob store, not written
+	on_disk = sum(path.stat().st_size for path in tmp_path.rglob("*") if path.is_file() and path.stat().st_nlink == 1)
+	written = next(line for line in lines if line.startswith("myrpl_written_bytes_total"))
+	assert int(written.split()[-1]) >= on_disk
+
+
+def test_write(tmp_path):
+	"""The textfile should be replaced whole, with no temporary files left behind"""
+
+	metrics = Metrics('quoted "command"')
+	metrics.observe(0.2, route="/api/courses")
+	metrics.finish(success=True)
+
+	path = tmp_path / "textfile" / "myrpl.prom"
+	metrics.write(str(path))
+	metrics.write(str(path))
+
+	content = path.read_text()
+	assert 'myrpl_run_success{command="quoted \\"command\\""} 1' in content
+	assert (
+		'myrpl_request_duration_seconds_bucket{command="quoted \\"command\\"",route="/api/courses",le="0.1"} 0'
+		in content
+	)
+	assert 'le="0.25"} 1' in content
+	assert [p.name for p in path.parent.iterdir()] == ["myrpl.prom"]
+
+
+@pytest.mark.parametrize("compression", [True, False])
+def test_response_bytes(fake_api, server, metrics, compression):
+	"""Responses should be counted both as transferred and once decompressed"""
+
+	server.config.compression = compression
+	fake_api.fetch_activities(fake_api.fetch_courses()[0])
+
+	def total(name):
+		return sum(int(line.split()[-1]) for line in metrics.render().splitlines() if line.startswith(name + "{"))
+
+	assert total("myrpl_response_bytes_total") == server.bytes_decoded
+	assert total("myrpl_response_wire_bytes_total") == server.bytes_sent
+	if compression:
+		assert server.bytes_sent < server.bytes_decoded
+	else:
+		assert server.bytes_sent == server.bytes_decoded
+
+
+def test_response_bytes_untraced(fake_api, server):
+	"""Transferred bytes are counted even when nothing traces the requests"""
+
+	server.config.compression = True
+	fake_api.fetch_activities(fake_api.fetch_courses()[0])
+
+	assert not tracer.enabled
+	assert sum(wire_size for _, wire_size in fake_api.transferred.values()) == server.bytes_sent
+	assert fake_api.bytes_saved() == server.bytes_decoded - server.bytes_sent > 0
@@ -0,0 +1,58 @@
+import time
+from unittest.mock import Mock
+
+import pytest
+
+from myrpl_cli.api import API
+from myrpl_cli.credential_manager import CredentialManager
+from myrpl_cli.errors import OfflineError
+from myrpl_cli.myrpl import MyRPL
+from tests.fake_server import FakeMyRPLServer, FakeServerConfig, make_course
+
+
+@pytest.fixture(name="server")
+def fake_server():
+	with FakeMyRPLServer(FakeServerConfig(), [make_course(1, activities=4)]) as server:
+		yield server
+
+
+@pytest.fixture(name="stopped_server_url")
+def synced_then_stopped(fake_api, server, tmp_path, monkeypatch):
+	"""A course fetched while online, whose server then went away"""
+
+	monkeypatch.chdir(tmp_path)
+	MyRPL(fake_api, fake_api.credential_manager).fetch_course(1)
+	server.stop()
+	return server.url
+
+
+def test_offline(stopped_server_url, capsys):
+	"""--offline should answer from the persisted responses without touching the keyring"""
+
+	credential_manager = Mock(spec=CredentialManager)
+	api = API(credential_manager, base_url=stopped_server_url, offline=True)
+	myrpl = MyRPL(api, credential_manager)
+
+	myrpl.list()
+	myrpl.status(1)
+
+	output = capsys.readouterr().out
+	assert "Course 1: 1" in output
+	assert "0/4 activities solved" in output
+	assert not credential_manager.method_calls
+
+	with pytest.raises(OfflineError):
+		api.fetch_files(999999)
+
+
+def test_falls_back_offline(stopped_server_url, fake_api):
+	"""Once the server can't be reached every call should be answered offline, right away"""
+
+	api = API(fake_api.credential_manager, base_url=stopped_server_url)
+
+	courses = api.fetch_courses()
+
+	assert api.offline
+	start = time.perf_counter()
+	assert len(api.fetch_activities(courses[0])) == 4
+	assert time.perf_counter() - start < 0.5
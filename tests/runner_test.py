@@ -0,0 +1,64 @@
+import os
+
+from myrpl_cli.sandbox import PROFILE_OPTION
+from myrpl_cli.runner import ActivityRunner, discover_activities, format_profile, format_summary
+
+
+def test_discover_activities(course_path):
+	"""It should find every activity directory, skipping courses and categories"""
+
+	paths = discover_activities(str(course_path))
+
+	assert [os.path.basename(p) for p in paths] == ["Activity 3", "Activity 4"]
+
+
+def test_run_isolates_activities(course_path):
+	"""Activities importing the same `alumno` module should not collide"""
+
+	results = ActivityRunner(jobs=2).run(discover_activities(str(course_path)))
+
+	assert len(results) == 2
+	assert all(result.passed for result in results), [result.output for result in results]
+	assert all(len(result.cases) == 1 for result in results)
+
+
+def test_run_reports_failures(course_path):
+	"""A failing activity should be reported with its failing cases"""
+
+	activity_path = course_path / "Test Category" / "Activity 4"
+	(activity_path / "alumno.py").write_text("def resolver():\n\treturn 0\n", encoding="utf8")
+
+	results = ActivityRunner().run(discover_activities(str(course_path)))
+
+	assert results[0].passed
+	assert not results[1].passed
+	assert not results[1].cases[0].passed
+	assert "assert 0 == 2" in results[1].cases[0].error_message
+
+	summary = format_summary(results)
+	assert "Test Course" in summary
+	assert "✘ Activity 4" in summary
+	assert "1 passed, 1 failed" in summary
+
+
+def test_run_with_profile(course_path):
+	"""Profiled runs should report declared timeouts, the solution's hot spots and peak memory"""
+
+	activity_path = course_path / "Test Category" / "Activity 3"
+	(activity_path / "unit_test.py").write_text(
+		"import timeout_decorator\n"
+		"from alumno import resolver\n\n\n"
+		"@timeout_decorator.timeout(5)\n"
+		"def test_resolver():\n"
+		"\tassert resolver() == 1\n",
+		encoding="utf8",
+	)
+
+	result = ActivityRunner(pytest_args=[PROFILE_OPTION]).run([str(activity_path)])[0]
+
+	assert result.passed, result.output
+	profile = result.cases[0].profile
+	assert profile.timeout == 5
+	assert profile.peak_memory >= 0
+	assert profile.hotspots[0].function.startswith("alumno.py:1(resolver)")
+	assert "test_resolver" in format_profile([result])
@@ -0,0 +1,103 @@
+import signal
+import sys
+
+import pytest
+
+from myrpl_cli import sandbox
+from myrpl_cli.models import CaseResult
+from myrpl_cli.runner import run_activity
+from myrpl_cli.sandbox import Limits, resolve_status
+
+posix_only = pytest.mark.skipif(sys.platform == "win32", reason="resource limits are POSIX only")
+
+
+@pytest.fixture(name="activity_path")
+def mock_activity_path(course_path):
+	return course_path / "Test Category" / "Activity 3"
+
+
+def write_solution(activity_path, source):
+	(activity_path / "alumno.py").write_text(source, encoding="utf8")
+
+
+@pytest.mark.parametrize(
+	"exit_code, error_message, timed_out, expected",
+	[
+		(0, None, False, "SUCCESS"),
+		(1, "assert 0 == 1", False, "FAILURE"),
+		(1, "timeout_decorator.timeout_decorator.TimeoutError: 'Timed Out'", False, "TIME_OUT"),
+		(1, "E   MemoryError", False, "RUNTIME_ERROR"),
+		(2, None, False, "BUILD_ERROR"),
+		(4, None, False, "USAGE_ERROR"),
+		(5, None, False, "NO_TESTS"),
+		(3, None, False, "RUNTIME_ERROR"),
+		(-9, None, False, "RUNTIME_ERROR"),
+		(-9, None, True, "TIME_OUT"),
+	],
+)
+def test_resolve_status(exit_code, error_message, timed_out, expected):
+	"""It should map test outcomes onto RPL's submission statuses"""
+
+	cases = [CaseResult(name="test", passed=error_message is None, duration=0, error_message=error_message)]
+
+	assert resolve_status(exit_code, cases, timed_out) == expected
+
+
+def test_resolve_status_without_sigxcpu(monkeypatch):
+	"""Platforms without SIGXCPU (Windows) shouldn't mistake a clean exit for a CPU time out"""
+
+	monkeypatch.delattr(signal, "SIGXCPU", raising=False)
+	cases = [CaseResult(name="test", passed=True, duration=0)]
+
+	assert sandbox.resolve_status(0, cases) == "SUCCESS"
+
+
+def test_syntax_error_is_build_error(activity_path):
+	"""A solution that doesn't import should be a BUILD_ERROR"""
+
+	write_solution(activity_path, "def resolver(:\n")
+
+	assert run_activity(str(activity_path)).status == "BUILD_ERROR"
+
+
+def test_bad_arguments_are_usage_error(activity_path):
+	"""pytest rejecting its arguments isn't the solution's fault"""
+
+	assert run_activity(str(activity_path), ["-k", "test_ and ("]).status == "USAGE_ERROR"
+
+
+def test_deselecting_every_test_is_no_tests(activity_path):
+	assert run_activity(str(activity_path), ["-k", "no_test_matches_this"]).status == "NO_TESTS"
+
+
+def test_wall_time_limit(activity_path):
+	"""A solution that hangs should be killed and reported as TIME_OUT"""
+
+	write_solution(activity_path, "import time\n\n\ndef resolver():\n\ttime.sleep(60)\n")
+
+	result = run_activity(str(activity_path), limits=Limits(wall_time=2))
+
+	assert result.status == "TIME_OUT"
+	assert result.duration < 30
+
+
+@posix_only
+def test_cpu_time_limit(activity_path):
+	"""A solution that spins should hit the CPU limit and be reported as TIME_OUT"""
+
+	write_solution(activity_path, "def resolver():\n\twhile True:\n\t\tpass\n")
+
+	result = run_activity(str(activity_path), limits=Limits(cpu_time=1, wall_time=30))
+
+	assert result.status == "TIME_OUT"
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="RLIMIT_AS is only enforced on Linux")
+def test_memory_limit(activity_path):
+	"""A solution that exhausts its memory should be a RUNTIME_ERROR"""
+
+	write_solution(activity_path, "def resolver():\n\treturn len(bytearray(2 * 1024**3))\n")
+
+	result = run_activity(str(activity_path), limits=Limits(memory=1024**3))
+
+	assert result.status == "RUNTIME_ERROR"
@@ -0,0 +1,102 @@
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+
+from myrpl_cli import scheduler
+from myrpl_cli.myrpl import MyRPL
+from myrpl_cli.scheduler import interleave, run_interleaved
+from tests.fake_server import FakeMyRPLServer, FakeServerConfig, make_course
+
+
+@pytest.fixture(name="server")
+def fake_server():
+	courses = [make_course(1, activities=6), make_course(2, activities=3), make_course(3, enrolled=False, activities=2)]
+	with FakeMyRPLServer(FakeServerConfig(default_latency=0.01), courses) as server:
+		yield server
+
+
+def test_interleave():
+	assert interleave([[1, 2, 3], [4], [], [5, 6]]) == [1, 4, 5, 2, 6, 3]
+
+
+def test_run_interleaved_caps_concurrency():
+	lock = threading.Lock()
+	running, peak = 0, 0
+
+	def task(value):
+		nonlocal running, peak
+		with lock:
+			running += 1
+			peak = max(peak, running)
+		time.sleep(0.01)
+		with lock:
+			running -= 1
+		return value
+
+	groups = [[lambda v=v: task(v) for v in range(course * 10, course * 10 + 5)] for course in range(3)]
+
+	assert run_interleaved(groups, jobs=2) == interleave([[course * 10 + v for v in range(5)] for course in range(3)])
+	assert peak == 2
+
+
+def test_run_interleaved_raises_first_failure():
+	started = []
+
+	def fail():
+		raise RuntimeError("boom")
+
+	def slow(value):
+		started.append(value)
+		time.sleep(0.05)
+
+	with pytest.raises(RuntimeError):
+		run_interleaved([[fail] + [lambda v=v: slow(v) for v in range(20)]], jobs=1)
+	assert len(started) < 20
+
+
+def test_run_interleaved_interrupted(monkeypatch):
+	"""Ctrl-C while waiting stops the tasks that haven't started"""
+
+	started = []
+	wait = scheduler.wait
+
+	def interrupted_wait(futures, **kwargs):
+		wait(futures, timeout=0.05)
+		raise KeyboardInterrupt
+
+	monkeypatch.setattr(scheduler, "wait", interrupted_wait)
+
+	with pytest.raises(KeyboardInterrupt):
+		run_interleaved([[lambda v=v: started.append(v) or time.sleep(0.02) for v in range(40)]], jobs=2)
+	assert len(started) < 40
+
+
+def test_fetch_all_enrolled(fake_api, server, tmp_path, monkeypatch):
+	"""Every enrolled course is fetched with a single course list request and a single token renewal"""
+
+	monkeypatch.chdir(tmp_path)
+	myrpl = MyRPL(fake_api, fake_api.credential_manager)
+
+	with patch.object(fake_api, "renew_token", wraps=fake_api.renew_token) as renew_token:
+		myrpl.fetch_courses([2], all_enrolled=True, jobs=4)
+
+	assert server.requests["courses"] == 2  # the first one was rejected (stale token)
+	assert server.requests["login"] == 1
+	assert renew_token.call_count == 1
+	for name, activities in (("Course 1", 6), ("Course 2", 3)):
+		assert len(list((tmp_path / "courses" / name).glob("*/*/.myrpl"))) == activities
+	assert not (tmp_path / "courses" / "Course 3").exists()
+
+
+def test_concurrent_token_renewal(fake_api, server):
+	"""Calls rejected at once renew the token only once"""
+
+	course = fake_api.fetch_courses()[0]
+	server.expire_tokens()
+	server.reset_stats()
+
+	run_interleaved([[lambda: fake_api.fetch_activities(course)] * 8], jobs=8)
+
+	assert server.requests["login"] == 1
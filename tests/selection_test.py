@@ -0,0 +1,71 @@
+import os
+
+import pytest
+
+from myrpl_cli.models import CategoryMetadata, CourseMetadata, MyRPLMetadata
+from myrpl_cli.myrpl import MyRPL
+from myrpl_cli.selection import filter_activities, matches, tree_root
+from tests.fake_server import FakeMyRPLServer, FakeServerConfig, make_course
+
+
+@pytest.fixture(name="server")
+def fake_server():
+	with FakeMyRPLServer(FakeServerConfig(), [make_course(1, activities=6, categories=3)]) as server:
+		yield server
+
+
+@pytest.mark.parametrize(
+	"pattern, expected",
+	[("12", True), ("13", False), ("Recursion", True), ("rec*", True), ("*sion", True), ("Grafos", False)],
+)
+def test_matches(pattern, expected):
+	assert matches(pattern, 12, "Recursion") == expected
+
+
+def test_tree_root():
+	course = CourseMetadata(id=1, name="Course")
+	category = CategoryMetadata(id=2, name="Category")
+
+	assert tree_root(MyRPLMetadata(course=course)) == os.path.join("..", "..")
+	assert tree_root(MyRPLMetadata(course=course, category=category)) == os.path.join("..", "..", "..")
+
+
+def test_fetch_filtered(fake_api, server, tmp_path, monkeypatch):
+	"""Only matching activities' details are requested"""
+
+	monkeypatch.chdir(tmp_path)
+	myrpl = MyRPL(fake_api, fake_api.credential_manager)
+	activities = fake_api.fetch_activities(myrpl.find_course(1))
+	server.reset_stats()
+
+	myrpl.fetch_courses([1], categories=["1 - *"], names=[str(activities[0].id), "*Activity 100004"])
+
+	assert filter_activities(activities, ["1 - *"], [str(activities[0].id), "*Activity 100004"]) == [activities[4]]
+	assert server.requests["activity"] == 1
+	assert len(list((tmp_path / "courses").glob("*/*/*/.myrpl"))) == 1
+
+
+def test_refresh_activity_from_inside(fake_api, server, tmp_path, monkeypatch):
+	"""Inside an activity, fetch refreshes just it, without listing the course's activities"""
+
+	monkeypatch.chdir(tmp_path)
+	myrpl = MyRPL(fake_api, fake_api.credential_manager)
+	myrpl.fetch_course(1)
+	activity_path = tmp_path / myrpl.activity_path(fake_api.fetch_activities(myrpl.find_course(1))[2])
+	(activity_path / "alumno.py").write_text("my work", encoding="utf8")
+	(activity_path / "description.md").write_text("stale", encoding="utf8")
+	server.reset_stats()
+
+	monkeypatch.chdir(activity_path)
+	MyRPL(fake_api, fake_api.credential_manager).fetch_here()
+
+	# The student's work survives a plain fetch
+	assert (activity_path / "alumno.py").read_text(encoding="utf8") == "my work"
+	assert (activity_path / "description.md").read_text(encoding="utf8") != "stale"
+	# The starting files are already in the blob store
+	assert dict(server.requests) == {"courses": 1, "activity": 1}
+	assert not (activity_path / "courses").exists()
+
+	MyRPL(fake_api, fake_api.credential_manager).fetch_here(force=True)
+
+	assert (activity_path / "alumno.py").read_text(encoding="utf8") != "my work"
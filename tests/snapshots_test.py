@@ -0,0 +1,90 @@
+import pytest
+
+from myrpl_cli.myrpl import MyRPL
+from myrpl_cli.snapshots import KEYFRAME_INTERVAL, SnapshotStore, format_diff
+from tests.fake_server import FakeMyRPLServer, FakeServerConfig, make_course
+
+SOLUTION = "def resolver(values):\n" + "".join(f"\t# step {line}\n" for line in range(200)) + "\treturn {value}\n"
+
+
+@pytest.fixture(name="server")
+def fake_server():
+	with FakeMyRPLServer(FakeServerConfig(), [make_course(1, activities=2)]) as server:
+		yield server
+
+
+@pytest.fixture(name="store")
+def snapshot_store(tmp_path):
+	return SnapshotStore("http://localhost:1234", 1, 2, str(tmp_path / "snapshots"))
+
+
+def test_random_access(store):
+	"""Every version reads back as stored, taking a small fraction of storing each in full"""
+
+	versions = {}
+	for index in range(KEYFRAME_INTERVAL * 2 + 3):
+		files = {"alumno.py": SOLUTION.format(value=index)}
+		if index % 5 == 0:
+			files["helper.py"] = f"HELPER = {index}\n"
+		versions[100 + index] = files
+		store.add(100 + index, files)
+
+	for submission_id in (131, 100, 117, 104, 134):
+		assert store.get(submission_id) == versions[submission_id]
+	assert store.get(99) is None
+
+	keyframes = [version for version in store.index.versions if version.base is None]
+	assert len(keyframes) == 3
+	full = sum(len(content.encode()) for files in versions.values() for content in files.values())
+	assert store.size() < full / 10
+
+
+def test_add_is_idempotent(store):
+	store.add(1, {"alumno.py": "a\n"})
+	store.add(1, {"alumno.py": "b\n"})
+
+	assert store.get(1) == {"alumno.py": "a\n"}
+	assert len(SnapshotStore("http://localhost:1234", 1, 2, store.cache_dir).index.versions) == 1
+
+
+def test_format_diff():
+	diff = format_diff({"alumno.py": "a\nb", "old.py": "x\n"}, {"alumno.py": "a\nc\n"}, "#1", "#2")
+
+	assert diff.splitlines() == [
+		"--- #1/alumno.py",
+		"+++ #2/alumno.py",
+		"@@ -1,2 +1,2 @@",
+		" a",
+		"-b",
+		"+c",
+		"--- #1/old.py",
+		"+++ /dev/null",
+		"@@ -1 +0,0 @@",
+		"-x",
+	]
+
+
+def test_diff_command(fake_api, server, tmp_path, monkeypatch, capsys):
+	"""diff fetches missing snapshots once, then answers from the store"""
+
+	monkeypatch.chdir(tmp_path)
+	myrpl = MyRPL(fake_api, fake_api.credential_manager)
+	activity = fake_api.fetch_activities(myrpl.find_course(1))[0]
+	submission_ids = []
+	for value in range(3):
+		solution = tmp_path / "alumno.py"
+		solution.write_text(SOLUTION.format(value=value), encoding="utf8")
+		submission_ids.append(fake_api.submit(activity, str(solution))["id"])
+	myrpl.fetch_course(1)
+	monkeypatch.chdir(myrpl.activity_path(activity))
+	capsys.readouterr()
+
+	myrpl.diff(submission_ids[0], submission_ids[1])
+	server.reset_stats()
+	myrpl.diff(submission_ids[0], submission_ids[1])
+	myrpl.diff(submission_ids[0])
+
+	output = capsys.readouterr().out.splitlines()
+	assert output[:2] == [f"--- #{submission_ids[0]}/alumno.py", f"+++ #{submission_ids[1]}/alumno.py"]
+	assert "-\treturn 0" in output and "+\treturn 1" in output and "+\treturn 2" in output
+	assert not server.requests
@@ -0,0 +1,64 @@
+import json
+
+import pytest
+
+from myrpl_cli.tracing import Tracer, route_template, tracer
+from tests.fake_server import FakeMyRPLServer, FakeServerConfig, make_course
+
+
+@pytest.fixture(name="server")
+def fake_server():
+	with FakeMyRPLServer(FakeServerConfig(), [make_course(1, activities=2)]) as server:
+		yield server
+
+
+@pytest.fixture(name="enabled_tracer")
+def global_tracer():
+	tracer.enable()
+	yield tracer
+	tracer.recording = False
+
+
+def test_route_template():
+	assert route_template("https://myrpl.ar/api/courses/57/activities/5845") == "/api/courses/{id}/activities/{id}"
+	assert route_template("https://myrpl.ar/api/getFileForStudent/12?x=1") == "/api/getFileForStudent/{id}"
+
+
+def test_write(tmp_path):
+	"""Spans should be exported as Chrome trace events or JSONL, errors included"""
+
+	local_tracer = Tracer()
+	with local_tracer.span("ignored", "test"):
+		pass
+	local_tracer.enable()
+	with local_tracer.span("outer", "test", a=1) as args:
+		args["b"] = 2
+	with pytest.raises(KeyError), local_tracer.span("failing", "test"):
+		raise KeyError()
+
+	local_tracer.write(str(tmp_path / "trace.json"))
+	local_tracer.write(str(tmp_path / "trace.jsonl"))
+
+	events = json.loads((tmp_path / "trace.json").read_text())["traceEvents"]
+	assert [(e["name"], e["ph"], e["args"]) for e in events] == [
+		("outer", "X", {"a": 1, "b": 2}),
+		("failing", "X", {"error": "KeyError"}),
+	]
+	lines = (tmp_path / "trace.jsonl").read_text().splitlines()
+	assert [json.loads(line) for line in lines] == events
+
+
+def test_requests_traced(fake_api, server, enabled_tracer):
+	"""Requests should be traced by route, with the retry after a token renewal"""
+
+	fake_api.fetch_activities(fake_api.fetch_courses()[0])
+
+	requests = [e["args"] for e in enabled_tracer.events if e["cat"] == "http"]
+	assert [(r["route"], r["status"], r.get("retry", 0)) for r in requests] == [
+		("/api/courses", 401, 0),
+		("/api/auth/login", 200, 0),
+		("/api/courses", 200, 1),
+		("/api/courses/{id}/activities", 200, 0),
+	]
+	assert {e["name"] for e in enabled_tracer.events} >= {"renew_token", "login", "validate"}
+	assert "GET /api/courses/{id}/activities" in enabled_tracer.summary()
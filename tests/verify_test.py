@@ -0,0 +1,107 @@
+import os
+import shutil
+
+import pytest
+import toml
+
+from myrpl_cli import verify
+from myrpl_cli.api import API
+from myrpl_cli.myrpl import MyRPL
+from myrpl_cli.verify import content_digest, file_digest
+from tests.fake_server import FakeMyRPLServer, FakeServerConfig, make_course
+
+
+@pytest.fixture(name="server")
+def fake_server():
+	with FakeMyRPLServer(FakeServerConfig(), [make_course(1, activities=4, categories=1)]) as server:
+		yield server
+
+
+@pytest.fixture(name="mirror")
+def fetched_mirror(fake_api, server, tmp_path, monkeypatch):
+	monkeypatch.chdir(tmp_path)
+	myrpl = MyRPL(fake_api, fake_api.credential_manager)
+	myrpl.fetch_courses([1])
+	return myrpl, sorted((tmp_path / "courses").glob("*/*/*/.myrpl"))
+
+
+def test_file_digest(tmp_path, monkeypatch):
+	"""CRLF line endings hash like LF ones, even split across chunks"""
+
+	monkeypatch.setattr(verify, "CHUNK_SIZE", 3)
+	path = tmp_path / "file"
+	path.write_bytes(b"ab\r\ncd\r\n\r")
+
+	assert file_digest(str(path)) == content_digest("ab\ncd\n\r")
+	assert file_digest(str(tmp_path / "missing")) is None
+
+
+def test_verify_ok(mirror):
+	myrpl, _ = mirror
+
+	reports = myrpl.verify(jobs=2)
+
+	assert [report.ok for report in reports] == [True]
+	assert len(reports[0].activities) == 4
+	assert not any(check.unrecorded or check.edited for check in reports[0].activities)
+
+
+def test_verify_and_repair(mirror, server, tmp_path):
+	"""Broken pieces are found and downloaded again, leaving the student's work alone"""
+
+	myrpl, metadata_paths = mirror
+	first, second, third, fourth = [path.parent for path in metadata_paths]
+	(first / "alumno.py").unlink()
+	# Read-only (and hardlinked): replaced rather than written through
+	(second / "unit_test.py").unlink()
+	(second / "unit_test.py").write_text("corrupted", encoding="utf8")
+	(third / "alumno.py").write_text("# my solution\n", encoding="utf8")
+	shutil.rmtree(fourth)
+	orphan = first.parent / "Old activity"
+	orphan.mkdir()
+	metadata = toml.load(first / ".myrpl")
+	metadata["activity"]["id"] = 999
+	(orphan / ".myrpl").write_text(toml.dumps(metadata), encoding="utf8")
+
+	report = myrpl.verify(str(tmp_path), jobs=2)[0]
+
+	assert not report.ok
+	assert [(check.missing, check.corrupted) for check in report.broken] == [
+		(["alumno.py"], []),
+		([], ["unit_test.py"]),
+	]
+	assert sum(len(check.edited) for check in report.activities) == 1
+	assert [activity.name for activity in report.missing] == [fourth.name]
+	assert report.orphaned == [str(orphan)]
+
+	server.reset_stats()
+	report = myrpl.verify(str(tmp_path), repair=True, jobs=2)[0]
+
+	assert report.ok
+	assert server.requests["activity"] == 3
+	assert (first / "alumno.py").exists() and fourth.is_dir()
+	assert (second / "unit_test.py").read_text(encoding="utf8") != "corrupted"
+	assert (third / "alumno.py").read_text(encoding="utf8") == "# my solution\n"
+	assert report.orphaned == [str(orphan)]
+
+
+def test_verify_inside_an_activity(mirror):
+	myrpl, metadata_paths = mirror
+	os.chdir(metadata_paths[0].parent)
+
+	reports = myrpl.verify()
+
+	assert len(reports[0].activities) == 1
+	assert reports[0].ok
+
+
+def test_verify_unrecorded_offline(course_path, capsys):
+	"""Activities fetched before hashes were recorded can't be checked, nor can missing ones offline"""
+
+	myrpl = MyRPL(API(None, offline=True), None)
+
+	report = myrpl.verify(str(course_path))[0]
+
+	assert report.ok and not report.listed
+	assert all(check.unrecorded for check in report.activities)
+	assert "fetched without hashes" in capsys.readouterr().out
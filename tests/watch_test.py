@@ -0,0 +1,108 @@
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+from myrpl_cli.runner import ActivityRunner, discover_activities
+from myrpl_cli.sandbox import Limits
+from myrpl_cli.watch import InotifyWatcher, PollingWatcher, WarmPool, affected_activities
+
+
+@pytest.fixture(name="pool")
+def warm_pool():
+	pool = WarmPool(2)
+	yield pool
+	pool.close()
+
+
+def test_warm_pool_runs_activities(course_path, pool):
+	"""Warm workers should run each activity with its own `alumno`"""
+
+	results = ActivityRunner(pool=pool).run(discover_activities(str(course_path)))
+
+	assert all(result.passed for result in results), [result.output for result in results]
+	assert all(len(result.cases) == 1 for result in results)
+
+
+def test_warm_pool_captures_failures(course_path, pool):
+	"""A failing run should carry pytest's output back"""
+
+	activity_path = course_path / "Test Category" / "Activity 3"
+	(activity_path / "alumno.py").write_text("def resolver():\n\treturn 0\n", encoding="utf8")
+
+	result = pool.run(str(activity_path), [])
+
+	assert not result.passed
+	assert "assert 0 == 1" in result.output
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="process groups are POSIX only")
+def test_warm_pool_timeout_kills_children(course_path, pool, tmp_path):
+	"""A timed out job shouldn't leave the processes its solution spawned running"""
+
+	pid_file = tmp_path / "child.pid"
+	activity_path = course_path / "Test Category" / "Activity 3"
+	(activity_path / "alumno.py").write_text(
+		"import subprocess, sys, time\n\n\ndef resolver():\n"
+		"\tchild = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(60)'])\n"
+		f"\topen({str(pid_file)!r}, 'w').write(str(child.pid))\n"
+		"\ttime.sleep(60)\n",
+		encoding="utf8",
+	)
+
+	result = pool.run(str(activity_path), [], Limits(wall_time=3))
+
+	assert result.status == "TIME_OUT"
+	child_pid = int(pid_file.read_text())
+	deadline = time.monotonic() + 5
+	while time.monotonic() < deadline:
+		try:
+			os.kill(child_pid, 0)
+		except ProcessLookupError:
+			break
+		time.sleep(0.1)
+	else:
+		pytest.fail(f"child process {child_pid} survived the timeout")
+
+
+def test_affected_activities(course_path):
+	"""Changed files should map to the activity containing them"""
+
+	paths = discover_activities(str(course_path))
+	changed = {f"{paths[1]}/alumno.py", f"{course_path}/Test Category/description.txt"}
+
+	assert affected_activities(changed, paths) == [paths[1]]
+
+
+@pytest.mark.parametrize(
+	"watcher_class",
+	[
+		pytest.param(
+			InotifyWatcher,
+			marks=pytest.mark.skipif(not sys.platform.startswith("linux"), reason="inotify is Linux only"),
+		),
+		lambda roots: PollingWatcher(roots, interval=0.05),
+	],
+)
+def test_watcher_reports_changes(course_path, watcher_class):
+	"""Watchers should report edited files, ignoring editor litter"""
+
+	paths = discover_activities(str(course_path))
+	watcher = watcher_class(paths)
+	alumno = course_path / "Test Category" / "Activity 4" / "alumno.py"
+
+	def edit():
+		(alumno.parent / ".alumno.py.swp").write_text("", encoding="utf8")
+		alumno.write_text("def resolver():\n\treturn 2\n", encoding="utf8")
+
+	timer = threading.Timer(0.1, edit)
+	timer.start()
+	try:
+		changed = watcher.wait()
+	finally:
+		timer.join()
+		watcher.close()
+
+	assert changed == {str(alumno)}